@@ -0,0 +1,89 @@
+"""Partner aggregation: single-pass reduceat engine vs per-column groupby.
+
+Times building the partner table for one neuron from its synapse table, for
+synapse counts from 100 to 1M. The groupby version is the implementation
+`NeuronData._make_simple_targ_df` used before `aggregate_partners`.
+
+    python benchmarks/bench_partner_aggregation.py
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer.common.partner_aggregation import aggregate_partners
+
+POSITION_COLUMNS = ["ctr_pt_position_x", "ctr_pt_position_y", "ctr_pt_position_z"]
+PARTNER_COLUMN = "post_pt_root_id"
+NUM_SYN = "num_syn"
+AGGREGATION_RULES = {
+    "mean_size": {"column": "size", "agg": "mean"},
+    "net_size": {"column": "size", "agg": "sum"},
+}
+
+
+def make_synapses(n_syn, seed=0):
+    "Synapse table with roughly five synapses per partner"
+    rng = np.random.default_rng(seed)
+    n_partners = max(n_syn // 5, 1)
+    partners = 864691135000000000 + rng.integers(0, n_partners, n_syn)
+    data = {PARTNER_COLUMN: partners, "id": np.arange(n_syn)}
+    for col in POSITION_COLUMNS:
+        data[col] = rng.integers(0, 200_000, n_syn)
+    data["size"] = rng.integers(100, 10_000, n_syn)
+    return pd.DataFrame(data)
+
+
+def groupby_aggregation(syn_df):
+    df_grp = syn_df.groupby(PARTNER_COLUMN)
+    num_syn = df_grp[POSITION_COLUMNS[0]].agg(len)
+    syn_data_dict = {}
+    for k in POSITION_COLUMNS:
+        syn_data_dict[k] = df_grp[k].agg(list)
+    syn_data_dict[NUM_SYN] = num_syn
+    targ_df = pd.DataFrame(syn_data_dict)
+    for k, v in AGGREGATION_RULES.items():
+        targ_df[k] = df_grp[v["column"]].agg(v["agg"])
+    return targ_df.sort_values(by=NUM_SYN, ascending=False).reset_index()
+
+
+def vectorized_aggregation(syn_df):
+    return aggregate_partners(
+        syn_df, PARTNER_COLUMN, POSITION_COLUMNS, NUM_SYN, AGGREGATION_RULES
+    )
+
+
+def best_time(func, syn_df, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(syn_df)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1_000, 10_000, 100_000, 1_000_000],
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'synapses':>10} {'groupby (ms)':>14} {'reduceat (ms)':>14} {'speedup':>8}")
+    for n_syn in args.sizes:
+        syn_df = make_synapses(n_syn)
+        t_old = best_time(groupby_aggregation, syn_df, args.repeat)
+        t_new = best_time(vectorized_aggregation, syn_df, args.repeat)
+        print(
+            f"{n_syn:>10} {1000 * t_old:>14.2f} {1000 * t_new:>14.2f} {t_old / t_new:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,586 @@
+"""asv benchmarks for the connectivity viewers, run against `fake_cave`.
+
+Loading benchmarks build a fresh NeuronData on every call and include the
+simulated server latency. The remaining suites prepare the partner tables
+once in `setup` and time only the in-process work.
+
+    asv run                                 # from the repository root
+    python benchmarks/bench_viewer.py       # one quick pass without asv
+"""
+
+import os
+import sys
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_cave
+from dash_connectivity_viewer.common.neuron_data_base import NeuronData
+from dash_connectivity_viewer.common.dataframe_utilities import (
+    query_table_any,
+    rebuild_synapse_dataframe,
+)
+from dash_connectivity_viewer.common.lookup_utilities import (
+    get_nucleus_id_from_root_id,
+)
+from dash_connectivity_viewer.common.nucleus_index import NucleusIndex
+from dash_connectivity_viewer.common.property_snapshots import (
+    preload_table_snapshots,
+)
+from dash_connectivity_viewer.common.cache_utilities import result_cache
+from nglui import statebuilder
+from dash_connectivity_viewer.common.link_utilities import (
+    _synapse_segments,
+    _point_annotation_objects,
+    _point_annotation_json,
+    _layer_points,
+    voxel_resolution_from_info,
+    generate_statebuilder,
+    generate_statebuilder_pre,
+    generate_statebuilder_post,
+    generate_statebuider_syn_grouped,
+    generate_statebuilder_syn_cell_types,
+    generate_url_cell_types,
+)
+from dash_connectivity_viewer.common.table_lookup import TableViewer
+from dash_connectivity_viewer.connectivity_table.config import ConnectivityConfig
+from dash_connectivity_viewer.cell_type_connectivity.config import (
+    TypedConnectivityConfig,
+)
+from dash_connectivity_viewer.cell_type_connectivity.neuron_data_cortex import (
+    NeuronDataCortex,
+)
+from dash_connectivity_viewer.cell_type_connectivity.callbacks import (
+    make_ct_plots,
+    make_violin_plot,
+)
+from dash_connectivity_viewer.cell_type_connectivity.cortex_plots import (
+    SynapsePlotData,
+)
+from dash_connectivity_viewer.cell_type_table.config import CellTypeConfig
+
+SIZES = [1_000, 10_000, 100_000]
+LATENCIES = [0.0, 0.05]
+
+BASE_CONFIG = {
+    "datastack": fake_cave.DATASTACK,
+    "server_address": fake_cave.SERVER_ADDRESS,
+    # Every call should go to the (fake) server rather than the result cache
+    # or nucleus index, and every link should be built rather than taken from
+    # the link cache
+    "synapse_cache_size": 0,
+    "link_cache_size": 0,
+    "nucleus_index_cache_size": 0,
+    "synapse_aggregation_rules": {
+        "mean_size": {"column": "size", "agg": "mean"},
+        "net_size": {"column": "size", "agg": "sum"},
+    },
+}
+
+TYPED_CONFIG = {
+    **BASE_CONFIG,
+    "height_bounds": [0, 900],
+    "layer_bounds": [100, 270, 400, 550, 750],
+    "layer_labels": ["L1", "L2/3", "L4", "L5", "L6", "WM"],
+    "valence_map": {
+        fake_cave.CELL_TYPE_TABLE: {
+            "column": "classification_system",
+            "e": "excitatory_neuron",
+            "i": "inhibitory_neuron",
+        }
+    },
+}
+
+
+def _info_cache(client):
+    info_cache = dict(client.info.info_cache[client.datastack_name])
+    info_cache["global_server"] = client.server_address
+    info_cache["cell_type_column"] = fake_cave.CELL_TYPE_TABLE
+    info_cache["root_id"] = str(fake_cave.ROOT_ID)
+    return info_cache
+
+
+def _neuron_data(client, config):
+    return NeuronData(fake_cave.ROOT_ID, client, config, is_live=False)
+
+
+def _neuron_data_cortex(client, config):
+    return NeuronDataCortex(
+        fake_cave.ROOT_ID,
+        client,
+        config,
+        value_table=fake_cave.CELL_TYPE_TABLE,
+        timestamp=fake_cave.TIMESTAMP,
+        is_live=False,
+    )
+
+
+def _cell_type_request(client, config):
+    "Synapse and partner data used by one cell type connectivity request"
+    nrn_data = _neuron_data_cortex(client, config)
+    nrn_data.partners_out_plus()
+    nrn_data.partners_in_plus()
+    nrn_data.pre_syn_df_plus()
+    nrn_data.syn_all_df()
+
+
+def _count_synapse_copies(func, *args):
+    "Number of deep copies of synapse dataframes made while calling func"
+    copy = pd.DataFrame.copy
+    n_copies = [0]
+
+    def counting_copy(self, deep=True):
+        if deep and {"pre_pt_root_id", "post_pt_root_id"}.issubset(self.columns):
+            n_copies[0] += 1
+        return copy(self, deep=deep)
+
+    pd.DataFrame.copy = counting_copy
+    try:
+        func(*args)
+    finally:
+        pd.DataFrame.copy = copy
+    return n_copies[0]
+
+
+class NeuronDataLoading:
+    params = (SIZES, LATENCIES)
+    param_names = ["n_synapses", "latency"]
+    timeout = 300
+
+    def setup(self, n_synapses, latency):
+        self.client = fake_cave.install(n_synapses, latency=latency)
+        self.config = ConnectivityConfig(BASE_CONFIG)
+        self.typed_config = TypedConnectivityConfig(TYPED_CONFIG)
+
+    def teardown(self, n_synapses, latency):
+        fake_cave.uninstall()
+
+    def time_construct(self, n_synapses, latency):
+        _neuron_data(self.client, self.config)
+
+    def time_partners_out(self, n_synapses, latency):
+        _neuron_data(self.client, self.config).partners_out()
+
+    def time_partners_in(self, n_synapses, latency):
+        _neuron_data(self.client, self.config).partners_in()
+
+    def time_partners_out_plus(self, n_synapses, latency):
+        _neuron_data_cortex(self.client, self.typed_config).partners_out_plus()
+
+    def time_partners_in_plus(self, n_synapses, latency):
+        _neuron_data_cortex(self.client, self.typed_config).partners_in_plus()
+
+    def peakmem_partners_out_plus(self, n_synapses, latency):
+        _neuron_data_cortex(self.client, self.typed_config).partners_out_plus()
+
+    def peakmem_cell_type_request(self, n_synapses, latency):
+        _cell_type_request(self.client, self.typed_config)
+
+    def track_synapse_frame_copies(self, n_synapses, latency):
+        return _count_synapse_copies(
+            _cell_type_request, self.client, self.typed_config
+        )
+
+    track_synapse_frame_copies.unit = "copies"
+
+
+class SnapshotLoading:
+    "Partner tables with soma and cell type data read from preloaded snapshots"
+
+    params = (SIZES, LATENCIES)
+    param_names = ["n_synapses", "latency"]
+    timeout = 300
+
+    def setup(self, n_synapses, latency):
+        self.client = fake_cave.install(n_synapses, latency=latency)
+        self.typed_config = TypedConnectivityConfig(
+            {
+                **TYPED_CONFIG,
+                "property_snapshot_cache_size": 1_000_000_000,
+                "property_snapshot_preload": [
+                    fake_cave.NUCLEUS_TABLE,
+                    fake_cave.CELL_TYPE_TABLE,
+                ],
+            }
+        )
+        preload_table_snapshots(self.typed_config, fake_cave.DATASTACK).join()
+
+    def teardown(self, n_synapses, latency):
+        # Every dataset size has the same datastack and version
+        result_cache("property_snapshots", 0).clear()
+        fake_cave.uninstall()
+
+    def time_partners_out_plus(self, n_synapses, latency):
+        _neuron_data_cortex(self.client, self.typed_config).partners_out_plus()
+
+    def time_partners_in_plus(self, n_synapses, latency):
+        _neuron_data_cortex(self.client, self.typed_config).partners_in_plus()
+
+
+class _PreparedPartners:
+    params = SIZES
+    param_names = ["n_synapses"]
+    timeout = 300
+
+    def setup(self, n_synapses):
+        self.client = fake_cave.install(n_synapses)
+        self.config = TypedConnectivityConfig(TYPED_CONFIG)
+        self.info_cache = _info_cache(self.client)
+        self.nrn_data = _neuron_data_cortex(self.client, self.config)
+        self.aligned_volume = self.nrn_data.aligned_volume
+        self.pre_df = self.nrn_data.partners_out_plus()
+        self.post_df = self.nrn_data.partners_in_plus()
+        self.pre_positions = self.nrn_data.partner_positions_out()
+        self.post_positions = self.nrn_data.partner_positions_in()
+
+    def teardown(self, n_synapses):
+        fake_cave.uninstall()
+
+
+class SynapseRebuild(_PreparedPartners):
+    def time_rebuild_synapse_dataframe(self, n_synapses):
+        rebuild_synapse_dataframe(
+            self.pre_df,
+            self.pre_positions,
+            self.config,
+            self.aligned_volume,
+            value_cols=["cell_type"],
+        )
+
+
+class LinkBuilders(_PreparedPartners):
+    def setup(self, n_synapses):
+        super().setup(n_synapses)
+        self.selected = self.pre_df.iloc[:10]
+        self.cell_type_df = TableViewer(
+            fake_cave.CELL_TYPE_TABLE,
+            self.client,
+            CellTypeConfig(BASE_CONFIG),
+            id_query=self.pre_df[self.config.root_id_col].values,
+            id_query_type="root",
+            is_live=False,
+        ).table_data()
+        self.cell_type_config = CellTypeConfig(BASE_CONFIG)
+
+    def time_generate_statebuilder_empty(self, n_synapses):
+        generate_statebuilder(self.info_cache, self.config, client=self.client)
+
+    def time_generate_statebuilder_pre(self, n_synapses):
+        generate_statebuilder_pre(
+            self.info_cache,
+            self.config,
+            df=self.pre_df,
+            client=self.client,
+            positions=self.pre_positions,
+        )
+
+    def time_generate_statebuilder_post(self, n_synapses):
+        generate_statebuilder_post(
+            self.info_cache,
+            self.config,
+            df=self.post_df,
+            client=self.client,
+            positions=self.post_positions,
+        )
+
+    def time_generate_statebuider_syn_grouped(self, n_synapses):
+        generate_statebuider_syn_grouped(
+            self.info_cache,
+            "Output Synapses",
+            self.config,
+            df=self.selected,
+            client=self.client,
+            positions=self.pre_positions,
+        )
+
+    def time_generate_statebuilder_syn_cell_types(self, n_synapses):
+        generate_statebuilder_syn_cell_types(
+            self.info_cache,
+            self.pre_df,
+            self.config,
+            client=self.client,
+            positions=self.pre_positions,
+            cell_type_column="cell_type",
+            multipoint=True,
+            fill_null="NoType",
+        )
+
+    def time_generate_url_cell_types(self, n_synapses):
+        generate_url_cell_types(
+            [],
+            self.cell_type_df,
+            self.info_cache,
+            self.cell_type_config,
+            "pt",
+            client=self.client,
+            group_annotations=True,
+            cell_type_column="cell_type",
+        )
+
+
+class CachedLinks(_PreparedPartners):
+    "Repeat selections served from the link cache"
+
+    def setup(self, n_synapses):
+        super().setup(n_synapses)
+        self.config = TypedConnectivityConfig(
+            {**TYPED_CONFIG, "link_cache_size": 50_000_000}
+        )
+        # Stands in for the result handle of the stored partner table
+        self.link_key = [uuid.uuid4().hex]
+        self.time_generate_statebuilder_pre_cached(n_synapses)
+
+    def time_generate_statebuilder_pre_cached(self, n_synapses):
+        generate_statebuilder_pre(
+            self.info_cache,
+            self.config,
+            df=self.pre_df,
+            client=self.client,
+            positions=self.pre_positions,
+            link_key=self.link_key,
+        )
+
+
+class AnnotationBuilders(_PreparedPartners):
+    "Synapse annotation layers built per point with nglui objects or from arrays"
+
+    def setup(self, n_synapses):
+        super().setup(n_synapses)
+        partners = self.pre_df[self.config.root_id_col]
+        self.pts, index = self.pre_positions.take(partners)
+        self.partners = partners.to_numpy()[index]
+        self.segments = _synapse_segments(self.partners, fake_cave.ROOT_ID)
+        self.layer_resolution = voxel_resolution_from_info(self.info_cache)
+
+    def _annotation_state(self, annos):
+        vs = statebuilder.ViewerState(dimensions=self.layer_resolution)
+        vs.add_annotation_layer(name="syns")
+        layer = vs.get_layer("syns")
+        # nglui only sets the position from nglui annotations
+        layer.set_position = False
+        layer.annotations.extend(annos)
+        return vs.to_dict()
+
+    def time_point_annotation_objects(self, n_synapses):
+        self._annotation_state(
+            _point_annotation_objects(self.pts, self.segments, [1, 1, 1])
+        )
+
+    def time_point_annotation_json(self, n_synapses):
+        self._annotation_state(
+            _point_annotation_json(
+                _layer_points(self.pts, [1, 1, 1], self.layer_resolution),
+                self.partners,
+                fake_cave.ROOT_ID,
+            )
+        )
+
+
+class PlotBuilders(_PreparedPartners):
+    def setup(self, n_synapses):
+        super().setup(n_synapses)
+        self.plot_data = SynapsePlotData.from_partners(
+            self.pre_df, self.pre_positions, self.config, self.aligned_volume
+        )
+
+    def time_make_ct_plots(self, n_synapses):
+        make_ct_plots(
+            self.pre_df,
+            self.pre_positions,
+            self.config,
+            self.aligned_volume,
+            "cell_type",
+            {},
+        )
+
+    def time_regroup_ct_plots(self, n_synapses):
+        "Plots for a new color column, from the plot data stored at load time"
+        make_ct_plots(
+            self.pre_df,
+            None,
+            self.config,
+            self.aligned_volume,
+            "classification_system",
+            {},
+            plot_data=self.plot_data,
+        )
+
+    def time_make_violin_plot(self, n_synapses):
+        make_violin_plot(self.nrn_data)
+
+
+class NucleusLookups:
+    "Nucleus ids of partner root ids, queried or taken from a nucleus index"
+
+    params = SIZES
+    param_names = ["n_synapses"]
+    timeout = 300
+
+    def setup(self, n_synapses):
+        self.client = fake_cave.install(n_synapses)
+        self.config = ConnectivityConfig(BASE_CONFIG)
+        nucleus_df = query_table_any(
+            fake_cave.NUCLEUS_TABLE,
+            self.config.soma_pt_root_id,
+            None,
+            self.client,
+            None,
+            is_live=False,
+        )
+        self.index = NucleusIndex.from_frame(nucleus_df, self.config)
+        self.root_ids = nucleus_df[self.config.soma_pt_root_id].to_numpy()
+
+    def teardown(self, n_synapses):
+        fake_cave.uninstall()
+
+    def time_query_nucleus_ids(self, n_synapses):
+        query_table_any(
+            fake_cave.NUCLEUS_TABLE,
+            self.config.soma_pt_root_id,
+            self.root_ids,
+            self.client,
+            None,
+            is_live=False,
+        )
+
+    def time_index_nucleus_ids(self, n_synapses):
+        self.index.nuclei_for(self.root_ids)
+
+    def time_query_nucleus_id(self, n_synapses):
+        get_nucleus_id_from_root_id(
+            fake_cave.ROOT_ID,
+            self.client,
+            fake_cave.NUCLEUS_TABLE,
+            self.config,
+            is_live=False,
+        )
+
+    def time_index_nucleus_id(self, n_synapses):
+        self.index.nuclei_for([fake_cave.ROOT_ID])
+
+
+def merge_property_tables_sequential(df, property_tables, merge_column, config):
+    "Property tables merged one at a time, as before `PropertyJoin`"
+    for attrs in property_tables.values():
+        suffix = attrs.get("suffix", "")
+        property_columns = (
+            [attrs.get("root_id")]
+            + attrs.get("include")
+            + list(attrs.get("aggregate", {}).keys())
+        )
+        df = df.merge(
+            attrs.get("data"),
+            left_on=merge_column,
+            right_index=True,
+            how="left",
+            suffixes=("", suffix),
+        )
+        df.rename(
+            columns={
+                c: f"{c}{suffix}"
+                for c in property_columns
+                if f"{c}{suffix}" not in df.columns
+            },
+            inplace=True,
+        )
+    if config.num_soma_col in df.columns:
+        df[config.num_soma_col] = df[config.num_soma_col].fillna(0).astype(int)
+    return df
+
+
+def partners_out_plus_sequential(nrn_data):
+    "`partners_out_plus` with a merge per table, as before `PropertyJoin`"
+    config = nrn_data.config
+    targ_df, _ = nrn_data._aggregate_partners("pre")
+    targ_df = targ_df.rename(
+        columns={nrn_data._partner_column("pre"): config.root_id_col}
+    )
+    for tn in nrn_data.property_tables:
+        nrn_data.property_data(tn)
+    targ_df = merge_property_tables_sequential(
+        targ_df, nrn_data._property_tables, config.root_id_col, config
+    )
+    for cn in config.target_table_display:
+        if cn not in targ_df.columns:
+            targ_df[cn] = np.nan
+    val_df = nrn_data.value_data
+    if val_df is not None:
+        targ_df = targ_df.merge(val_df, on=config.root_id_col, how="left")
+    return targ_df
+
+
+class PropertyMerge:
+    """Partner tables joined with their property and cell type tables.
+
+    The `_sequential` benchmarks time the merge per table used before
+    `PropertyJoin` on the same data.
+    """
+
+    params = [1_000, 10_000]
+    param_names = ["n_partners"]
+    timeout = 300
+
+    def setup(self, n_partners):
+        self.client = fake_cave.install(20 * n_partners, n_partners=n_partners)
+        self.config = TypedConnectivityConfig(TYPED_CONFIG)
+        self.nrn_data = _neuron_data_cortex(self.client, self.config)
+        self.nrn_data.partners_out_plus()
+        self.nrn_data.pre_syn_df_plus()
+
+    def teardown(self, n_partners):
+        fake_cave.uninstall()
+
+    def time_partners_out_plus(self, n_partners):
+        self.nrn_data.partners_out_plus()
+
+    def time_pre_syn_df_plus(self, n_partners):
+        self.nrn_data.pre_syn_df_plus()
+
+    def time_partners_out_plus_sequential(self, n_partners):
+        partners_out_plus_sequential(self.nrn_data)
+
+    def time_pre_syn_df_plus_sequential(self, n_partners):
+        merge_property_tables_sequential(
+            self.nrn_data.pre_syn_df(),
+            self.nrn_data._property_tables,
+            self.config.post_pt_root_id,
+            self.config,
+        )
+
+
+def _run_once():
+    "Time each benchmark once for every parameter combination"
+    import itertools
+
+    for suite in (
+        NeuronDataLoading,
+        SnapshotLoading,
+        SynapseRebuild,
+        LinkBuilders,
+        CachedLinks,
+        AnnotationBuilders,
+        PlotBuilders,
+        NucleusLookups,
+        PropertyMerge,
+    ):
+        params = suite.params if isinstance(suite.params, tuple) else (suite.params,)
+        for combo in itertools.product(*params):
+            bench = suite()
+            bench.setup(*combo)
+            try:
+                for name in sorted(dir(bench)):
+                    if not name.startswith("time_"):
+                        continue
+                    t0 = time.perf_counter()
+                    getattr(bench, name)(*combo)
+                    dt = 1000 * (time.perf_counter() - t0)
+                    print(f"{suite.__name__}.{name}{combo}: {dt:.1f} ms")
+            finally:
+                bench.teardown(*combo)
+
+
+if __name__ == "__main__":
+    _run_once()
@@ -0,0 +1,349 @@
+"""Local stand-in for CAVEclient, serving synthetic tables from Parquet files.
+
+`install` writes (or reuses) a synthetic dataset and makes every
+`make_client` call in the viewers return a `FakeCAVEclient` for it, so the
+data paths can be timed without CAVE services:
+
+    import fake_cave
+    client = fake_cave.install(n_synapses=10_000, latency=0.05)
+    ...
+    fake_cave.uninstall()
+
+Every materialization, chunkedgraph and state call sleeps for `latency`
+seconds to simulate the round trip to the server.
+"""
+
+import os
+import time
+import tempfile
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from dash_connectivity_viewer.common.lookup_utilities import set_client_factory
+
+DATASTACK = "fake_datastack"
+SERVER_ADDRESS = "https://fake.local"
+VERSION = 100
+TIMESTAMP = datetime.datetime(2024, 1, 1, tzinfo=pytz.UTC)
+
+ROOT_ID = 864691135000000001
+SYNAPSE_TABLE = "synapses"
+NUCLEUS_TABLE = "nucleus_detection"
+CELL_TYPE_TABLE = "cell_types"
+CELL_TYPES = ["23P", "4P", "5P-IT", "5P-ET", "6P", "BC", "MC", "BPC", "NGC"]
+INHIBITORY_TYPES = ["BC", "MC", "BPC", "NGC"]
+
+_SCHEMAS = {
+    SYNAPSE_TABLE: "synapse",
+    NUCLEUS_TABLE: "nucleus_detection",
+    CELL_TYPE_TABLE: "cell_type_local",
+}
+
+_SCHEMA_FIELDS = {
+    "synapse": {"pre_pt": "point", "post_pt": "point", "ctr_pt": "point", "size": "float"},
+    "nucleus_detection": {"pt": "point", "volume": "float"},
+    "cell_type_local": {
+        "pt": "point",
+        "cell_type": "string",
+        "classification_system": "string",
+    },
+}
+
+
+def dataset_directory(n_synapses, n_partners=None, seed=0):
+    if n_partners is None:
+        n_partners = max(n_synapses // 5, 1)
+    return os.path.join(
+        tempfile.gettempdir(),
+        "dcv-benchmarks",
+        f"syn{n_synapses}_partners{n_partners}_seed{seed}",
+    )
+
+
+def make_dataset(n_synapses, n_partners=None, soma_fraction=0.8, seed=0):
+    """Write synthetic synapse, nucleus and cell type tables for one neuron.
+
+    Half of the `n_synapses` synapses are outputs and half inputs of `ROOT_ID`,
+    spread over `n_partners` partners. A `soma_fraction` of partners have a
+    nucleus and a cell type. Files are reused if they already exist.
+
+    Returns
+    -------
+    str
+        Directory holding one Parquet file per table.
+    """
+    if n_partners is None:
+        n_partners = max(n_synapses // 5, 1)
+    directory = dataset_directory(n_synapses, n_partners, seed)
+    if os.path.exists(os.path.join(directory, f"{CELL_TYPE_TABLE}.parquet")):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    partner_ids = ROOT_ID + 1 + np.arange(n_partners, dtype=np.int64)
+    partners = rng.choice(partner_ids, n_synapses)
+    is_output = np.arange(n_synapses) < n_synapses // 2
+    synapses = pd.DataFrame(
+        {
+            "id": np.arange(n_synapses, dtype=np.int64),
+            "pre_pt_root_id": np.where(is_output, ROOT_ID, partners),
+            "post_pt_root_id": np.where(is_output, partners, ROOT_ID),
+            "ctr_pt_position_x": rng.uniform(600_000, 1_000_000, n_synapses),
+            "ctr_pt_position_y": rng.uniform(400_000, 1_000_000, n_synapses),
+            "ctr_pt_position_z": rng.uniform(600_000, 1_000_000, n_synapses),
+            "size": rng.integers(100, 20_000, n_synapses).astype(float),
+        }
+    )
+
+    soma_roots = np.concatenate(
+        [[ROOT_ID], rng.permutation(partner_ids)[: int(soma_fraction * n_partners)]]
+    )
+    n_soma = len(soma_roots)
+    soma_position = {
+        "pt_position_x": rng.uniform(600_000, 1_000_000, n_soma),
+        "pt_position_y": rng.uniform(400_000, 1_000_000, n_soma),
+        "pt_position_z": rng.uniform(600_000, 1_000_000, n_soma),
+    }
+    nucleus = pd.DataFrame(
+        {
+            "id": 10_000 + np.arange(n_soma, dtype=np.int64),
+            "pt_root_id": soma_roots,
+            "volume": rng.uniform(100, 500, n_soma),
+            **soma_position,
+        }
+    )
+    cell_types = pd.DataFrame(
+        {
+            "id": np.arange(n_soma, dtype=np.int64),
+            "pt_root_id": soma_roots,
+            "cell_type": rng.choice(CELL_TYPES, n_soma),
+            **soma_position,
+        }
+    )
+    cell_types["classification_system"] = np.where(
+        cell_types["cell_type"].isin(INHIBITORY_TYPES),
+        "inhibitory_neuron",
+        "excitatory_neuron",
+    )
+
+    for name, df in (
+        (SYNAPSE_TABLE, synapses),
+        (NUCLEUS_TABLE, nucleus),
+        (CELL_TYPE_TABLE, cell_types),
+    ):
+        tmp_fn = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+        df.to_parquet(tmp_fn)
+        os.replace(tmp_fn, os.path.join(directory, f"{name}.parquet"))
+    return directory
+
+
+class _Service(object):
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+
+class FakeMaterialize(_Service):
+    def __init__(self, directory, latency, version=VERSION):
+        super().__init__(latency)
+        self.directory = directory
+        self.version = version
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _table(self, table):
+        with self._lock:
+            if table not in self._tables:
+                self._tables[table] = pd.read_parquet(
+                    os.path.join(self.directory, f"{table}.parquet")
+                )
+            return self._tables[table]
+
+    @staticmethod
+    def _filters(filters, table):
+        if filters is None:
+            return {}
+        if table in filters and isinstance(filters[table], dict):
+            return filters[table]
+        return filters
+
+    def query_table(
+        self,
+        table,
+        filter_equal_dict=None,
+        filter_in_dict=None,
+        filter_out_dict=None,
+        select_columns=None,
+        offset=None,
+        limit=None,
+        **kwargs,
+    ):
+        self._wait()
+        df = self._table(table)
+        keep = np.ones(len(df), dtype=bool)
+        for col, value in self._filters(filter_equal_dict, table).items():
+            keep &= df[col].to_numpy() == value
+        for col, values in self._filters(filter_in_dict, table).items():
+            keep &= df[col].isin(values).to_numpy()
+        for col, values in self._filters(filter_out_dict, table).items():
+            keep &= ~df[col].isin(values).to_numpy()
+        df = df[keep]
+        if offset is not None or limit is not None:
+            start = offset or 0
+            df = df.iloc[start : None if limit is None else start + limit]
+        df = df.reset_index(drop=True)
+        if select_columns is not None:
+            df = df[select_columns]
+        return df
+
+    def live_live_query(self, table, timestamp=None, **kwargs):
+        return self.query_table(table, **kwargs)
+
+    def get_annotation_count(self, table_name, **kwargs):
+        self._wait()
+        return len(self._table(table_name))
+
+    def get_table_metadata(self, table_name):
+        self._wait()
+        return {
+            "table_name": table_name,
+            "schema": _SCHEMAS[table_name],
+            "reference_table": None,
+            "voxel_resolution_x": 1,
+            "voxel_resolution_y": 1,
+            "voxel_resolution_z": 1,
+        }
+
+    def get_tables(self, **kwargs):
+        self._wait()
+        return list(_SCHEMAS)
+
+    def get_tables_metadata(self, version=None, **kwargs):
+        return [self.get_table_metadata(table) for table in _SCHEMAS]
+
+    def get_versions_metadata(self):
+        self._wait()
+        return [
+            {
+                "version": self.version,
+                "time_stamp": TIMESTAMP,
+                "expires_on": datetime.datetime.now(tz=pytz.UTC)
+                + datetime.timedelta(days=800),
+            }
+        ]
+
+    def get_timestamp(self, version=None):
+        return TIMESTAMP
+
+
+class FakeChunkedgraph(_Service):
+    def is_latest_roots(self, root_ids, timestamp=None):
+        self._wait()
+        return np.ones(len(root_ids), dtype=bool)
+
+    def suggest_latest_roots(self, root_id, timestamp=None, **kwargs):
+        self._wait()
+        return root_id
+
+
+class FakeState(_Service):
+    def __init__(self, latency):
+        super().__init__(latency)
+        self.states = []
+
+    def upload_state_json(self, state):
+        self._wait()
+        self.states.append(state)
+        return len(self.states)
+
+    def build_neuroglancer_url(self, state_id, ngl_url=None, **kwargs):
+        return f"{ngl_url}/?json_url={SERVER_ADDRESS}/nglstate/api/v1/{state_id}"
+
+
+class FakeSchema(_Service):
+    def schema_definition(self, schema_name):
+        definition = "".join(x.capitalize() for x in schema_name.split("_"))
+        properties = {}
+        for field, field_type in _SCHEMA_FIELDS[schema_name].items():
+            if field_type == "point":
+                properties[field] = {"$ref": "#/definitions/BoundSpatialPoint"}
+            else:
+                properties[field] = {"type": field_type}
+        return {
+            "$ref": f"#/definitions/{definition}",
+            "definitions": {definition: {"properties": properties}},
+        }
+
+
+class FakeInfo(object):
+    def __init__(self, datastack):
+        self.datastack = datastack
+        self.info_cache = {datastack: self.get_datastack_info()}
+
+    def get_datastack_info(self, datastack_name=None):
+        return {
+            "synapse_table": SYNAPSE_TABLE,
+            "soma_table": NUCLEUS_TABLE,
+            "aligned_volume": {
+                "name": "minnie65_phase3",
+                "image_source": "precomputed://gs://fake/em",
+            },
+            "segmentation_source": "graphene://https://fake.local/segmentation",
+            "viewer_site": "https://spelunker.cave-explorer.org",
+            "viewer_resolution_x": 4,
+            "viewer_resolution_y": 4,
+            "viewer_resolution_z": 40,
+        }
+
+
+class FakeCAVEclient(object):
+    """Client with the parts of the CAVEclient interface the viewers use.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with one Parquet file per table, as written by `make_dataset`.
+    latency : float, optional
+        Seconds each simulated server call takes, by default 0.
+    """
+
+    def __init__(
+        self,
+        directory,
+        latency=0,
+        datastack_name=DATASTACK,
+        server_address=SERVER_ADDRESS,
+    ):
+        self.datastack_name = datastack_name
+        self.server_address = server_address
+        self.materialize = FakeMaterialize(directory, latency)
+        self.chunkedgraph = FakeChunkedgraph(latency)
+        self.state = FakeState(latency)
+        self.schema = FakeSchema(latency)
+        self.info = FakeInfo(datastack_name)
+
+
+def install(n_synapses, latency=0, **dataset_kwargs):
+    """Create a dataset and route `make_client` to a fake client serving it.
+
+    Returns the client. The same client is returned for every `make_client`
+    call, so tables are read from disk only once.
+    """
+    client = FakeCAVEclient(make_dataset(n_synapses, **dataset_kwargs), latency)
+
+    def factory(datastack, server_address, materialize_version=None, **kwargs):
+        return client
+
+    set_client_factory(factory)
+    return client
+
+
+def uninstall():
+    set_client_factory(None)
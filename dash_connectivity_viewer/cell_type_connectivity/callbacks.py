@@ -4,7 +4,7 @@ import numpy as np
 from functools import partial
 import traceback
 
-from dash import dcc, html, callback_context
+from dash import dcc, html, callback_context, no_update
 from dash.dependencies import Input, Output, State
 
 from .config import TypedConnectivityConfig
@@ -24,11 +24,26 @@ from ..common.lookup_utilities import (
     get_version_options,
 )
 from ..common.schema_utils import get_table_info
-from ..common.dataframe_utilities import (
-    stringify_root_ids,
-    stringify_list,
-    rehydrate_dataframe,
-    rebuild_synapse_dataframe,
+from ..common.table_catalog import warm_table_catalog
+from ..common.property_snapshots import preload_table_snapshots
+from ..common.disk_cache import get_disk_cache
+from ..common.timing import request_timer, register_metrics_endpoint, timed
+from ..common.cache_utilities import cache_stats
+from ..common.link_jobs import start_link_job, link_job_status
+from ..common.result_store import (
+    get_result_store,
+    store_result,
+    fetch_result,
+    fetch_positions,
+)
+from ..common.table_query import (
+    fetch_rows,
+    page_records,
+    page_count,
+    selected_row_numbers,
+    selected_page_rows,
+    table_columns,
+    export_csv,
 )
 from .neuron_data_cortex import NeuronDataCortex as NeuronData
 from .neuron_data_cortex import ALLOW_COLUMN_TYPES_DISCRETE
@@ -95,7 +110,8 @@ def allowed_action_trigger(ctx, allowed_buttons):
 
 def generic_syn_link_generation(
     url_function,
-    rows,
+    syn_df,
+    positions,
     info_cache,
     datastack,
     config,
@@ -103,15 +119,15 @@ def generic_syn_link_generation(
     item_name="synapses",
 ):
     """url_function(info_cache, df=..., client=...) -> Neuroglancer URL string."""
-    if rows is None or len(rows) == 0:
+    if syn_df is None or len(syn_df) == 0:
         return html.Div(f"No {item_name} to show")
-    syn_df = rehydrate_dataframe(rows, config.syn_pt_position_split)
     try:
         client = make_client(datastack, config.server_address)
         url = url_function(
             info_cache,
             df=syn_df.sort_values(by=config.num_syn_col, ascending=False),
             client=client,
+            positions=positions,
         )
     except Exception as e:
         return html.Div(str(e))
@@ -119,6 +135,7 @@ def generic_syn_link_generation(
     return html.A(link_text, href=url, target="_blank", style={"font-size": "20px"})
 
 
+@timed("plot:make_violin_plot")
 def make_violin_plot(ndat, height=350):
     if ndat is None:
         return html.Div("")
@@ -139,49 +156,91 @@ def make_violin_plot(ndat, height=350):
     return contents
 
 
-def make_ct_plots(rows, config, aligned_volume, color_column, table_values):
-    if rows is None:
-        return html.Div(""), html.Div("")
-    if len(rows) == 0:
-        return html.Div(""), html.Div("")
-
-    df = rebuild_synapse_dataframe(
-        rows,
-        config,
-        aligned_volume,
-        value_cols=[color_column],
-    )
+def store_partner_result(config, targ_df, positions, aligned_volume):
+    "Store a partner table with its synapse positions and plot data, returning the handle"
+    frames = {
+        "partners": targ_df,
+        "synapses": positions.to_frame(config.root_id_col),
+    }
+    if config.soma_depth_column in targ_df.columns:
+        frames["plots"] = SynapsePlotData.from_partners(
+            targ_df, positions, config, aligned_volume
+        ).to_frame()
+    return store_result(config, **frames)
+
+
+def fetch_plot_data(config, handle):
+    "Resolve a handle to the plot data stored with it, or None"
+    df = fetch_result(config, handle, "plots")
+    if df is None:
+        return None
+    return SynapsePlotData.from_frame(df)
+
+
+def partner_plot_values(plot_data, targ_df, config, color_column, table_values):
+    "Per-partner values of the color column, or None if no column is selected"
+    if color_column is None or color_column == "":
+        return None
+    values = plot_data.partner_values(targ_df, color_column)
     if color_column in table_values:
-        df[color_column] = df[color_column].astype(
+        values = values.astype(
             pd.CategoricalDtype(
                 categories=sorted(table_values[color_column])
                 + [config.null_cell_type_label],
                 ordered=True,
             )
         )
+    return values
+
+
+@timed("plot:make_ct_plots")
+def make_ct_plots(
+    targ_df,
+    positions,
+    config,
+    aligned_volume,
+    color_column,
+    table_values,
+    plot_data=None,
+):
+    if targ_df is None or (positions is None and plot_data is None):
+        return html.Div(""), html.Div("")
+    if len(targ_df) == 0:
+        return html.Div(""), html.Div("")
+
+    if plot_data is None:
+        plot_data = SynapsePlotData.from_partners(
+            targ_df, positions, config, aligned_volume
+        )
+    values = partner_plot_values(
+        plot_data, targ_df, config, color_column, table_values
+    )
 
     if color_column == "":
         color_column = None
 
     if config.show_depth_plots:
         scatter_contents = make_scatter_div(
-            df.copy(), config, color_column, width=450, height=350
+            plot_data, values, config, width=450, height=350
         )
     else:
         scatter_contents = html.Div("")
-    bar_contents = make_bar_div(df.copy(), config, color_column, width=450, height=350)
+    bar_contents = make_bar_div(
+        plot_data, values, config, color_column, width=450, height=350
+    )
 
     return scatter_contents, bar_contents
 
 
+@timed("plot:make_scatter_div")
 def make_scatter_div(
-    df,
+    plot_data,
+    values,
     config,
-    color_column,
     width=450,
     height=350,
 ):
-    scatter_fig = scatter_fig_df(df, config, color_column, width, height)
+    scatter_fig = scatter_fig_df(plot_data, values, config, width, height)
     contents = [
         html.H5("Synapse/Target Soma Depth", className="card-title"),
         dcc.Graph(
@@ -192,7 +251,8 @@ def make_scatter_div(
     return contents
 
 
-def make_bar_div(df, config, color_column, width=450, height=350):
+@timed("plot:make_bar_div")
+def make_bar_div(plot_data, values, config, color_column, width=450, height=350):
     if color_column is None:
         contents = [
             html.H4(
@@ -201,7 +261,7 @@ def make_bar_div(df, config, color_column, width=450, height=350):
             ),
         ]
     else:
-        bar_fig = bar_fig_df(df, config, color_column)
+        bar_fig = bar_fig_df(plot_data, values, config, color_column)
         contents = [
             html.H5("Target Distribution", style={"text-align": "center"}),
             dcc.Graph(figure=bar_fig, style={"width": "auto", "height": "100%"}),
@@ -211,14 +271,26 @@ def make_bar_div(df, config, color_column, width=450, height=350):
 
 def register_callbacks(app, config):
     c = TypedConnectivityConfig(config)
+    register_metrics_endpoint(app, c)
+    get_result_store(c)
+    if c.table_catalog_warmup:
+        warm_table_catalog(c)
+    if c.property_snapshot_cache_size and c.property_snapshot_preload:
+        preload_table_snapshots(c)
 
     @app.callback(
-        Output("data-table", "selected_rows"),
+        Output("data-table", "selected_row_ids"),
+        Output("data-table", "page_current"),
         Input("reset-selection", "n_clicks"),
         Input("connectivity-tab", "value"),
+        Input("data-table", "filter_query"),
     )
-    def reset_selection(n_clicks, tab_value):
-        return []
+    def reset_selection(n_clicks, tab_value, filter_query):
+        # A new filter returns to the first page but keeps the selection
+        trigger_src = callback_context.triggered_id
+        if trigger_src == "data-table":
+            return no_update, 0
+        return [], 0
 
     @app.callback(
         Output("header-bar", "children"),
@@ -241,7 +313,7 @@ def register_callbacks(app, config):
         # Produce ordered list of materialization versions to choose from
         client = make_client(datastack_name, c.server_address)
         version_options, default_value = get_version_options(
-            client, c.disallow_live_query
+            client, c.disallow_live_query, disk_cache=get_disk_cache(c)
         )
         return version_options, default_value
 
@@ -257,7 +329,7 @@ def register_callbacks(app, config):
         client = make_client(datastack, c.server_address)
 
         if cell_type_table == "" or cell_type_table is None:
-            return [{"name": i, "id": i} for i in c.table_columns], [], {}
+            return table_columns(c.table_columns), [], {}
 
         if c.debug:
             print("cell_type_table", cell_type_table, "client", client.datastack_name)
@@ -268,7 +340,7 @@ def register_callbacks(app, config):
         table_cons = c.table_columns + val_cols
         table_values = client.materialize.get_unique_string_values(cell_type_table)
         return (
-            [{"name": i, "id": i} for i in table_cons],
+            table_columns(table_cons),
             [{"label": k, "value": k} for k in val_cols],
             table_values,
         )
@@ -340,6 +412,7 @@ def register_callbacks(app, config):
         StateCellTypeTable,
         StateMaterializationVersion,
     )
+    @request_timer("update_data", c)
     def update_data(_1, datastack_name, anno_id, id_type, ct_table_value, mat_version):
         if logger is not None:
             t0 = time.time()
@@ -357,7 +430,7 @@ def register_callbacks(app, config):
             )
             if version is None:
                 version = client.materialize.version
-            info_cache = client.info.info_cache[datastack_name]
+            info_cache = dict(client.info.info_cache[datastack_name])
             info_cache["global_server"] = client.server_address
 
         except Exception as e:
@@ -440,28 +513,22 @@ def register_callbacks(app, config):
             if c.debug:
                 print(f"\n Starting partners out")
             pre_targ_df = nrn_data.partners_out_plus()
-            pre_targ_df = stringify_root_ids(
-                pre_targ_df, stringify_cols=[c.root_id_col]
-            )
+            pre_positions = nrn_data.partner_positions_out()
 
             if c.debug:
                 print(f"\n Starting partners in")
             post_targ_df = nrn_data.partners_in_plus()
-            post_targ_df = stringify_root_ids(
-                post_targ_df, stringify_cols=[c.root_id_col]
-            )
+            post_positions = nrn_data.partner_positions_in()
 
             n_syn_pre = pre_targ_df[c.num_syn_col].sum()
             n_syn_post = post_targ_df[c.num_syn_col].sum()
 
-            for col in nrn_data.config.syn_pt_position_split:
-                stringify_list(col, pre_targ_df)
-                stringify_list(col, post_targ_df)
-
             if logger is not None:
                 logger.info(
                     f"Data update for {root_id} | time:{time.time() - t0:.2f} s, syn_in: {len(pre_targ_df)} , syn_out: {len(post_targ_df)}"
                 )
+            if c.debug:
+                print("Cache stats:", cache_stats())
             if nrn_data.nucleus_id is not None and nrn_data.soma_table is not None:
                 if np.issubdtype(type(nrn_data.nucleus_id), np.integer):
                     nuc_id_text = f"  (nucleus id: {nrn_data.nucleus_id})"
@@ -491,6 +558,7 @@ def register_callbacks(app, config):
             else:
                 vplot = make_violin_plot(None)
             syn_res = nrn_data.synapse_data_resolution
+            av = nrn_data.aligned_volume
             del nrn_data
             del client
 
@@ -498,8 +566,8 @@ def register_callbacks(app, config):
                 html.Div(message_text),
                 output_status,
                 "",
-                pre_targ_df.to_dict("records"),
-                post_targ_df.to_dict("records"),
+                store_partner_result(c, pre_targ_df, pre_positions, av),
+                store_partner_result(c, post_targ_df, post_positions, av),
                 f"Output (n = {n_syn_pre})",
                 f"Input (n = {n_syn_post})",
                 1,
@@ -538,48 +606,116 @@ def register_callbacks(app, config):
         Input("client-info-json", "data"),
         Input("unique-table-values", "data"),
     )
-    def update_scatter_bar_plots(rows, color_column, info_cache, table_values):
+    @request_timer("update_scatter_bar_plots", c)
+    def update_scatter_bar_plots(handle, color_column, info_cache, table_values):
+        plot_data = fetch_plot_data(c, handle)
         return make_ct_plots(
-            rows, c, aligned_volume(info_cache), color_column, table_values
+            fetch_result(c, handle, "partners"),
+            fetch_positions(c, handle) if plot_data is None else None,
+            c,
+            aligned_volume(info_cache),
+            color_column,
+            table_values,
+            plot_data=plot_data,
         )
 
     @app.callback(
         Output("data-table", "data"),
+        Output("data-table", "page_count"),
+        Output("data-table", "selected_rows"),
         Input("connectivity-tab", "value"),
         Input("target-table-json", "data"),
         Input("source-table-json", "data"),
+        Input("data-table", "page_current"),
+        Input("data-table", "page_size"),
+        Input("data-table", "sort_by"),
+        Input("data-table", "filter_query"),
+        State("data-table", "selected_row_ids"),
     )
+    @request_timer("update_table", c)
     def update_table(
         tab_value,
-        pre_data,
-        post_data,
+        pre_handle,
+        post_handle,
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+        selected_row_ids,
+    ):
+        if tab_value == "tab-pre":
+            handle = pre_handle
+        elif tab_value == "tab-post":
+            handle = post_handle
+        else:
+            return [], 1, []
+        rows = fetch_rows(c, handle, "partners", filter_query, sort_by)
+        records = page_records(
+            fetch_result(c, handle, "partners"), rows, page_current, page_size, c
+        )
+        return (
+            records,
+            page_count(rows, page_size),
+            selected_page_rows(records, selected_row_ids),
+        )
+
+    @app.callback(
+        Output("export-csv-download", "data"),
+        Input("export-csv", "n_clicks"),
+        State("connectivity-tab", "value"),
+        State("target-table-json", "data"),
+        State("source-table-json", "data"),
+        State("data-table", "sort_by"),
+        State("data-table", "filter_query"),
+        State("data-table", "columns"),
+        prevent_initial_call=True,
+    )
+    def export_table(
+        _, tab_value, pre_handle, post_handle, sort_by, filter_query, columns
     ):
         if tab_value == "tab-pre":
-            return pre_data
+            handle, filename = pre_handle, "output_partners.csv"
         elif tab_value == "tab-post":
-            return post_data
+            handle, filename = post_handle, "input_partners.csv"
         else:
-            return []
+            return no_update
+        data = export_csv(
+            c, handle, "partners", filter_query, sort_by, columns, filename
+        )
+        if data is None:
+            return no_update
+        return data
 
     @app.callback(
         Output("ngl-link", "href"),
         Output("ngl-link", "children"),
         Output("ngl-link", "disabled"),
         Output("link-loading", "children"),
+        Output("ngl-link-job", "data"),
+        Output("link-poll", "disabled"),
         Input("connectivity-tab", "value"),
-        Input("data-table", "derived_virtual_data"),
-        Input("data-table", "derived_virtual_selected_rows"),
+        Input("target-table-json", "data"),
+        Input("source-table-json", "data"),
+        Input("data-table", "sort_by"),
+        Input("data-table", "filter_query"),
+        Input("data-table", "selected_row_ids"),
         Input("client-info-json", "data"),
         Input("synapse-table-resolution-json", "data"),
         InputDatastack,
+        State("ngl-link-job", "data"),
     )
+    @request_timer("update_link", c)
     def update_link(
         tab_value,
-        rows,
-        selected_rows,
+        pre_handle,
+        post_handle,
+        sort_by,
+        filter_query,
+        selected_row_ids,
         info_cache,
         synapse_data_resolution,
         datastack_name,
+        link_job,
     ):
         def small_state_text(n):
             return f"Neuroglancer: ({n} partners)"
@@ -588,43 +724,95 @@ def register_callbacks(app, config):
         if info_cache is None:
             info_cache = client.info.info_cache[datastack_name]
 
-        if rows is None or len(rows) == 0:
+        def empty_link():
             url = generate_statebuilder(info_cache, c, df=None, client=client)
-            return url, small_state_text(0), False, ""
-
-        syn_df = rehydrate_dataframe(rows, c.syn_pt_position_split)
-        if len(selected_rows) == 0:
-            sorted_df = syn_df.sort_values(by=c.num_syn_col, ascending=False)
-            if tab_value == "tab-pre":
-                url = generate_statebuilder_pre(
-                    info_cache, c, df=sorted_df, client=client,
-                    data_resolution=synapse_data_resolution,
+            return url, small_state_text(0)
+
+        if tab_value == "tab-pre":
+            handle = pre_handle
+        else:
+            handle = post_handle
+        if not handle:
+            url, text = empty_link()
+            return url, text, False, "", None, True
+
+        targ_df = fetch_result(c, handle, "partners")
+        positions = fetch_positions(c, handle)
+        if targ_df is None or positions is None:
+            return "", "Data expired, please resubmit", True, "", None, True
+        rows = fetch_rows(c, handle, "partners", filter_query, sort_by)
+        if rows is None:
+            return "", "Data expired, please resubmit", True, "", None, True
+        if len(rows) == 0:
+            url, text = empty_link()
+            return url, text, False, "", None, True
+
+        selected_rows = selected_row_numbers(rows, selected_row_ids)
+
+        def build_link():
+            if len(selected_rows) == 0:
+                syn_df = targ_df.iloc[rows].reset_index(drop=True)
+                sorted_df = syn_df.sort_values(by=c.num_syn_col, ascending=False)
+                if tab_value == "tab-pre":
+                    url = generate_statebuilder_pre(
+                        info_cache, c, df=sorted_df, client=client,
+                        positions=positions,
+                        data_resolution=synapse_data_resolution,
+                        link_key=[handle, filter_query, sort_by],
+                    )
+                elif tab_value == "tab-post":
+                    url = generate_statebuilder_post(
+                        info_cache, c, df=sorted_df, client=client,
+                        positions=positions,
+                        data_resolution=synapse_data_resolution,
+                        link_key=[handle, filter_query, sort_by],
+                    )
+                else:
+                    raise ValueError('tab must be "tab-pre" or "tab-post"')
+                return url, small_state_text(len(syn_df))
+            else:
+                if tab_value == "tab-pre":
+                    anno_layer = "Output Synapses"
+                elif tab_value == "tab-post":
+                    anno_layer = "Input Synapses"
+                sub = targ_df.iloc[selected_rows].sort_values(
+                    by=c.num_syn_col, ascending=False
                 )
-            elif tab_value == "tab-post":
-                url = generate_statebuilder_post(
-                    info_cache, c, df=sorted_df, client=client,
+                url = generate_statebuider_syn_grouped(
+                    info_cache, anno_layer, c,
+                    df=sub, client=client,
+                    positions=positions,
+                    preselect=len(selected_rows) == 1,
                     data_resolution=synapse_data_resolution,
+                    link_key=[handle, selected_rows.tolist()],
                 )
-            else:
-                raise ValueError('tab must be "tab-pre" or "tab-post"')
-            small_out_text = small_state_text(len(syn_df))
-        else:
-            if tab_value == "tab-pre":
-                anno_layer = "Output Synapses"
-            elif tab_value == "tab-post":
-                anno_layer = "Input Synapses"
-            sub = syn_df.iloc[selected_rows].sort_values(
-                by=c.num_syn_col, ascending=False
-            )
-            url = generate_statebuider_syn_grouped(
-                info_cache, anno_layer, c,
-                df=sub, client=client,
-                preselect=len(selected_rows) == 1,
-                data_resolution=synapse_data_resolution,
-            )
-            small_out_text = small_state_text(len(selected_rows))
+                return url, small_state_text(len(selected_rows))
 
-        return url, small_out_text, False, ""
+        if c.lazy_links:
+            job_id = start_link_job(c, build_link, previous=link_job)
+            return "", "Preparing Neuroglancer link...", True, "", job_id, False
+        url, text = build_link()
+        return url, text, False, "", None, True
+
+    @app.callback(
+        Output("ngl-link", "href", allow_duplicate=True),
+        Output("ngl-link", "children", allow_duplicate=True),
+        Output("ngl-link", "disabled", allow_duplicate=True),
+        Output("link-poll", "disabled", allow_duplicate=True),
+        Input("link-poll", "n_intervals"),
+        State("ngl-link-job", "data"),
+        prevent_initial_call=True,
+    )
+    def poll_link(_, link_job):
+        status = link_job_status(c, link_job)
+        if status is None:
+            return "", "Link expired, please reselect", True, True
+        if not status["done"]:
+            return no_update, no_update, no_update, False
+        if status["error"] is not None:
+            return "", "Could not build link", True, True
+        url, text = status["result"]
+        return url, text, False, True
 
     @app.callback(
         Output("all-input-link", "children"),
@@ -639,11 +827,12 @@ def register_callbacks(app, config):
         Input("synapse-table-resolution-json", "data"),
         prevent_initial_call=True,
     )
+    @request_timer("generate_all_input_link", c)
     def generate_all_input_link(
         _1,
         _2,
         curr,
-        rows,
+        handle,
         info_cache,
         datastack,
         data_resolution,
@@ -656,8 +845,10 @@ def register_callbacks(app, config):
                     generate_statebuilder_post,
                     config=c,
                     data_resolution=data_resolution,
+                    link_key=[handle],
                 ),
-                rows,
+                fetch_result(c, handle, "partners"),
+                fetch_positions(c, handle),
                 info_cache,
                 datastack,
                 c,
@@ -682,10 +873,11 @@ def register_callbacks(app, config):
         Input("no-type-annotation", "value"),
         prevent_initial_call=True,
     )
+    @request_timer("generate_cell_typed_input_link", c)
     def generate_cell_typed_input_link(
         _1,
         _2,
-        rows,
+        handle,
         info_cache,
         datastack,
         data_resolution,
@@ -705,14 +897,16 @@ def register_callbacks(app, config):
             client = make_client(datastack, c.server_address)
             url = generate_statebuilder_syn_cell_types(
                 info_cache,
-                rows,
+                fetch_result(c, handle, "partners"),
                 c,
                 client=client,
+                positions=fetch_positions(c, handle),
                 cell_type_column=value_column,
                 multipoint=True,
                 fill_null="NoType",
                 data_resolution=data_resolution,
                 include_no_type=include_no_type,
+                link_key=[handle],
             )
         except Exception as e:
             return html.Div(str(e)), "Error", True
@@ -739,17 +933,22 @@ def register_callbacks(app, config):
         Input("synapse-table-resolution-json", "data"),
         prevent_initial_call=True,
     )
+    @request_timer("generate_all_output_link", c)
     def generate_all_output_link(
-        _1, _2, rows, info_cache, datastack, data_resolution
+        _1, _2, handle, info_cache, datastack, data_resolution
     ):
         if not allowed_action_trigger(callback_context, ["all-output-link-button"]):
             return "", "Generate Link", False
         return (
             generic_syn_link_generation(
                 partial(
-                    generate_statebuilder_pre, config=c, data_resolution=data_resolution
+                    generate_statebuilder_pre,
+                    config=c,
+                    data_resolution=data_resolution,
+                    link_key=[handle],
                 ),
-                rows,
+                fetch_result(c, handle, "partners"),
+                fetch_positions(c, handle),
                 info_cache,
                 datastack,
                 c,
@@ -774,10 +973,11 @@ def register_callbacks(app, config):
         Input("no-type-annotation", "value"),
         prevent_initial_call=True,
     )
+    @request_timer("generate_cell_typed_output_link", c)
     def generate_cell_typed_output_link(
         _1,
         _2,
-        rows,
+        handle,
         info_cache,
         datastack,
         data_resolution,
@@ -798,14 +998,16 @@ def register_callbacks(app, config):
             client = make_client(datastack, c.server_address)
             url = generate_statebuilder_syn_cell_types(
                 info_cache,
-                rows,
+                fetch_result(c, handle, "partners"),
                 c,
                 client=client,
+                positions=fetch_positions(c, handle),
                 cell_type_column=value_column,
                 multipoint=True,
                 fill_null="NoType",
                 data_resolution=data_resolution,
                 include_no_type=include_no_type,
+                link_key=[handle],
             )
         except Exception as e:
             return html.Div(str(e)), "Error", True
@@ -124,6 +124,7 @@ class TypedConnectivityConfig(CommonConfig):
             ]
             + self.aggregation_columns
             + [self.num_soma_col]
+            + self.syn_pt_position_mean
         )
 
         self.show_plots = config.get("ct_conn_show_plots", True)
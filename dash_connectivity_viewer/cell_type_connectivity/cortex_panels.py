@@ -6,8 +6,8 @@ bg_color = "White"
 plotly_template = "plotly_white"
 
 
-def bar_fig_df(df, config, color_column, width=450, height=350):
-    bar = bar_plot_df(df, config, color_column)
+def bar_fig_df(plot_data, values, config, color_column, width=450, height=350):
+    bar = bar_plot_df(plot_data, values, config, color_column)
 
     fig = go.Figure()
     fig.add_trace(bar)
@@ -54,9 +54,9 @@ def violin_fig(ndat, height=350, width=200):
     return fig
 
 
-def scatter_fig_df(df, config, color_column, width=350, height=350):
+def scatter_fig_df(plot_data, values, config, width=350, height=350):
     fig = go.Figure()
-    scatter = synapse_soma_scatterplot(df, config, color_column)
+    scatter = synapse_soma_scatterplot(plot_data, values, config)
     fig.add_traces(scatter)
 
     fig.update_layout(
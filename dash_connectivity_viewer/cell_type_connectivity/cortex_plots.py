@@ -2,12 +2,13 @@ from plotly import colors
 import plotly.graph_objects as go
 import numpy as np
 import pandas as pd
+from ..common.transform_utils import depth_from_points
 
 
-def _violin_plot(syn_df, x_col, y_col, name, side, color, xaxis, yaxis):
+def _violin_plot(depths, name, side, color, xaxis, yaxis):
     return go.Violin(
-        x=syn_df[x_col],
-        y=syn_df[y_col],
+        x=np.zeros(len(depths), dtype=np.int64),
+        y=depths,
         side=side,
         scalegroup="syn",
         spanmode="hard",
@@ -18,20 +19,29 @@ def _violin_plot(syn_df, x_col, y_col, name, side, color, xaxis, yaxis):
         xaxis=xaxis,
         yaxis=yaxis,
         hoverinfo="text",
-        hovertext=f"{len(syn_df)} Syn.",
+        hovertext=f"{len(depths)} Syn.",
         # bandwidth=0.2,
     )
 
 
+def synapse_depth_samples(ndat, direction):
+    "Depths of all synapses in one direction, from the partner positions built at load time"
+    if direction == "pre":
+        positions = ndat.partner_positions_out()
+    elif direction == "post":
+        positions = ndat.partner_positions_in()
+    if positions.depths is not None:
+        return positions.depths
+    return depth_from_points(positions.points, ndat.aligned_volume)
+
+
 def post_violin_plot(
     ndat,
     xaxis=None,
     yaxis=None,
 ):
     return _violin_plot(
-        ndat.syn_all_df().query('direction == "post"'),
-        x_col="x",
-        y_col=ndat.config.synapse_depth_column,
+        synapse_depth_samples(ndat, "post"),
         name="Post",
         side="negative",
         color=ndat.config.vis.dendrite_color,
@@ -46,9 +56,7 @@ def pre_violin_plot(
     yaxis=None,
 ):
     return _violin_plot(
-        ndat.syn_all_df().query('direction == "pre"'),
-        x_col="x",
-        y_col=ndat.config.synapse_depth_column,
+        synapse_depth_samples(ndat, "pre"),
         name="Pre",
         side="positive",
         color=ndat.config.vis.axon_color,
@@ -57,6 +65,85 @@ def pre_violin_plot(
     )
 
 
+class SynapsePlotData(object):
+    """Synapse and soma depths of the synapses in a partner table, ready to plot.
+
+    Built once when the partner table is loaded, for the partners with a soma
+    depth. Values used to color or count synapses are per partner, so changing
+    the value column only maps per-partner labels onto the synapses instead of
+    rebuilding a per-synapse dataframe.
+
+    Parameters
+    ----------
+    partner_rows : np.ndarray
+        For each synapse, the row of its partner in the partner table.
+    synapse_depth : np.ndarray
+        Depth of each synapse.
+    soma_depth : np.ndarray
+        Soma depth of each synapse's partner.
+    """
+
+    def __init__(self, partner_rows, synapse_depth, soma_depth):
+        self.partner_rows = np.asarray(partner_rows, dtype=np.int64)
+        self.synapse_depth = np.asarray(synapse_depth, dtype=np.float64)
+        self.soma_depth = np.asarray(soma_depth, dtype=np.float64)
+        # Partner rows are ascending, since synapses are taken in partner table order
+        self.rows, self.partner_index = np.unique(
+            self.partner_rows, return_inverse=True
+        )
+
+    @classmethod
+    def from_partners(cls, targ_df, positions, config, aligned_volume):
+        soma_depth = targ_df[config.soma_depth_column].to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(~np.isnan(soma_depth))
+        root_ids = targ_df[config.root_id_col].to_numpy(dtype=np.int64)[rows]
+        depths = positions.take_depths(root_ids)
+        if depths is None:
+            pts, index = positions.take(root_ids)
+            synapse_depth = depth_from_points(pts, aligned_volume)
+        else:
+            synapse_depth, index = depths
+        return cls(rows[index], synapse_depth, soma_depth[rows][index])
+
+    @classmethod
+    def from_frame(cls, df):
+        "Rebuild from the frame made by `to_frame`"
+        return cls(
+            df["partner_row"].to_numpy(),
+            df["synapse_depth"].to_numpy(),
+            df["soma_depth"].to_numpy(),
+        )
+
+    def to_frame(self):
+        return pd.DataFrame(
+            {
+                "partner_row": self.partner_rows,
+                "synapse_depth": self.synapse_depth,
+                "soma_depth": self.soma_depth,
+            }
+        )
+
+    def partner_values(self, targ_df, column):
+        "Values of a partner table column for the partners in `rows`"
+        return targ_df[column].iloc[self.rows].reset_index(drop=True)
+
+    def groups(self, codes, n_groups):
+        """Indices of the synapses in each group, in synapse order.
+
+        `codes` gives a group between 0 and `n_groups` - 1 for each partner in
+        `rows`, or -1 for partners in no group.
+        """
+        syn_codes = np.asarray(codes)[self.partner_index]
+        order = np.argsort(syn_codes, kind="stable")
+        bounds = np.searchsorted(syn_codes[order], np.arange(n_groups + 1))
+        return [order[bounds[ii] : bounds[ii + 1]] for ii in range(n_groups)]
+
+    def counts(self, codes, n_groups):
+        "Number of synapses in each group, with codes as in `groups`"
+        syn_codes = np.asarray(codes)[self.partner_index]
+        return np.bincount(syn_codes[syn_codes >= 0], minlength=n_groups)
+
+
 from itertools import cycle
 
 
@@ -68,42 +155,40 @@ def _colorscheme(n):
     return [next(clrs) for i in range(n)]
 
 
+def _scatter_labels(values, config):
+    "Per-partner labels and the ordered label types for the scatterplot"
+    if values is None:
+        return pd.Series(config.null_cell_type_label), [config.null_cell_type_label]
+    if values.dtype == "float64":
+        values = values.astype(pd.Int64Dtype())
+        ctypes = sorted(list(np.unique(values.dropna()).astype(str)))
+        labels = values.astype(str).replace({"<NA>": config.null_cell_type_label})
+    else:
+        try:
+            ctypes = values.dtype.categories
+        except:
+            ctypes = sorted(list(np.unique(values.dropna()).astype(str)))
+        labels = values.fillna(config.null_cell_type_label).astype(str)
+    return labels, ctypes
+
+
 def synapse_soma_scatterplot(
-    targ_df,
+    plot_data,
+    values,
     config,
-    color_column,
     xaxis=None,
     yaxis=None,
 ):
-    if color_column is None or color_column == "":
-        fake_cell_type_column = "DummyColumn_"
-        while fake_cell_type_column in targ_df.columns:
-            fake_cell_type_column += "a"
-        color_column = fake_cell_type_column
-        targ_df[color_column] = config.null_cell_type_label
-        ctypes = [config.null_cell_type_label]
+    """Synapse depth against soma depth, one panel per value.
+
+    `values` are the per-partner values of the color column, as returned by
+    `SynapsePlotData.partner_values`, or None for a single panel.
+    """
+    labels, ctypes = _scatter_labels(values, config)
+    if values is None:
+        codes = np.zeros(len(plot_data.rows), dtype=np.int64)
     else:
-        if targ_df[color_column].dtype == "float64":
-            targ_df[color_column] = targ_df[color_column].astype(pd.Int64Dtype())
-            ctypes = sorted(list(np.unique(targ_df[color_column].dropna()).astype(str)))
-            targ_df[color_column] = (
-                targ_df[color_column]
-                .astype(str)
-                .replace({"<NA>": config.null_cell_type_label})
-            )
-        else:
-            try:
-                ctypes = targ_df[color_column].dtype.categories
-                print("from category")
-            except:
-                ctypes = sorted(
-                    list(np.unique(targ_df[color_column].dropna()).astype(str))
-                )
-                print("from values")
-            print(ctypes)
-            targ_df[color_column] = (
-                targ_df[color_column].fillna(config.null_cell_type_label).astype(str)
-            )
+        codes = pd.Categorical(labels, categories=[str(ct) for ct in ctypes]).codes
     if len(ctypes) > 1:
         cmap = _colorscheme(len(ctypes) - 1) + ["#333333"]
     else:
@@ -112,11 +197,11 @@ def synapse_soma_scatterplot(
     alpha_default = {config.null_cell_type_label: 0.2}
     panels = []
     alpha = config.vis.e_opacity
-    for ct, clr in zip(ctypes, cmap):
-        targ_df_r = targ_df.query(f"{color_column}=='{ct}'")
+    groups = plot_data.groups(codes, len(ctypes))
+    for ct, clr, index in zip(ctypes, cmap, groups):
         panel = go.Scattergl(
-            x=targ_df_r[config.soma_depth_column],
-            y=targ_df_r[config.synapse_depth_column],
+            x=plot_data.soma_depth[index],
+            y=plot_data.synapse_depth[index],
             mode="markers",
             marker=dict(
                 color=clr,
@@ -135,20 +220,21 @@ def synapse_soma_scatterplot(
 
 
 def bar_plot_df(
-    targ_df,
+    plot_data,
+    values,
     config,
     color_value,
 ):
-    targ_df = targ_df.replace({config.null_cell_type_label: None}).dropna(
-        subset=color_value
-    )
+    "Synapse counts per value, from the per-partner values of the color column"
+    values = values.replace({config.null_cell_type_label: None})
 
     try:
-        xtypes = targ_df[color_value].dtype.categories
+        xtypes = values.dtype.categories
     except:
-        xtypes = sorted(list(np.unique(targ_df[color_value])))
+        xtypes = sorted(list(np.unique(values.dropna())))
     clrs = _colorscheme(len(xtypes))
-    cnts = targ_df.value_counts(color_value).loc[xtypes]
+    codes = pd.Categorical(values, categories=xtypes).codes
+    cnts = plot_data.counts(codes, len(xtypes))
 
     bar = go.Bar(
         name=color_value,
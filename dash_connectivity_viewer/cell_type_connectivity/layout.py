@@ -171,6 +171,18 @@ def make_table_link_row(state):
                 ),
                 width=1,
             ),
+            dbc.Col(
+                [
+                    dbc.Button(
+                        id="export-csv",
+                        children="Export CSV",
+                        color="secondary",
+                        size="sm",
+                    ),
+                    dcc.Download(id="export-csv-download"),
+                ],
+                width=1,
+            ),
             dbc.Col(
                 html.A(
                     "Instructions for filtering the table",
@@ -213,15 +225,13 @@ def make_data_table_content():
                             "font-size": "12px",
                             "fontWeight": "bold",
                         },
-                        sort_action="native",
+                        sort_action="custom",
                         sort_mode="multi",
-                        filter_action="native",
+                        filter_action="custom",
                         row_selectable="multi",
                         page_current=0,
-                        page_action="native",
+                        page_action="custom",
                         page_size=30,
-                        export_format="csv",
-                        export_headers="names",
                     ),
                     width=10,
                 ),
@@ -551,6 +561,8 @@ def page_layout(state: State = None):
             dcc.Store("synapse-table-resolution-json"),
             dcc.Store("value-columns"),
             dcc.Store("unique-table-values"),
+            dcc.Store("ngl-link-job"),
+            dcc.Interval(id="link-poll", interval=500, disabled=True),
             html.Div(
                 dcc.Input(
                     **create_component_kwargs(
@@ -1,9 +1,11 @@
 import numpy as np
+import pandas as pd
 from ..common.schema_utils import get_table_info
 from ..common.table_lookup import TableViewer
 from ..common.neuron_data_base import NeuronData
 from ..common.transform_utils import extract_depth, compute_depth_y
 from ..common.config import RegisterTable
+from ..common.timing import span
 
 ALLOW_COLUMN_TYPES_DISCRETE = ["integer", "boolean", "string"]
 
@@ -21,6 +23,11 @@ class NeuronDataCortex(NeuronData):
         is_live=True,
     ):
         self.config = config
+        # Set before the base class starts the partner lookups that use them
+        self.value_table = value_table
+        self._value_data = None
+        self._value_columns = None
+        self._app_name = None
         super().__init__(
             object_id,
             client,
@@ -30,10 +37,6 @@ class NeuronDataCortex(NeuronData):
             id_type=id_type,
             is_live=is_live,
         )
-        self.value_table = value_table
-        self._value_data = None
-        self._value_columns = None
-        self._app_name = None
 
     @property
     def aligned_volume(self):
@@ -54,18 +57,20 @@ class NeuronDataCortex(NeuronData):
             is_live=self.is_live,
         )
 
-    def _decorate_synapse_dataframe(self, df, merge_column):
-        df = self._merge_property_tables(df, merge_column)
-
-        if self.config.soma_depth_column is not None and self.soma_table is not None:
-            df = extract_depth(
-                df,
-                self.config.soma_depth_column,
-                self.config.soma_position_agg,
-                self.aligned_volume,
-            )
+    def _decorate_property_tables(self):
+        # Soma depths are computed once per soma and merged with the soma table
+        if self.config.soma_depth_column is None or self.soma_table is None:
+            return
+        soma_data = self._property_tables[self.soma_table]["data"]
+        extract_depth(
+            soma_data,
+            self.config.soma_depth_column,
+            self.config.soma_pt_position,
+            self.aligned_volume,
+        )
 
-        return df
+    def _decorate_synapse_dataframe(self, df, merge_column):
+        return self._merge_property_tables(df, merge_column)
 
     def pre_syn_df_plus(self):
         return self._decorate_synapse_dataframe(
@@ -77,45 +82,42 @@ class NeuronDataCortex(NeuronData):
             self.post_syn_df(), self.config.pre_pt_root_id
         )
 
-    def _decorate_partner_dataframe(self, df):
-        if self.config.soma_depth_column is not None and self.soma_table is not None:
-            df = extract_depth(
-                df,
-                self.config.soma_depth_column,
-                self.config.soma_position_agg,
-                self.aligned_volume,
-            )
+    def _decorate_partner_join(self, join):
+        # Cell type values are gathered in the same pass as the property tables
         val_df = self.value_data
-        if val_df is None:
-            return df
-        else:
-            return df.merge(
-                val_df,
-                on=self.config.root_id_col,
-                how="left",
-            )
+        if val_df is not None:
+            join.add(val_df.set_index(self.config.root_id_col), suffixes=("_x", "_y"))
 
     def partners_in_plus(self):
-        return self._decorate_partner_dataframe(self.partners_in())
+        return self._targ_table("post", True, decorate=True)
 
     def partners_out_plus(self):
-        return self._decorate_partner_dataframe(self.partners_out())
+        return self._targ_table("pre", True, decorate=True)
+
+    def _query_partner_data(self, root_ids):
+        data = super()._query_partner_data(root_ids)
+        if self.value_table is not None:
+            with span("cell_type_table"):
+                data["values"] = self.create_table_viewer(root_ids).table_data()
+        return data
 
     @property
     def value_data(self):
         if self.value_table is None:
             return None
         if self._value_data is None:
-            root_ids = np.unique(
-                np.concatenate(
-                    (
-                        self.pre_syn_df()[self.config.post_pt_root_id],
-                        self.post_syn_df()[self.config.pre_pt_root_id],
+            value_dfs = self._partner_data("values")
+            if len(value_dfs) == 0:
+                root_ids = np.unique(
+                    np.concatenate(
+                        (
+                            self.pre_syn_df()[self.config.post_pt_root_id],
+                            self.post_syn_df()[self.config.pre_pt_root_id],
+                        )
                     )
                 )
-            )
-            tl = self.create_table_viewer(root_ids)
-            self._value_data = tl.table_data().drop_duplicates(
+                value_dfs = [self.create_table_viewer(root_ids).table_data()]
+            self._value_data = pd.concat(value_dfs).drop_duplicates(
                 self.config.root_id_col, keep=False
             )[self.value_table_columns]
         return self._value_data
@@ -126,16 +128,5 @@ class NeuronDataCortex(NeuronData):
             _, self._value_columns = get_table_info(self.value_table, self.client)
         return [self.config.root_id_col] + self._value_columns
 
-    def _get_syn_df(self):
-        super()._get_syn_df()
-        if self.config.synapse_depth_column is not None:
-            for syn_df in [self._pre_syn_df, self._post_syn_df]:
-                extract_depth(
-                    syn_df,
-                    self.config.synapse_depth_column,
-                    self.config.syn_pt_position,
-                    self.aligned_volume,
-                )
-
     def soma_depth(self):
         return compute_depth_y(self.soma_location(), self.aligned_volume)
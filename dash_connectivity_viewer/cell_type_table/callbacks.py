@@ -1,6 +1,6 @@
 import flask
 import datetime
-from dash import callback_context
+from dash import callback_context, no_update
 from dash import dcc
 from dash import html
 import pytz
@@ -20,7 +20,20 @@ from ..common.lookup_utilities import (
     get_version_options,
 )
 from ..common.schema_utils import get_table_info
+from ..common.table_catalog import warm_table_catalog
+from ..common.disk_cache import get_disk_cache
 from ..common.table_lookup import TableViewer
+from ..common.result_store import get_result_store, store_result, fetch_result
+from ..common.table_stream import start_table_stream, stream_progress
+from ..common.table_query import (
+    fetch_rows,
+    page_records,
+    page_count,
+    selected_row_numbers,
+    selected_page_rows,
+    table_columns,
+    export_csv,
+)
 
 # Callbacks using data from URL-encoded parameters requires this import
 from ..common.dash_url_helper import _COMPONENT_ID_TYPE
@@ -86,6 +99,9 @@ def register_callbacks(app, config):
         Dict for standard parameter values
     """
     c = CellTypeConfig(config)
+    get_result_store(c)
+    if c.table_catalog_warmup:
+        warm_table_catalog(c)
 
     @app.callback(
         OutputDatastack,
@@ -155,7 +171,7 @@ def register_callbacks(app, config):
         # Produce ordered list of materialization versions to choose from
         client = make_client(datastack_name, c.server_address)
         version_options, default_value = get_version_options(
-            client, c.disallow_live_query
+            client, c.disallow_live_query, disk_cache=get_disk_cache(c)
         )
         return version_options, default_value
 
@@ -201,13 +217,13 @@ def register_callbacks(app, config):
         pt, cols = get_table_info(cell_type_table, client)
         reg_con = RegisterTable(pt, cols, c)
         return (
-            [{"name": i, "id": i} for i in reg_con.ct_table_columns],
+            table_columns(reg_con.ct_table_columns),
             pt,
             cols,
         )
 
     @app.callback(
-        Output("data-table", "data"),
+        Output("table-json", "data"),
         Output("message-text", "children"),
         Output("main-loading-placeholder", "value"),
         Output("client-info-json", "data"),
@@ -243,14 +259,14 @@ def register_callbacks(app, config):
             )
             if version is None:
                 version = client.materialize.version
-            info_cache = client.info.get_datastack_info()
+            info_cache = dict(client.info.get_datastack_info())
             info_cache["global_server"] = client.server_address
 
         except Exception as e:
-            return [], str(e), "", EMPTY_INFO_CACHE, "danger", c.data_resolution
+            return None, str(e), "", EMPTY_INFO_CACHE, "danger", c.data_resolution
 
         if cell_type_table is None:
-            return [], "No Table Selected", "", info_cache, "info", c.data_resolution
+            return None, "No Table Selected", "", info_cache, "info", c.data_resolution
 
         if len(anno_id) == 0:
             anno_id = None
@@ -290,21 +306,29 @@ def register_callbacks(app, config):
                 timestamp=timestamp,
                 is_live=live_query,
             )
-            df = tv.table_data()
+            if c.table_stream_page_size is None:
+                handle = store_result(c, table=tv.table_data())
+            else:
+                handle = start_table_stream(
+                    c,
+                    "table",
+                    tv.iter_table_data(
+                        c.table_stream_page_size, c.table_stream_first_page_size
+                    ),
+                    expected_rows=tv.expected_rows(),
+                )
             if live_query:
                 output_report = f"Current state of table {cell_type_table}"
             else:
                 output_report = f"Table {cell_type_table} materialized on {timestamp_ngl:%m/%d/%Y} (v{client.materialize.version})"
             output_color = "success"
         except Exception as e:
-            df = pd.DataFrame(columns=c.ct_table_columns)
+            handle = store_result(c, table=pd.DataFrame(columns=c.ct_table_columns))
             output_report = str(e)
             output_color = "danger"
 
-        ct_df = stringify_root_ids(df, stringify_cols=[c.root_id_col])
-
         return (
-            ct_df.to_dict("records"),
+            handle,
             output_report,
             "",
             info_cache,
@@ -313,19 +337,115 @@ def register_callbacks(app, config):
         )
 
     @app.callback(
-        Output("data-table", "selected_rows"),
+        Output("data-table", "selected_row_ids"),
+        Output("data-table", "page_current"),
         Input("reset-selection", "n_clicks"),
+        Input("table-json", "data"),
+        Input("data-table", "filter_query"),
+    )
+    def reset_selection(n_clicks, handle, filter_query):
+        # A new filter returns to the first page but keeps the selection
+        trigger_src = callback_context.triggered_id
+        if trigger_src == "data-table":
+            return no_update, 0
+        return [], 0
+
+    @app.callback(
+        Output("table-progress-json", "data"),
+        Output("table-progress", "value"),
+        Output("table-progress", "label"),
+        Output("table-progress", "color"),
+        Output("table-progress-row", "style"),
+        Output("table-poll", "disabled"),
+        Input("table-poll", "n_intervals"),
+        Input("table-json", "data"),
+        State("table-progress-json", "data"),
+    )
+    def update_progress(_, handle, last_progress):
+        progress = stream_progress(c, handle)
+        if progress is None:
+            return None, 0, "", "primary", {"display": "none"}, True
+        if progress == last_progress:
+            progress_data = no_update
+        else:
+            progress_data = progress
+
+        if progress["error"] is not None:
+            label = f"Loading stopped after {progress['rows']:,} rows: {progress['error']}"
+            return progress_data, 100, label, "danger", {}, True
+        if progress["done"]:
+            return progress_data, 100, "", "primary", {"display": "none"}, True
+        if progress["expected"]:
+            value = min(99, 100 * progress["rows"] / progress["expected"])
+            label = f"Loaded {progress['rows']:,} of {progress['expected']:,} rows"
+        else:
+            value = 100
+            label = f"Loaded {progress['rows']:,} rows"
+        return progress_data, value, label, "primary", {}, False
+
+    @app.callback(
+        Output("data-table", "data"),
+        Output("data-table", "page_count"),
+        Output("data-table", "selected_rows"),
+        Input("table-json", "data"),
+        Input("table-progress-json", "data"),
+        Input("data-table", "page_current"),
+        Input("data-table", "page_size"),
+        Input("data-table", "sort_by"),
+        Input("data-table", "filter_query"),
+        State("data-table", "selected_row_ids"),
+    )
+    def update_table_page(
+        handle,
+        progress,
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+        selected_row_ids,
+    ):
+        rows = fetch_rows(c, handle, "table", filter_query, sort_by)
+        records = page_records(
+            fetch_result(c, handle, "table"),
+            rows,
+            page_current,
+            page_size,
+            c,
+            drop_columns=[],
+        )
+        return (
+            records,
+            page_count(rows, page_size),
+            selected_page_rows(records, selected_row_ids),
+        )
+
+    @app.callback(
+        Output("export-csv-download", "data"),
+        Input("export-csv", "n_clicks"),
+        State("table-json", "data"),
+        State("data-table", "sort_by"),
+        State("data-table", "filter_query"),
+        State("data-table", "columns"),
+        StateCellTypeMenu,
+        prevent_initial_call=True,
     )
-    def reset_selection(n_clicks):
-        return []
+    def export_table(_, handle, sort_by, filter_query, columns, cell_type_table):
+        filename = f"{cell_type_table or 'table'}.csv"
+        data = export_csv(c, handle, "table", filter_query, sort_by, columns, filename)
+        if data is None:
+            return no_update
+        return data
 
     @app.callback(
         Output("ngl-link", "href"),
         Output("ngl-link", "children"),
         Output("ngl-link", "disabled"),
         Output("link-loading-placeholder", "children"),
-        Input("data-table", "derived_virtual_data"),
-        Input("data-table", "derived_virtual_selected_rows"),
+        Input("table-json", "data"),
+        Input("table-progress-json", "data"),
+        Input("data-table", "sort_by"),
+        Input("data-table", "filter_query"),
+        Input("data-table", "selected_row_ids"),
         Input("client-info-json", "data"),
         Input("data-resolution-json", "data"),
         Input("pt-column", "data"),
@@ -334,8 +454,11 @@ def register_callbacks(app, config):
         InputDatastack,
     )
     def update_link(
-        rows,
-        selected_rows,
+        handle,
+        progress,
+        sort_by,
+        filter_query,
+        selected_row_ids,
         info_cache,
         data_resolution,
         pt_column,
@@ -360,18 +483,29 @@ def register_callbacks(app, config):
         if not group_column:
             do_group = False
 
+        if progress is not None and not progress["done"]:
+            return "", "Table loading...", True, ""
+
+        table_df = fetch_result(c, handle, "table")
+        if handle and table_df is None:
+            return "", "Data expired, please resubmit", True, ""
+        rows = fetch_rows(c, handle, "table", filter_query, sort_by)
         if rows is None or len(rows) == 0:
             url = generate_statebuilder(
                 info_cache, c, df=None, client=client, anno_layer="anno"
             )
             return url, state_text(0), True, ""
 
-        df = pd.DataFrame(rows)
-        if len(df) > c.max_dataframe_length and len(selected_rows) == 0:
+        selected_rows = selected_row_numbers(rows, selected_row_ids)
+        if len(rows) > c.max_dataframe_length and len(selected_rows) == 0:
             return "", "State Too Large", True, ""
 
+        if len(selected_rows) > 0:
+            df = table_df.iloc[selected_rows].reset_index(drop=True)
+        else:
+            df = table_df.iloc[rows].reset_index(drop=True)
         url = generate_url_cell_types(
-            selected_rows,
+            [],
             df,
             info_cache,
             c,
@@ -381,8 +515,7 @@ def register_callbacks(app, config):
             cell_type_column=group_column,
             data_resolution=data_resolution,
         )
-        n = len(selected_rows) if selected_rows else len(df)
-        return url, state_text(n), False, ""
+        return url, state_text(len(df)), False, ""
 
     @app.callback(
         Output("whole-table-link", "children"),
@@ -390,7 +523,8 @@ def register_callbacks(app, config):
         Output("whole-table-link-button", "disabled"),
         Input("whole-table-link-button", "n_clicks"),
         Input("submit-button", "n_clicks"),
-        Input("data-table", "data"),
+        Input("table-json", "data"),
+        Input("table-progress-json", "data"),
         Input("client-info-json", "data"),
         InputDatastack,
         Input("data-resolution-json", "data"),
@@ -402,7 +536,8 @@ def register_callbacks(app, config):
     def update_whole_table_link(
         _1,
         _2,
-        rows,
+        handle,
+        progress,
         info_cache,
         datastack,
         data_resolution,
@@ -417,14 +552,18 @@ def register_callbacks(app, config):
         if trigger_src in [
             "submit-button",
             "client-info-json",
-            "data-table",
+            "table-json",
+            "table-progress-json",
             "pt-column",
             "do-group",
             "group-by",
         ]:
             return "", "Generate Link", False
 
-        if rows is None or len(rows) == 0:
+        if progress is not None and not progress["done"]:
+            return html.Div("Table is still loading"), "Generate Link", False
+        df = fetch_result(c, handle, "table")
+        if df is None or len(df) == 0:
             return html.Div("No items to show"), "Error", True
         if pt_column is None:
             return html.Div("No clear point field in table"), "Error", True
@@ -433,7 +572,6 @@ def register_callbacks(app, config):
         if not group_column:
             do_group = False
 
-        df = pd.DataFrame(rows)
         if len(df) > c.max_server_dataframe_length:
             df = df.sample(c.max_server_dataframe_length)
             sampled = True
@@ -209,6 +209,12 @@ def page_layout(state: State = {}):
         color="info",
     )
 
+    progress_row = html.Div(
+        dbc.Progress(id="table-progress", value=0, striped=True, animated=True),
+        id="table-progress-row",
+        style={"display": "none"},
+    )
+
     data_table = html.Div(
         dbc.Row(
             [
@@ -232,15 +238,13 @@ def page_layout(state: State = {}):
                             "font-size": "11px",
                         },
                         style_header={"font-size": "12px", "fontWeight": "bold"},
-                        sort_action="native",
+                        sort_action="custom",
                         sort_mode="multi",
-                        filter_action="native",
+                        filter_action="custom",
                         row_selectable="multi",
                         page_current=0,
-                        page_action="native",
+                        page_action="custom",
                         page_size=50,
-                        export_format="csv",
-                        export_headers="names",
                     ),
                     width=10,
                 )
@@ -281,6 +285,18 @@ def page_layout(state: State = {}):
                 ),
                 width=1,
             ),
+            dbc.Col(
+                [
+                    dbc.Button(
+                        id="export-csv",
+                        children="Export CSV",
+                        color="secondary",
+                        size="sm",
+                    ),
+                    dcc.Download(id="export-csv-download"),
+                ],
+                width=1,
+            ),
             dbc.Col(
                 html.A(
                     "Instructions for filtering the table",
@@ -381,11 +397,15 @@ def page_layout(state: State = {}):
             header_row,
             dbc.Container(cell_type_query, fluid=True),
             dbc.Container(message_row),
+            dbc.Container(progress_row),
             dbc.Container(whole_column_link),
             html.Hr(),
             html.Div(ngl_link),
             html.Div(data_table),
             html.Div(datastack_comp, style={"display": "none"}),
+            dcc.Store(id="table-json"),
+            dcc.Store(id="table-progress-json"),
+            dcc.Interval(id="table-poll", interval=500, disabled=True),
             dcc.Store(id="client-info-json"),
             dcc.Store(id="table-resolution-json"),
             dcc.Store(id="data-resolution-json"),
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+
+async def _in_context(ctx, coro):
+    # Tasks start from the event loop thread's context, so copy over the
+    # caller's context (e.g. the current timing span).
+    for var, value in ctx.items():
+        var.set(value)
+    return await coro
+
+
+class AsyncQueryBackend(object):
+    """Event loop for issuing many materialization queries concurrently.
+
+    The loop runs in a daemon thread shared by all requests in the process.
+    Queries are coroutines: the CAVEclient calls themselves are blocking, so
+    each one runs on a worker thread, but at most `max_concurrency` of them are
+    in flight across all requests, and work waiting for them holds no thread.
+
+    Parameters
+    ----------
+    max_concurrency : int
+        Maximum number of queries running at the same time.
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.loop = asyncio.new_event_loop()
+        # Extra workers for unlimited work (disk cache, postprocessing), so it
+        # never has to wait behind a full set of queries.
+        self._executor = ThreadPoolExecutor(
+            max_concurrency + 4, thread_name_prefix="async-query"
+        )
+        self.loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self._semaphore = self.submit(self._make_semaphore()).result()
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    async def run(self, func, *args, **kwargs):
+        "Run a blocking function on a worker thread without counting it as a query"
+        return await self.loop.run_in_executor(
+            None, partial(contextvars.copy_context().run, func, *args, **kwargs)
+        )
+
+    async def query(self, func, *args, **kwargs):
+        "Run a blocking server call on a worker thread, within the concurrency limit"
+        async with self._semaphore:
+            return await self.run(func, *args, **kwargs)
+
+    async def query_all(self, func, items):
+        "Run `func(item)` for every item concurrently, returning results in order"
+        return await asyncio.gather(*[self.query(func, item) for item in items])
+
+    def submit(self, coro):
+        """Schedule a coroutine from any thread but the loop's own.
+
+        Returns a concurrent.futures.Future, so results can be combined with
+        thread pool futures.
+        """
+        ctx = contextvars.copy_context()
+        return asyncio.run_coroutine_threadsafe(_in_context(ctx, coro), self.loop)
+
+    def submit_query(self, func, *args, **kwargs):
+        "Schedule one blocking server call and return a concurrent.futures.Future"
+        return self.submit(self.query(func, *args, **kwargs))
+
+    def run_sync(self, coro):
+        "Run a coroutine on the loop and wait for its result"
+        return self.submit(coro).result()
+
+
+_backends = {}
+_backend_lock = threading.Lock()
+
+
+def get_query_backend(config):
+    "Return the shared async query backend for a config, or None for thread pools"
+    if config.query_backend != "asyncio":
+        return None
+    with _backend_lock:
+        if config.query_concurrency not in _backends:
+            _backends[config.query_concurrency] = AsyncQueryBackend(
+                config.query_concurrency
+            )
+        return _backends[config.query_concurrency]
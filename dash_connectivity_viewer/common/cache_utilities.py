@@ -0,0 +1,149 @@
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache, TTLCache
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+
+def value_nbytes(value):
+    """Approximate in-memory size of a cached value in bytes.
+
+    DataFrames, arrays and objects with an `nbytes` attribute report their
+    buffer sizes, containers are summed over their items and anything else
+    falls back on `sys.getsizeof`.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(value_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(value_nbytes(v) for v in value.values())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class ResultCache(LRUCache):
+    """Thread-safe LRU cache bounded by bytes, with hit/miss/eviction counters.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum total size of cached values in bytes.
+    getsizeof : callable, optional
+        Function returning the size of a value, by default `value_nbytes`.
+    """
+
+    def __init__(self, maxsize, getsizeof=value_nbytes):
+        super().__init__(maxsize, getsizeof=getsizeof)
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.evictions += 1
+        return key, value
+
+    def lookup(self, key):
+        "Return the cached value for key or None, counting hits and misses"
+        with self.lock:
+            try:
+                value = self[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def store(self, key, value):
+        "Cache a value, silently skipping values larger than the whole cache"
+        with self.lock:
+            try:
+                self[key] = value
+            except ValueError:
+                pass
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self),
+                "currsize": self.currsize,
+                "maxsize": self.maxsize,
+            }
+
+
+_cache_registry = {}
+_registry_lock = threading.Lock()
+
+
+def result_cache(name, maxsize):
+    """Get the process-wide cache with a given name, creating it on first use.
+
+    The size set by the first caller wins; later calls share the same cache.
+    """
+    with _registry_lock:
+        if name not in _cache_registry:
+            _cache_registry[name] = ResultCache(maxsize)
+        return _cache_registry[name]
+
+
+def cache_stats():
+    "Hit, miss, eviction and size counters for every process-wide cache"
+    with _registry_lock:
+        caches = dict(_cache_registry)
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+_loading = {}
+# Keys whose load failed are not retried for a few minutes
+_failed_loads = TTLCache(maxsize=1024, ttl=300)
+_loading_lock = threading.Lock()
+
+
+def _load_into(cache, key, load):
+    try:
+        cache.store(key, load())
+    except Exception as e:
+        with _loading_lock:
+            _failed_loads[key] = True
+        if logger is not None:
+            logger.warning(f"Background load of {key} failed: {e}")
+    finally:
+        with _loading_lock:
+            _loading.pop(key, None)
+
+
+def load_in_background(cache, key, load):
+    """Return the cached value for key, or None while it is being loaded.
+
+    On a miss, `load()` is called in a background thread and its result stored
+    in `cache`. Each key is loaded by one thread at a time, and a key whose
+    load failed is not retried for five minutes.
+    """
+    value = cache.lookup(key)
+    if value is not None:
+        return value
+    with _loading_lock:
+        if key not in _loading and key not in _failed_loads:
+            _loading[key] = threading.Thread(
+                target=_load_into, args=(cache, key, load), daemon=True
+            )
+            _loading[key].start()
+    return None
@@ -0,0 +1,90 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ClientRegistry(object):
+    """Thread-safe, bounded registry of reusable clients.
+
+    Clients are kept per key, e.g. (datastack, server address, auth token,
+    materialization version), so their HTTP sessions, connection pools and info
+    service lookups are reused across requests. The least recently used client
+    is dropped when more than `maxsize` are kept, clients unused for
+    `idle_seconds` are dropped, and every client is rebuilt after `max_age`
+    seconds so that clients without a fixed version pick up new versions.
+
+    Clients are shared between requests and threads, so their state (e.g. the
+    info cache or materialization version) must not be modified after creation.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of clients kept.
+    idle_seconds : float
+        Seconds after the last use at which a client is dropped.
+    max_age : float
+        Seconds after creation at which a client is dropped.
+    """
+
+    def __init__(self, maxsize=32, idle_seconds=600, max_age=3_600):
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        self.max_age = max_age
+        self._clients = OrderedDict()
+        self._build_locks = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, entry, now):
+        _, created, last_used = entry
+        return now - last_used > self.idle_seconds or now - created > self.max_age
+
+    def _evict(self, now):
+        # Dropped clients may still be in use by a request, so their sessions
+        # are closed when they are garbage collected rather than here.
+        for key in [k for k, v in self._clients.items() if self._expired(v, now)]:
+            del self._clients[key]
+        while len(self._clients) > self.maxsize:
+            self._clients.popitem(last=False)
+
+    def _lookup(self, key, now):
+        entry = self._clients.get(key)
+        if entry is None or self._expired(entry, now):
+            return None
+        self._clients[key] = (entry[0], entry[1], now)
+        self._clients.move_to_end(key)
+        return entry[0]
+
+    def get(self, key, factory):
+        "Return the client for key, building it with `factory()` if needed"
+        now = time.time()
+        with self._lock:
+            client = self._lookup(key, now)
+            if client is not None:
+                return client
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Build outside the registry lock, since creating a client queries the
+        # info service, but only once per key when many requests arrive together.
+        with build_lock:
+            with self._lock:
+                client = self._lookup(key, now)
+            if client is not None:
+                return client
+            try:
+                client = factory()
+                with self._lock:
+                    self._clients[key] = (client, now, now)
+                    self._clients.move_to_end(key)
+                    self._evict(now)
+            finally:
+                with self._lock:
+                    self._build_locks.pop(key, None)
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
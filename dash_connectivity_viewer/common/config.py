@@ -1,3 +1,4 @@
+import os
 import copy
 
 ###########################################
@@ -31,6 +32,10 @@ class CommonConfig(object):
         self.target_root_id_per_call = config.get("target_root_id_per_call", 200)
         self.max_chunks = config.get("max_chunks", 20)
         self.pool_maxsize = 2 * self.max_chunks
+        # "threads" queries with per-call thread pools, "asyncio" issues all
+        # queries of all requests on one event loop, limited to query_concurrency
+        self.query_backend = config.get("query_backend", "threads")
+        self.query_concurrency = config.get("query_concurrency", 32)
         self.voxel_resolution = config.get("voxel_resolution")
 
         self.data_resolution = DATA_RESOLUTION
@@ -44,12 +49,68 @@ class CommonConfig(object):
             "max_server_dataframe_length", 20_000
         )
 
+        ###########################
+        ### Server-side caching ###
+        ###########################
+
+        # Total bytes of synapse dataframes kept in memory per process
+        self.synapse_cache_size = config.get("synapse_cache_size", 1_000_000_000)
+        # Live query results are reused within buckets of this many seconds
+        self.live_cache_seconds = config.get("live_cache_seconds", 60)
+        # Optional directory for a Parquet cache shared by all worker processes
+        self.disk_cache_directory = config.get("disk_cache_directory", None)
+        self.disk_cache_size = config.get("disk_cache_size", 10_000_000_000)
+        # Partner tables are kept server-side and referenced by handle in the browser
+        self.result_store_size = config.get("result_store_size", 1_000_000_000)
+        self.result_store_ttl = config.get("result_store_ttl", 3_600)
+        # Number of server worker processes. With more than one, stored results
+        # are shared through a directory that every worker can read.
+        self.worker_processes = config.get(
+            "worker_processes", int(os.environ.get("WEB_CONCURRENCY", 1))
+        )
+        self.result_store_directory = config.get("result_store_directory", None)
+        # Build the table catalog for the dropdown menus when the app starts
+        self.table_catalog_warmup = config.get("table_catalog_warmup", True)
+        # Total bytes of generated Neuroglancer links reused for repeated selections
+        self.link_cache_size = config.get("link_cache_size", 50_000_000)
+        # Build the Neuroglancer link in the background once table interaction pauses
+        self.lazy_links = config.get("lazy_links", False)
+        self.link_debounce_seconds = config.get("link_debounce_seconds", 0.5)
+        self.link_workers = config.get("link_workers", 4)
+        # Total bytes of nucleus id to root id indexes of materialized soma tables
+        self.nucleus_index_cache_size = config.get(
+            "nucleus_index_cache_size", 200_000_000
+        )
+        # Total bytes of materialized soma and cell type tables kept in memory to
+        # look up partner properties. 0 disables snapshots and always queries.
+        self.property_snapshot_cache_size = config.get(
+            "property_snapshot_cache_size", 0
+        )
+        # Tables loaded into snapshots for the latest version when the app starts
+        self.property_snapshot_preload = config.get("property_snapshot_preload", [])
+        # Rows per query when loading whole tables into indexes and snapshots
+        self.snapshot_page_size = config.get("snapshot_page_size", 50_000)
+
+        #####################
+        ### Table loading ###
+        #####################
+
+        # Annotation tables are loaded in pages of this many rows in the background
+        # and shown as they arrive. If None, tables are loaded in one blocking query.
+        self.table_stream_page_size = config.get("table_stream_page_size", 10_000)
+        # Rows in the first page, kept small so that the table appears quickly
+        self.table_stream_first_page_size = config.get(
+            "table_stream_first_page_size", 1_000
+        )
+
         # If None, the info service is used
         self.nucleus_table = config.get("nucleus_table", None)
         self.nucleus_id_column = config.get("nucleus_id_column", "id")
         self.nucleus_filter = config.get("nucleus_filter", {})
 
         self.debug = config.get("debug", False)
+        # Record per-stage request timings as Prometheus metrics served at /metrics
+        self.timing_metrics = config.get("timing_metrics", False)
 
         # Used to look up number of neurons per root id
         self.soma_table = self.nucleus_table
@@ -68,6 +129,7 @@ class CommonConfig(object):
         self.syn_pt_prefix = config.get("syn_position_column", "ctr_pt")
         self.syn_pt_position = bound_pt_position(self.syn_pt_prefix)
         self.syn_pt_position_split = split_pt_position(self.syn_pt_position)
+        self.syn_pt_position_mean = [f"mean_{c}" for c in self.syn_pt_position_split]
 
         self.soma_pt_prefix = config.get("soma_postion_column", "pt")
         self.soma_pt_position = bound_pt_position(self.soma_pt_prefix)
@@ -89,6 +151,9 @@ class CommonConfig(object):
         self.num_soma_col = f"{self.num_soma_prefix}{self.num_soma_suffix}"
 
         self.soma_position_agg = self.soma_pt_position + self.num_soma_suffix
+        # Depth columns are only computed by apps that set them
+        self.soma_depth_column = None
+        self.synapse_depth_column = None
 
         self.synapse_table_columns_base = [
             "id",
@@ -107,7 +172,7 @@ class CommonConfig(object):
 
         self.target_table_display = (
             [self.root_id_col]
-            + split_pt_position(self.syn_pt_position)
+            + self.syn_pt_position_mean
             + [
                 self.num_syn_col,
                 self.num_soma_col,
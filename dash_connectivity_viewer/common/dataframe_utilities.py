@@ -1,9 +1,16 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
 from .schema_utils import table_metadata
 import pandas as pd
 import re
 import numpy as np
 from .transform_utils import extract_depth
+from .cache_utilities import result_cache
+from .property_join import PropertyJoin
+from .disk_cache import get_disk_cache
+from .timing import span, timed, submit_traced
+from .async_query import get_query_backend
+from functools import partial
 import flask
 
 DESIRED_RESOLUTION = [1, 1, 1]
@@ -36,6 +43,22 @@ def _coerce_nullable_dtypes(df):
     return df
 
 
+def chunk_root_ids(root_ids, chunk_size):
+    "Split root ids into arrays of at most chunk_size ids"
+    root_ids = np.asarray(root_ids, dtype=np.int64)
+    return [root_ids[ii : ii + chunk_size] for ii in range(0, len(root_ids), chunk_size)]
+
+
+def _query_root_ids(root_ids):
+    """Distinct nonzero root ids to filter a query by.
+
+    Duplicates are dropped so that, once split into chunks, each root id is
+    queried once and its rows are returned once, as in a single filtered query.
+    """
+    root_ids = np.unique(np.asarray(root_ids))
+    return root_ids[root_ids != 0]
+
+
 def query_table_any(
     table,
     root_id_column,
@@ -44,40 +67,185 @@ def query_table_any(
     timestamp,
     extra_query={},
     is_live=True,
+    chunk_size=None,
+    max_chunks=1,
+    backend=None,
 ):
+    """Query a table, optionally filtered to a list of root ids.
+
+    If `chunk_size` is set, root ids are queried in chunks of at most that many
+    ids with up to `max_chunks` queries running at once, and the results are
+    concatenated in chunk order. If an `AsyncQueryBackend` is given, chunks are
+    queried on it instead and `max_chunks` is replaced by its concurrency limit.
+    """
+    if backend is not None:
+        return backend.run_sync(
+            query_table_any_async(
+                backend,
+                table,
+                root_id_column,
+                root_ids,
+                client,
+                timestamp,
+                extra_query=extra_query,
+                is_live=is_live,
+                chunk_size=chunk_size,
+            )
+        )
     if root_ids is not None:
-        root_ids = np.array(root_ids)
-        root_ids = root_ids[root_ids != 0]
+        root_ids = _query_root_ids(root_ids)
+    _query = _table_query(
+        table, root_id_column, client, timestamp, extra_query, is_live
+    )
+
+    with span(f"query:{table}"):
+        if chunk_size is None or root_ids is None or len(root_ids) <= chunk_size:
+            return _query(root_ids)
+
+        chunks = chunk_root_ids(root_ids, chunk_size)
+        with ThreadPoolExecutor(max(1, min(len(chunks), max_chunks))) as exe:
+            jobs = [submit_traced(exe, _query, chunk) for chunk in chunks]
+        return pd.concat([job.result() for job in jobs], ignore_index=True)
+
+
+async def query_table_any_async(
+    backend,
+    table,
+    root_id_column,
+    root_ids,
+    client,
+    timestamp,
+    extra_query={},
+    is_live=True,
+    chunk_size=None,
+):
+    "Coroutine version of `query_table_any`, querying chunks concurrently on a backend"
+    if root_ids is not None:
+        root_ids = _query_root_ids(root_ids)
+    _query = await backend.query(
+        _table_query, table, root_id_column, client, timestamp, extra_query, is_live
+    )
+
+    with span(f"query:{table}"):
+        if chunk_size is None or root_ids is None or len(root_ids) <= chunk_size:
+            return await backend.query(_query, root_ids)
+
+        dfs = await backend.query_all(_query, chunk_root_ids(root_ids, chunk_size))
+        return pd.concat(dfs, ignore_index=True)
+
+
+def _table_query(table, root_id_column, client, timestamp, extra_query, is_live):
+    """Function querying a table for a list of root ids, or all rows if None.
+
+    The function also takes `offset` and `limit` to query a range of rows.
+    """
     meta = table_metadata(table, client)
     ref_table = meta.get("reference_table")
     print(f"Table metadata for table {table}:", meta)
-    if ref_table is not None:
-        return _query_table_join(
-            table,
-            root_id_column,
-            root_ids,
-            client,
-            timestamp,
-            ref_table,
-            extra_query=extra_query,
-            is_live=is_live,
-        )
-    else:
-        return _query_table_single(
-            table,
-            root_id_column,
-            root_ids,
-            client,
-            timestamp,
-            extra_query=extra_query,
-            is_live=is_live,
-        )
+
+    def _query(query_root_ids, offset=None, limit=None):
+        if ref_table is not None:
+            return _query_table_join(
+                table,
+                root_id_column,
+                query_root_ids,
+                client,
+                timestamp,
+                ref_table,
+                extra_query=extra_query,
+                is_live=is_live,
+                offset=offset,
+                limit=limit,
+            )
+        else:
+            return _query_table_single(
+                table,
+                root_id_column,
+                query_root_ids,
+                client,
+                timestamp,
+                extra_query=extra_query,
+                is_live=is_live,
+                offset=offset,
+                limit=limit,
+            )
+
+    return _query
+
+
+def iter_table_chunks(
+    table,
+    root_id_column,
+    root_ids,
+    client,
+    timestamp,
+    extra_query={},
+    is_live=True,
+    chunk_size=None,
+    max_chunks=1,
+    page_size=10_000,
+    first_page_size=None,
+    backend=None,
+):
+    """Yield the rows of a table in chunks, in order, as they are queried.
+
+    With root ids, the table is queried in chunks of `chunk_size` root ids as in
+    `query_table_any`, on `backend` if given. Otherwise rows are read in pages of `page_size` rows with
+    offset and limit, starting with a page of `first_page_size` rows if set,
+    until a page comes back short.
+    """
+    _query = _table_query(
+        table, root_id_column, client, timestamp, extra_query, is_live
+    )
+    if root_ids is not None:
+        root_ids = _query_root_ids(root_ids)
+        if chunk_size is None:
+            chunk_size = max(len(root_ids), 1)
+        chunks = chunk_root_ids(root_ids, chunk_size)
+        if backend is not None:
+            jobs = [backend.submit_query(_query, chunk) for chunk in chunks]
+            for job in jobs:
+                yield job.result()
+            return
+        with ThreadPoolExecutor(max(1, min(len(chunks), max_chunks))) as exe:
+            jobs = [submit_traced(exe, _query, chunk) for chunk in chunks]
+            for job in jobs:
+                yield job.result()
+        return
+
+    offset = 0
+    limit = first_page_size or page_size
+    while True:
+        with span(f"query:{table}:rows"):
+            df = _query(None, offset=offset, limit=limit)
+        yield df
+        if len(df) < limit:
+            return
+        offset += len(df)
+        limit = page_size
+
+
+def _row_range_kwargs(offset, limit):
+    kwargs = {}
+    if offset is not None:
+        kwargs["offset"] = offset
+    if limit is not None:
+        kwargs["limit"] = limit
+    return kwargs
 
 
 def _query_table_single(
-    table, root_id_column, root_ids, client, timestamp, extra_query, is_live
+    table,
+    root_id_column,
+    root_ids,
+    client,
+    timestamp,
+    extra_query,
+    is_live,
+    offset=None,
+    limit=None,
 ):
-    filter_kwargs = {}
+    filter_kwargs = _row_range_kwargs(offset, limit)
     if root_ids is not None:
         if len(root_ids) == 1:
             if is_live:
@@ -126,16 +294,25 @@ def _query_table_single(
 
 
 def _query_table_join(
-    table, root_id_column, root_ids, client, timestamp, ref_table, extra_query, is_live
+    table,
+    root_id_column,
+    root_ids,
+    client,
+    timestamp,
+    ref_table,
+    extra_query,
+    is_live,
+    offset=None,
+    limit=None,
 ):
-    filter_kwargs = {}
+    filter_kwargs = _row_range_kwargs(offset, limit)
     if root_ids is not None:
         if len(root_ids) == 1:
-            filter_kwargs = {
-                "filter_equal_dict": {ref_table: {root_id_column: root_ids[0]}}
+            filter_kwargs["filter_equal_dict"] = {
+                ref_table: {root_id_column: root_ids[0]}
             }
         else:
-            filter_kwargs = {"filter_in_dict": {ref_table: {root_id_column: root_ids}}}
+            filter_kwargs["filter_in_dict"] = {ref_table: {root_id_column: root_ids}}
     if len(extra_query) != 0:
         if "filter_in_dict" in filter_kwargs:
             filter_kwargs["filter_in_dict"][table].extend(extra_query)
@@ -185,7 +362,37 @@ def _synapse_df(
     synapse_table_columns,
     exclude_autapses=True,
     is_live=True,
+    disk_cache=None,
 ):
+    if disk_cache is not None and not is_live:
+        cache_key = (
+            "synapse",
+            synapse_table,
+            direction,
+            int(root_id),
+            tuple(synapse_table_columns),
+            exclude_autapses,
+        )
+        syn_df = disk_cache.get(
+            cache_key, client.datastack_name, client.materialize.version
+        )
+        if syn_df is not None:
+            return syn_df
+        syn_df = _synapse_df(
+            direction,
+            synapse_table,
+            root_id,
+            client,
+            timestamp,
+            synapse_position_column,
+            synapse_table_columns,
+            exclude_autapses=exclude_autapses,
+            is_live=is_live,
+        )
+        return disk_cache.set(
+            cache_key, client.datastack_name, client.materialize.version, syn_df
+        )
+
     if is_live:
         syn_df = client.materialize.query_table(
             synapse_table,
@@ -212,6 +419,17 @@ def _synapse_df(
     return syn_df[synapse_table_columns]
 
 
+def _add_synapse_depth(syn_df, client, config):
+    "Add the depth of each synapse once, so it is cached with the synapses"
+    if config.synapse_depth_column is None:
+        return syn_df
+    aligned_volume = client.info.get_datastack_info()["aligned_volume"]["name"]
+    return extract_depth(
+        syn_df, config.synapse_depth_column, config.syn_pt_position, aligned_volume
+    )
+
+
+@timed("synapses_pre")
 def pre_synapse_df(
     synapse_table,
     root_id,
@@ -220,7 +438,7 @@ def pre_synapse_df(
     config,
     is_live,
 ):
-    return _synapse_df(
+    syn_df = _synapse_df(
         "pre",
         synapse_table,
         root_id,
@@ -229,11 +447,14 @@ def pre_synapse_df(
         config.syn_pt_position,
         config.synapse_table_columns_dataframe,
         is_live=is_live,
+        disk_cache=get_disk_cache(config),
     )
+    return _add_synapse_depth(syn_df, client, config)
 
 
+@timed("synapses_post")
 def post_synapse_df(synapse_table, root_id, client, timestamp, config, is_live):
-    return _synapse_df(
+    syn_df = _synapse_df(
         "post",
         synapse_table,
         root_id,
@@ -242,7 +463,91 @@ def post_synapse_df(synapse_table, root_id, client, timestamp, config, is_live):
         config.syn_pt_position,
         config.synapse_table_columns_dataframe,
         is_live=is_live,
+        disk_cache=get_disk_cache(config),
     )
+    return _add_synapse_depth(syn_df, client, config)
+
+
+def _synapse_cache_key(synapse_table, root_id, client, timestamp, config, is_live):
+    if is_live:
+        # Live results are only reused within a short time bucket
+        if timestamp is None:
+            bucket = None
+        else:
+            bucket = int(timestamp.timestamp() // config.live_cache_seconds)
+        version = ("live", bucket)
+    else:
+        version = client.materialize.version
+    return (
+        client.datastack_name,
+        synapse_table,
+        int(root_id),
+        version,
+        tuple(config.synapse_table_columns_dataframe),
+        config.synapse_depth_column,
+    )
+
+
+def submit_synapse_data(
+    executor,
+    synapse_table,
+    root_id,
+    client,
+    timestamp,
+    config,
+    is_live=True,
+):
+    """Start the pre and post synapse queries for a root id on an executor.
+
+    If `config.query_backend` is "asyncio", the queries run on the shared async
+    query backend instead. Returns a (pre, post) pair of futures. Results are
+    shared with the synapse cache, so callers must copy them before making
+    changes.
+    """
+    cache = result_cache("synapse", config.synapse_cache_size)
+    key = _synapse_cache_key(synapse_table, root_id, client, timestamp, config, is_live)
+    cached_dfs = cache.lookup(key)
+    if cached_dfs is not None:
+        futures = (Future(), Future())
+        for future, df in zip(futures, cached_dfs):
+            future.set_result(df)
+        return futures
+
+    backend = get_query_backend(config)
+    if backend is not None:
+        submit = backend.submit_query
+    else:
+        submit = partial(submit_traced, executor)
+
+    pre = submit(
+        pre_synapse_df,
+        synapse_table,
+        root_id,
+        client,
+        timestamp,
+        config,
+        is_live,
+    )
+    post = submit(
+        post_synapse_df,
+        synapse_table,
+        root_id,
+        client,
+        timestamp,
+        config,
+        is_live,
+    )
+
+    def _store(_):
+        if pre.done() and post.done():
+            if pre.cancelled() or post.cancelled():
+                return
+            if pre.exception() is None and post.exception() is None:
+                cache.store(key, (pre.result(), post.result()))
+
+    pre.add_done_callback(_store)
+    post.add_done_callback(_store)
+    return pre, post
 
 
 def synapse_data(
@@ -254,108 +559,275 @@ def synapse_data(
     n_threads=2,
     is_live=True,
 ):
-    if n_threads > 2:
-        n_threads = 2
-    with ThreadPoolExecutor(n_threads) as exe:
-        pre = exe.submit(
-            pre_synapse_df,
+    with ThreadPoolExecutor(max(1, min(n_threads, 2))) as exe:
+        pre, post = submit_synapse_data(
+            exe,
             synapse_table,
             root_id,
             client,
             timestamp,
             config,
-            is_live,
+            is_live=is_live,
         )
-        post = exe.submit(
-            post_synapse_df,
+    return pre.result().copy(), post.result().copy()
+
+
+def _synapse_chunk_df(
+    direction,
+    synapse_table,
+    root_ids,
+    client,
+    timestamp,
+    synapse_table_columns,
+    exclude_autapses=True,
+    is_live=True,
+):
+    filter_in_dict = {f"{direction}_pt_root_id": root_ids.tolist()}
+    if is_live:
+        syn_df = client.materialize.query_table(
             synapse_table,
-            root_id,
-            client,
-            timestamp,
-            config,
-            is_live,
+            filter_in_dict=filter_in_dict,
+            split_positions=True,
+            timestamp=timestamp,
+            desired_resolution=DESIRED_RESOLUTION,
+            metadata=False,
+        )
+    else:
+        syn_df = client.materialize.query_table(
+            synapse_table,
+            filter_in_dict=filter_in_dict,
+            split_positions=True,
+            desired_resolution=DESIRED_RESOLUTION,
+            metadata=False,
         )
-    return pre.result(), post.result()
+    syn_df = _coerce_nullable_dtypes(syn_df)
 
+    if exclude_autapses:
+        syn_df = syn_df.query("pre_pt_root_id != post_pt_root_id").reset_index(
+            drop=True
+        )
+    return syn_df[synapse_table_columns]
 
-def stringify_root_ids(df, stringify_cols=None):
-    if stringify_cols is None:
-        stringify_cols = [col for col in df.columns if re.search("_root_id$", col)]
-    for col in stringify_cols:
-        df[col] = df[col].astype(str)
-    return df
 
+@timed("batch_synapses")
+def batch_synapse_df(
+    direction,
+    synapse_table,
+    root_ids,
+    client,
+    timestamp,
+    config,
+    is_live=True,
+):
+    """Synapses of many neurons on one side, queried in chunks of root ids.
 
-def stringify_list(col, df):
-    df[col] = df[col].apply(lambda x: str(x)[1:-1]).astype(str)
-    return df
+    Root ids are split into chunks of `config.target_root_id_per_call` and up to
+    `config.max_chunks` chunks are queried at once, or as many as the async
+    query backend allows if it is enabled.
+    """
+    chunks = chunk_root_ids(np.unique(root_ids), config.target_root_id_per_call)
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=config.synapse_table_columns_dataframe)
+    backend = get_query_backend(config)
+    if backend is not None:
+        _query = partial(
+            _synapse_chunk_df,
+            direction,
+            synapse_table,
+            client=client,
+            timestamp=timestamp,
+            synapse_table_columns=config.synapse_table_columns_dataframe,
+            is_live=is_live,
+        )
+        dfs = backend.run_sync(backend.query_all(_query, chunks))
+        return pd.concat(dfs, ignore_index=True)
+    with ThreadPoolExecutor(min(len(chunks), config.max_chunks)) as exe:
+        jobs = [
+            submit_traced(
+                exe,
+                _synapse_chunk_df,
+                direction,
+                synapse_table,
+                chunk,
+                client,
+                timestamp,
+                config.synapse_table_columns_dataframe,
+                is_live=is_live,
+            )
+            for chunk in chunks
+        ]
+    return pd.concat([job.result() for job in jobs], ignore_index=True)
 
 
-def repopulate_list(col, df):
-    df[col] = df[col].apply(lambda x: [float(y) for y in x.split(",")]).astype(object)
+def join_property_tables(join, property_tables):
+    """Add populated property tables to a `PropertyJoin`.
 
+    Columns coming from each table get the table's suffix, as with
+    `merge_property_tables`.
+    """
+    for attrs in property_tables.values():
+        suffix = attrs.get("suffix", "")
+        property_columns = (
+            [attrs.get("root_id")]
+            + attrs.get("include")
+            + list(attrs.get("aggregate", {}).keys())
+        )
+        join.add(attrs.get("data"), suffixes=("", suffix))
+        join.rename(
+            {
+                c: f"{c}{suffix}"
+                for c in property_columns
+                if f"{c}{suffix}" not in join.names
+            }
+        )
+    return join
 
-def rehydrate_dataframe(rows, columns=[]):
-    df = pd.DataFrame(rows)
-    for col in columns:
-        repopulate_list(col, df)
+
+def fill_soma_count(df, config):
+    "Count partners without a soma as having zero somas"
+    if config.num_soma_col in df.columns:
+        df[config.num_soma_col] = df[config.num_soma_col].fillna(0).astype(int)
     return df
 
 
-def _expand_column(df, column, len_column="num_syn"):
-    def _expand_column(row):
-        return [row[column]] * row[len_column]
+def merge_property_tables(df, property_tables, merge_column, config):
+    """Left-join populated property tables onto a dataframe.
 
-    if len(df) > 0:
-        return np.concatenate(list(df.apply(_expand_column, axis=1)))
-    else:
-        return np.array([])
+    Columns coming from each table get the table's suffix, and the soma count
+    is filled with zero for partners without a soma. All tables are gathered
+    in one pass with a `PropertyJoin`.
+    """
+    join = join_property_tables(PropertyJoin(df, merge_column), property_tables)
+    return fill_soma_count(join.result(), config)
 
 
-def _slam_column(df, column):
-    if len(df) > 0:
-        return np.concatenate(df[column].values)
-    else:
-        return np.array([])
+def read_only_frame(df):
+    """Frame sharing the data of `df` whose NumPy columns cannot be written to.
+
+    In-place writes such as `.loc` assignments raise a ValueError instead of
+    changing the shared data. Adding, removing or renaming columns only changes
+    the new frame.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, np.dtype):
+            values = values.to_numpy().view()
+            values.flags.writeable = False
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def stringify_root_ids(df, stringify_cols=None):
+    if stringify_cols is None:
+        stringify_cols = [col for col in df.columns if re.search("_root_id$", col)]
+    for col in stringify_cols:
+        df[col] = df[col].astype(str)
+    return df
 
 
-def rebuild_synapse_dataframe(rows, config, aligned_volume, value_cols=[]):
-    if len(rows) == 0:
+@timed("rebuild_synapses")
+def rebuild_synapse_dataframe(
+    df, positions, config, aligned_volume, value_cols=[]
+):
+    """Per-synapse dataframe for the partners in `df`.
+
+    Synapse positions come from `positions` and partner values in `value_cols`
+    (plus the soma depth) are repeated for each synapse of the partner.
+    """
+    value_cols = value_cols + [config.soma_depth_column]
+    if len(df) == 0:
         return pd.DataFrame(columns=config.syn_pt_position_split + value_cols)
 
-    df = rehydrate_dataframe(rows, config.syn_pt_position_split).replace("nan", None)
     dfnn = df.dropna(subset=config.soma_depth_column)
-    data_dict = {k: _slam_column(dfnn, k) for k in config.syn_pt_position_split}
-
-    value_cols.append(config.soma_depth_column)
+    pts, index = positions.take(dfnn[config.root_id_col])
+    data_dict = {k: pts[:, ii] for ii, k in enumerate(config.syn_pt_position_split)}
     for col in value_cols:
         if col != "":
-            data_dict[col] = _expand_column(dfnn, col)
-    df_rh = pd.DataFrame(data_dict).replace("nan", None)
-    extract_depth(
-        df_rh,
-        config.synapse_depth_column,
-        config.syn_pt_position,
-        aligned_volume,
-    )
+            data_dict[col] = dfnn[col].to_numpy()[index]
+    df_rh = pd.DataFrame(data_dict)
+    depths = positions.take_depths(dfnn[config.root_id_col])
+    if depths is not None:
+        df_rh[config.synapse_depth_column] = depths[0]
+    else:
+        extract_depth(
+            df_rh,
+            config.synapse_depth_column,
+            config.syn_pt_position,
+            aligned_volume,
+        )
     return df_rh
 
 
-def _get_single_table(
-    table_name,
-    root_ids,
-    root_id_column,
-    include_columns,
-    aggregate_map,
-    client,
-    timestamp,
-    table_filter=None,
-    is_live=True,
+def _property_cache_key(table_name, root_id_column):
+    return ("property_table", table_name, root_id_column)
+
+
+def whole_table(
+    table, root_id_column, client, timestamp, page_size=50_000, disk_cache=None
 ):
-    keep_columns = include_columns.copy()
-    df = query_table_any(
-        table_name, root_id_column, root_ids, client, timestamp, is_live=is_live
+    """All rows of a table at a materialized version, queried in pages.
+
+    If a disk cache is given, the table is read from it if there and written to
+    it otherwise, so it is only queried once for all worker processes.
+    """
+    key = _property_cache_key(table, root_id_column)
+    if disk_cache is not None:
+        df = disk_cache.get(key, client.datastack_name, client.materialize.version)
+        if df is not None:
+            return df
+    df = pd.concat(
+        iter_table_chunks(
+            table,
+            root_id_column,
+            None,
+            client,
+            timestamp,
+            is_live=False,
+            page_size=page_size,
+        ),
+        ignore_index=True,
     )
+    if disk_cache is not None:
+        disk_cache.set(key, client.datastack_name, client.materialize.version, df)
+    return df
+
+
+def _cached_property_rows(
+    disk_cache, table_name, root_id_column, root_ids, client, timestamp, page_size
+):
+    """Rows of a property table for root ids read from the disk cache, or None.
+
+    The disk cache holds each property table once per version, and the rows for
+    the root ids are filtered while reading. On a miss, the whole table is
+    written to the cache in a background thread and None is returned, so the
+    caller queries as usual until it is there.
+    """
+    root_ids = np.unique(np.asarray(root_ids, dtype=np.int64))
+    root_ids = root_ids[root_ids != 0]
+    df = disk_cache.get(
+        _property_cache_key(table_name, root_id_column),
+        client.datastack_name,
+        client.materialize.version,
+        filters=[(root_id_column, "in", root_ids.tolist())],
+    )
+    if df is None:
+        disk_cache.fill_in_background(
+            _property_cache_key(table_name, root_id_column),
+            client.datastack_name,
+            client.materialize.version,
+            lambda: whole_table(
+                table_name, root_id_column, client, timestamp, page_size
+            ),
+        )
+    return df
+
+
+def _reduce_property_table(
+    df, root_id_column, include_columns, aggregate_map, table_filter=None
+):
+    "Filter, aggregate and index a property table by root id"
+    keep_columns = include_columns.copy()
     if table_filter is not None:
         df = df.query(table_filter).reset_index(drop=True)
 
@@ -373,6 +845,103 @@ def _get_single_table(
     return df[keep_columns]
 
 
+def _get_single_table(
+    table_name,
+    root_ids,
+    root_id_column,
+    include_columns,
+    aggregate_map,
+    client,
+    timestamp,
+    table_filter=None,
+    is_live=True,
+    disk_cache=None,
+    chunk_size=None,
+    max_chunks=1,
+    snapshot=None,
+    page_size=50_000,
+):
+    df = None
+    if snapshot is not None:
+        df = snapshot.rows_for(root_ids)
+    elif disk_cache is not None and not is_live:
+        df = _cached_property_rows(
+            disk_cache,
+            table_name,
+            root_id_column,
+            root_ids,
+            client,
+            timestamp,
+            page_size,
+        )
+    if df is None:
+        df = query_table_any(
+            table_name,
+            root_id_column,
+            root_ids,
+            client,
+            timestamp,
+            is_live=is_live,
+            chunk_size=chunk_size,
+            max_chunks=max_chunks,
+        )
+    return _reduce_property_table(
+        df, root_id_column, include_columns, aggregate_map, table_filter
+    )
+
+
+async def _get_single_table_async(
+    backend,
+    table_name,
+    root_ids,
+    root_id_column,
+    include_columns,
+    aggregate_map,
+    client,
+    timestamp,
+    table_filter=None,
+    is_live=True,
+    disk_cache=None,
+    chunk_size=None,
+    snapshot=None,
+    page_size=50_000,
+):
+    df = None
+    if snapshot is not None:
+        df = snapshot.rows_for(root_ids)
+    elif disk_cache is not None and not is_live:
+        df = await backend.run(
+            _cached_property_rows,
+            disk_cache,
+            table_name,
+            root_id_column,
+            root_ids,
+            client,
+            timestamp,
+            page_size,
+        )
+    if df is None:
+        df = await query_table_any_async(
+            backend,
+            table_name,
+            root_id_column,
+            root_ids,
+            client,
+            timestamp,
+            is_live=is_live,
+            chunk_size=chunk_size,
+        )
+    return await backend.run(
+        _reduce_property_table,
+        df,
+        root_id_column,
+        include_columns,
+        aggregate_map,
+        table_filter,
+    )
+
+
+@timed("property_tables")
 def property_table_data(
     root_ids,
     property_mapping,
@@ -380,15 +949,46 @@ def property_table_data(
     timestamp,
     n_threads=2,
     is_live=True,
+    disk_cache=None,
+    chunk_size=None,
+    max_chunks=1,
+    backend=None,
+    snapshots={},
+    page_size=50_000,
 ):
+    """Query property tables for a set of root ids, returning dataframes indexed by root id.
+
+    Tables are queried on `n_threads` threads with up to `max_chunks` chunks each
+    or, if an `AsyncQueryBackend` is given, all chunks of all tables at once
+    within its concurrency limit. Tables with a `TableSnapshot` in `snapshots`
+    are read from it instead. With a disk cache, whole tables are cached per
+    version in pages of `page_size` rows and filtered to the root ids.
+    """
     if len(property_mapping) == 0:
         return {}
 
+    if backend is not None:
+        return backend.run_sync(
+            _property_table_data_async(
+                backend,
+                root_ids,
+                property_mapping,
+                client,
+                timestamp,
+                is_live,
+                disk_cache,
+                chunk_size,
+                snapshots,
+                page_size,
+            )
+        )
+
     jobs = []
     with ThreadPoolExecutor(n_threads) as exe:
         for table_name, attrs in property_mapping.items():
             jobs.append(
-                exe.submit(
+                submit_traced(
+                    exe,
                     _get_single_table,
                     table_name,
                     root_ids,
@@ -399,6 +999,47 @@ def property_table_data(
                     timestamp,
                     attrs.get("table_filter", None),
                     is_live,
+                    disk_cache,
+                    chunk_size,
+                    max_chunks,
+                    snapshots.get(table_name),
+                    page_size,
                 )
             )
     return {tname: job.result() for tname, job in zip(property_mapping, jobs)}
+
+
+async def _property_table_data_async(
+    backend,
+    root_ids,
+    property_mapping,
+    client,
+    timestamp,
+    is_live,
+    disk_cache,
+    chunk_size,
+    snapshots,
+    page_size,
+):
+    dfs = await asyncio.gather(
+        *[
+            _get_single_table_async(
+                backend,
+                table_name,
+                root_ids,
+                attrs.get("root_id"),
+                attrs.get("include", []),
+                attrs.get("aggregate", {}),
+                client,
+                timestamp,
+                attrs.get("table_filter", None),
+                is_live,
+                disk_cache,
+                chunk_size,
+                snapshots.get(table_name),
+                page_size,
+            )
+            for table_name, attrs in property_mapping.items()
+        ]
+    )
+    return dict(zip(property_mapping, dfs))
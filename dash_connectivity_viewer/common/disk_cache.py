@@ -0,0 +1,204 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import pandas as pd
+from cachetools import TTLCache
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+
+def _key_hash(key):
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+class ParquetCache(object):
+    """Shared on-disk cache of query results for materialized versions.
+
+    Dataframes are written as Parquet files under
+    `{directory}/{datastack}/v{version}/{key hash}.parquet`, so every worker
+    process and every restart can reuse results that have already been fetched.
+    Files are written to a temporary name and renamed into place, so readers in
+    other processes never see partial files. Access times are tracked with the
+    file mtime. The size of the directory is counted when it is first needed
+    and then updated with each write, and recounted every `rescan_seconds` to
+    pick up files written by other processes. Once it grows past `max_bytes`,
+    the least recently used files are removed until it is below `evict_to` of
+    that, so that the directory is not walked again on every write.
+
+    Any object with the same `get`/`set` methods can be used as a cache tier.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory for the cache.
+    max_bytes : int
+        Maximum total size of cached files in bytes.
+    """
+
+    suffix = ".parquet"
+    rescan_seconds = 300
+    evict_to = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self._scanned_at = 0
+        self._filling = set()
+        # Keys whose background fill failed are not retried for a few minutes
+        self._failed_fills = TTLCache(maxsize=1024, ttl=300)
+        os.makedirs(directory, exist_ok=True)
+
+    def _version_dir(self, datastack, version):
+        return os.path.join(self.directory, str(datastack), f"v{version}")
+
+    def _path(self, key, datastack, version):
+        return os.path.join(
+            self._version_dir(datastack, version), f"{_key_hash(key)}{self.suffix}"
+        )
+
+    def get(self, key, datastack, version, filters=None):
+        """Return the cached dataframe or None. Only materialized versions are cached.
+
+        `filters` are passed on to `pd.read_parquet` to read only matching rows.
+        """
+        if version is None:
+            return None
+        fn = self._path(key, datastack, version)
+        try:
+            df = pd.read_parquet(fn, filters=filters)
+            os.utime(fn)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not read disk cache file {fn}: {e}")
+            return None
+        return df
+
+    def set(self, key, datastack, version, df):
+        if version is None or df is None:
+            return df
+        fn = self._path(key, datastack, version)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        tmp_fn = f"{fn}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_parquet(tmp_fn)
+            nbytes = os.path.getsize(tmp_fn)
+            if os.path.exists(fn):
+                nbytes -= os.path.getsize(fn)
+            os.replace(tmp_fn, fn)
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not write disk cache file {fn}: {e}")
+            if os.path.exists(tmp_fn):
+                os.remove(tmp_fn)
+            return df
+        self._add_bytes(nbytes)
+        return df
+
+    def fill_in_background(self, key, datastack, version, load):
+        """Write the dataframe returned by `load()` to the cache in a background thread.
+
+        Nothing is done if the key is already cached, being filled by this
+        process, or failed to fill in the last five minutes.
+        """
+        if version is None:
+            return
+        fn = self._path(key, datastack, version)
+        with self._lock:
+            if fn in self._filling or fn in self._failed_fills or os.path.exists(fn):
+                return
+            self._filling.add(fn)
+
+        def _fill():
+            try:
+                self.set(key, datastack, version, load())
+            except Exception as e:
+                with self._lock:
+                    self._failed_fills[fn] = True
+                if logger is not None:
+                    logger.warning(f"Could not fill disk cache file {fn}: {e}")
+            finally:
+                with self._lock:
+                    self._filling.discard(fn)
+
+        threading.Thread(target=_fill, daemon=True).start()
+
+    def _add_bytes(self, nbytes):
+        "Count written bytes and evict once the cache is over size or due a recount"
+        with self._lock:
+            if (
+                self._total_bytes is not None
+                and time.monotonic() - self._scanned_at < self.rescan_seconds
+            ):
+                self._total_bytes += nbytes
+                if self._total_bytes <= self.max_bytes:
+                    return
+        self.evict()
+
+    def _cached_files(self):
+        files = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for fn in filenames:
+                if not fn.endswith(self.suffix):
+                    continue
+                path = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def evict(self):
+        "Remove least recently used files if the cache does not fit in max_bytes"
+        with self._lock:
+            files = self._cached_files()
+            total = sum(f[1] for f in files)
+            if total > self.max_bytes:
+                for _, size, path in sorted(files):
+                    if total <= self.evict_to * self.max_bytes:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            self._total_bytes = total
+            self._scanned_at = time.monotonic()
+
+    def prune_versions(self, datastack, keep_versions):
+        "Remove cached data for materialization versions no longer available"
+        ds_dir = os.path.join(self.directory, str(datastack))
+        if not os.path.isdir(ds_dir):
+            return
+        keep = {f"v{v}" for v in keep_versions}
+        for vdir in os.listdir(ds_dir):
+            if vdir not in keep:
+                shutil.rmtree(os.path.join(ds_dir, vdir), ignore_errors=True)
+                with self._lock:
+                    self._total_bytes = None
+
+
+_disk_caches = {}
+_disk_cache_lock = threading.Lock()
+
+
+def get_disk_cache(config):
+    """Return the shared disk cache tier for a config, or None if not configured"""
+    if config.disk_cache_directory is None:
+        return None
+    with _disk_cache_lock:
+        if config.disk_cache_directory not in _disk_caches:
+            _disk_caches[config.disk_cache_directory] = ParquetCache(
+                config.disk_cache_directory, config.disk_cache_size
+            )
+        return _disk_caches[config.disk_cache_directory]
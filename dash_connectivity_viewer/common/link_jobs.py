@@ -0,0 +1,147 @@
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from .result_store import get_result_store
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+
+class LinkJob(object):
+    """Neuroglancer link built in a background thread after a debounce delay.
+
+    Table interactions that follow each other quickly cancel the previous job
+    while it is still waiting, so only the state for the last interaction is
+    built.
+
+    The job status is kept in the result store, so that any worker process can
+    report it while the link is built in the process that started the job.
+
+    Parameters
+    ----------
+    build : callable
+        Function without arguments returning the link and its button text.
+    store : ResultStore
+        Store the job status is published to.
+    """
+
+    def __init__(self, build, store):
+        self.job_id = uuid.uuid4().hex
+        self.store = store
+        self.result = None
+        self.error = None
+        self.done = False
+        self.cancelled = False
+        self._build = build
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def start(self, delay, executor):
+        self._publish()
+        self._timer = threading.Timer(delay, self._submit, args=(executor,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _submit(self, executor):
+        with self._lock:
+            if self.cancelled or _cancelled(self.store, self.job_id):
+                self.cancelled = True
+                return
+            executor.submit(self._run)
+
+    def _run(self):
+        if self.cancelled:
+            return
+        try:
+            self.result = self._build()
+        except Exception as e:
+            self.error = str(e)
+            if logger is not None:
+                logger.warning(f"Building Neuroglancer link failed: {e}")
+        finally:
+            self.done = True
+            self._publish()
+
+    def cancel(self):
+        "Skip the build if it has not started yet"
+        with self._lock:
+            self.cancelled = True
+            if self._timer is not None:
+                self._timer.cancel()
+
+    def status(self):
+        return {"done": self.done, "result": self.result, "error": self.error}
+
+    def _publish(self):
+        try:
+            self.store.put_status(self.job_id, self.status())
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not publish link job {self.job_id}: {e}")
+
+
+def _cancelled(store, job_id):
+    status = store.get_status(job_id)
+    return status is not None and status.get("cancelled", False)
+
+
+_jobs = TTLCache(maxsize=4096, ttl=3_600)
+_job_lock = threading.Lock()
+_executors = {}
+
+
+def _get_executor(n_workers):
+    with _job_lock:
+        if n_workers not in _executors:
+            _executors[n_workers] = ThreadPoolExecutor(
+                n_workers, thread_name_prefix="link-job"
+            )
+        return _executors[n_workers]
+
+
+def start_link_job(config, build, previous=None):
+    """Build a link in the background and return the job id.
+
+    The build starts after `config.link_debounce_seconds`, and the job with id
+    `previous` is cancelled if it has not started yet.
+    """
+    store = get_result_store(config)
+    cancel_link_job(config, previous)
+    job = LinkJob(build, store)
+    with _job_lock:
+        _jobs[job.job_id] = job
+    job.start(config.link_debounce_seconds, _get_executor(config.link_workers))
+    return job.job_id
+
+
+def cancel_link_job(config, job_id):
+    """Cancel a link job if it has not started yet.
+
+    Jobs started by another worker process are cancelled through their status
+    in the result store and skipped when their debounce delay ends.
+    """
+    if not isinstance(job_id, str):
+        return
+    with _job_lock:
+        job = _jobs.pop(job_id, None)
+    if job is not None:
+        job.cancel()
+        return
+    store = get_result_store(config)
+    status = store.get_status(job_id)
+    if status is not None and not status["done"]:
+        store.put_status(job_id, dict(status, cancelled=True))
+
+
+def link_job_status(config, job_id):
+    """Status of a link job started by any worker process, or None.
+
+    Returns a dict with whether the job is done, its result (the link and
+    button text) and an error message (or None).
+    """
+    if not isinstance(job_id, str):
+        return None
+    return get_result_store(config).get_status(job_id)
@@ -1,3 +1,10 @@
+import os
+import json
+import hashlib
+import inspect
+import weakref
+import binascii
+from functools import wraps
 from nglui import statebuilder
 from nglui.statebuilder import PointAnnotation
 import pandas as pd
@@ -5,7 +12,8 @@ import numpy as np
 from seaborn import color_palette
 from itertools import cycle
 from .schema_utils import bound_pt_position
-from .dataframe_utilities import rehydrate_dataframe
+from .cache_utilities import result_cache
+from .timing import timed
 
 EMPTY_INFO_CACHE = {"aligned_volume": {}, "cell_type_column": None}
 
@@ -100,25 +108,17 @@ def _make_viewer(info_cache, config):
 def _explode_position_df(df, position_split_cols):
     """One row per point — the 4.x equivalent of 3.x PointMapper(multipoint=True).
 
-    Coerces stringified list cells (from dcc.Store JSON round-trip) back to lists,
-    then explodes the three position columns simultaneously.
+    Explodes list-valued position columns simultaneously.
     """
     if df is None or len(df) == 0:
         return df
     cols = [c for c in position_split_cols if c in df.columns]
     if not cols:
         return df
-    df = df.copy()
-    for col in cols:
-        sample = df[col].iloc[0]
-        if isinstance(sample, str):
-            df[col] = df[col].apply(
-                lambda x: [float(y) for y in x.split(",")]
-                if isinstance(x, str) and x else x
-            )
     return df.explode(cols).reset_index(drop=True)
 
 
+@timed("link:to_url")
 def _to_url(vs, info_cache, client, shorten):
     return vs.to_url(
         target_url=viewer_site(info_cache),
@@ -127,6 +127,92 @@ def _to_url(vs, info_cache, client, shorten):
     )
 
 
+# Info cache entries that link builders read
+_LINK_INFO_KEYS = (
+    "aligned_volume",
+    "segmentation_source",
+    "viewer_site",
+    "global_server",
+    "root_id",
+    "ngl_timestamp",
+    "viewer_resolution_x",
+    "viewer_resolution_y",
+    "viewer_resolution_z",
+)
+
+_config_digests = weakref.WeakKeyDictionary()
+
+
+def _config_digest(config):
+    "Hash of a config's settings, computed once per config object"
+    digest = _config_digests.get(config)
+    if digest is None:
+        encoded = json.dumps(vars(config), sort_keys=True, default=str)
+        digest = hashlib.sha1(encoded.encode()).hexdigest()
+        _config_digests[config] = digest
+    return digest
+
+
+def _link_key(name, link_key, arguments):
+    """Cache key for a link builder call, or None if it cannot be cached.
+
+    Dataframes and synapse positions are identified by the caller's `link_key`
+    instead of by value, so building the key does not depend on table size.
+    """
+    content = {"builder": name, "link_key": link_key}
+    for arg, value in arguments.items():
+        if arg == "client":
+            continue
+        if arg == "config":
+            value = _config_digest(value)
+        elif arg == "info_cache":
+            if value is not None:
+                value = {k: value.get(k) for k in _LINK_INFO_KEYS}
+        elif arg == "positions" or isinstance(value, pd.DataFrame):
+            if value is None:
+                continue
+            if link_key is None:
+                return None
+            value = None
+        content[arg] = value
+    encoded = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def memoized_link(func):
+    """Cache the URLs a link builder returns in a process-wide LRU cache.
+
+    Callers pass a `link_key` that identifies the rows the link shows, e.g. the
+    result handle of a partner table with its filter, sort order or selected
+    rows. It is combined with the builder's other arguments (tab, data
+    resolution, root id and datastack info, ...), so repeated selections reuse
+    the finished URL, including a shortened one, instead of rebuilding the state
+    and posting an identical copy to the state server. Calls with a dataframe
+    or positions but no `link_key` are not cached.
+    """
+    signature = inspect.signature(func)
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, link_key=None, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        config = bound.arguments["config"]
+        if not config.link_cache_size:
+            return func(*args, **kwargs)
+
+        key = _link_key(name, link_key, bound.arguments)
+        if key is None:
+            return func(*args, **kwargs)
+        cache = result_cache("links", config.link_cache_size)
+        url = cache.lookup(key)
+        if url is not None:
+            return url
+        return cache.store(key, func(*args, **kwargs))
+
+    return wrapper
+
+
 def _unique_int_ids(df, col):
     if df is None or col not in df.columns or len(df) == 0:
         return []
@@ -139,6 +225,84 @@ def _unique_int_ids(df, col):
     )
 
 
+def _synapse_segments(partners, base_seg):
+    """Segment ids linked to each synapse: the queried cell and the partner, if valid.
+
+    Returns one list per synapse, None where there are no segments.
+    """
+    partners = pd.Series(partners)
+    valid = partners.notna().to_numpy()
+    partner_ids = partners.fillna(0).astype(np.int64).to_numpy()
+    keep = valid & (partner_ids != 0)
+    if base_seg is not None:
+        keep &= partner_ids != base_seg
+        return [
+            [base_seg, partner] if k else [base_seg]
+            for partner, k in zip(partner_ids.tolist(), keep.tolist())
+        ]
+    return [
+        [partner] if k else None
+        for partner, k in zip(partner_ids.tolist(), keep.tolist())
+    ]
+
+
+def _point_annotation_objects(pts, segments, data_resolution):
+    "One nglui PointAnnotation per point"
+    return [
+        PointAnnotation(
+            point=[float(x) for x in pt],
+            segments=seg_ids,
+            resolution=data_resolution,
+        )
+        for pt, seg_ids in zip(pts, segments)
+    ]
+
+
+def _layer_points(pts, data_resolution, layer_resolution):
+    """Points scaled from `data_resolution` to the layer resolution.
+
+    Scales in float64 and rounds to float32 like nglui and Neuroglancer do for
+    `PointAnnotation`s.
+    """
+    pts = np.asarray(pts, dtype=float)
+    if data_resolution:
+        pts = pts * (np.array(data_resolution) / np.array(layer_resolution))
+    return pts.astype(np.float32)
+
+
+def _point_annotation_json(points, partners, base_seg):
+    """Neuroglancer JSON for point annotations, built from arrays.
+
+    `points` are already at the layer resolution (see `_layer_points`). Each
+    point links to `base_seg` and its partner, if valid, as in
+    `_synapse_segments`. Gives the same annotations as converting
+    `_point_annotation_objects`, apart from the random ids, without building an
+    nglui and a Neuroglancer annotation per point.
+    """
+    partners = pd.Series(partners)
+    partner_ids = partners.fillna(0).astype(np.int64).to_numpy()
+    keep = partners.notna().to_numpy() & (partner_ids != 0)
+    if base_seg is not None:
+        keep &= partner_ids != base_seg
+    linked, inverse = np.unique(np.where(keep, partner_ids, 0), return_inverse=True)
+
+    # One segment list per distinct partner, shared by its synapses
+    base = [] if base_seg is None else [np.uint64(base_seg)]
+    segment_lists = [
+        [base + [np.uint64(partner)]] if partner != 0 else [base] if base else None
+        for partner in linked.tolist()
+    ]
+    tokens = binascii.hexlify(os.urandom(20 * len(points))).decode()
+    ids = [tokens[ii : ii + 40] for ii in range(0, len(tokens), 40)]
+    segments = [segment_lists[ii] for ii in inverse.ravel().tolist()]
+    return [
+        {"type": "point", "id": anno_id, "segments": segs, "props": [], "point": pt}
+        if segs is not None
+        else {"type": "point", "id": anno_id, "props": [], "point": pt}
+        for anno_id, segs, pt in zip(ids, segments, points.tolist())
+    ]
+
+
 def _add_dual_linked_synapse_layer(
     vs,
     df,
@@ -147,6 +311,7 @@ def _add_dual_linked_synapse_layer(
     *,
     base_root_id,
     partner_column,
+    positions=None,
     color=None,
     data_resolution=None,
     filter_by_segmentation=False,
@@ -155,52 +320,61 @@ def _add_dual_linked_synapse_layer(
     queried cell (`base_root_id`) and the per-row partner id from
     `partner_column`.
 
+    Points come from `positions` (a PartnerPositions) for the partners in `df`,
+    in row order. Without it, list-valued position columns in `df` are exploded.
+
     nglui's `AnnotationLayer.add_points` only accepts a single `segment_column`,
-    so we build PointAnnotation objects directly to attach two segment ids per
-    annotation. Returns the new layer (or None when nothing was added).
+    so annotations are built directly to attach two segment ids each. When the
+    viewer resolution is known, they are built as Neuroglancer JSON from arrays,
+    which nglui passes through unchanged, and the viewer position is set to the
+    first point. Returns the new layer (or None when nothing was added).
     """
     if df is None or len(df) == 0:
         return None
-    exploded = _explode_position_df(df, config.syn_pt_position_split)
-    if exploded is None or len(exploded) == 0:
-        return None
-    pt_cols = [c for c in config.syn_pt_position_split if c in exploded.columns]
-    if len(pt_cols) != 3:
-        return None
-    pts = exploded[pt_cols].to_numpy()
-
-    if partner_column in exploded.columns:
-        partners = pd.to_numeric(exploded[partner_column], errors="coerce")
+    if positions is not None:
+        pts, index = positions.take(df[partner_column])
+        if len(pts) == 0:
+            return None
+        partners = pd.to_numeric(df[partner_column], errors="coerce").to_numpy()[index]
     else:
-        partners = pd.Series([np.nan] * len(exploded))
+        exploded = _explode_position_df(df, config.syn_pt_position_split)
+        if exploded is None or len(exploded) == 0:
+            return None
+        pt_cols = [c for c in config.syn_pt_position_split if c in exploded.columns]
+        if len(pt_cols) != 3:
+            return None
+        pts = exploded[pt_cols].to_numpy()
 
-    base_seg = int(base_root_id) if base_root_id is not None else None
+        if partner_column in exploded.columns:
+            partners = pd.to_numeric(exploded[partner_column], errors="coerce")
+        else:
+            partners = pd.Series([np.nan] * len(exploded))
 
-    annos = []
-    for pt, partner in zip(pts, partners):
-        seg_ids = []
-        if base_seg is not None:
-            seg_ids.append(base_seg)
-        if pd.notna(partner):
-            partner_int = int(partner)
-            if partner_int != 0 and partner_int != base_seg:
-                seg_ids.append(partner_int)
-        annos.append(
-            PointAnnotation(
-                point=[float(x) for x in pt],
-                segments=seg_ids if seg_ids else None,
-                resolution=data_resolution,
-            )
+    base_seg = int(base_root_id) if base_root_id is not None else None
+    layer_resolution = getattr(vs.dimensions, "resolution", None)
+    if layer_resolution is None:
+        annos = _point_annotation_objects(
+            pts, _synapse_segments(partners, base_seg), data_resolution
         )
+    else:
+        points = _layer_points(pts, data_resolution, layer_resolution)
+        annos = _point_annotation_json(points, partners, base_seg)
+        # nglui only sets the position from nglui annotations
+        vs.position = points[0].tolist()
 
     vs.add_annotation_layer(name=name, linked_segmentation="seg", color=color)
     layer = vs.get_layer(name)
-    layer.add_annotations(annos)
+    if layer_resolution is not None:
+        layer.set_position = False
+    # add_annotations only accepts nglui annotations
+    layer.annotations.extend(annos)
     if filter_by_segmentation:
         layer.filter_by_segmentation = True
     return layer
 
 
+@memoized_link
+@timed("link:generate_statebuilder")
 def generate_statebuilder(
     info_cache,
     config,
@@ -212,6 +386,7 @@ def generate_statebuilder(
     preselect_all=True,
     anno_column="post_pt_root_id",
     anno_layer="syns",
+    positions=None,
     data_resolution=[1, 1, 1],
     shorten="if_long",
 ):
@@ -239,6 +414,7 @@ def generate_statebuilder(
             anno_layer,
             base_root_id=base_root_id,
             partner_column=anno_column,
+            positions=positions,
             data_resolution=data_resolution,
             filter_by_segmentation=True,
         )
@@ -246,12 +422,15 @@ def generate_statebuilder(
     return _to_url(vs, info_cache, client, shorten)
 
 
+@memoized_link
+@timed("link:generate_statebuilder_pre")
 def generate_statebuilder_pre(
     info_cache,
     config,
     df=None,
     *,
     client=None,
+    positions=None,
     data_resolution=[1, 1, 1],
     shorten="if_long",
 ):
@@ -270,18 +449,22 @@ def generate_statebuilder_pre(
             "output_syns",
             base_root_id=rid,
             partner_column=config.root_id_col,
+            positions=positions,
             data_resolution=data_resolution,
         )
 
     return _to_url(vs, info_cache, client, shorten)
 
 
+@memoized_link
+@timed("link:generate_statebuilder_post")
 def generate_statebuilder_post(
     info_cache,
     config,
     df=None,
     *,
     client=None,
+    positions=None,
     data_resolution=[1, 1, 1],
     shorten="if_long",
 ):
@@ -300,12 +483,15 @@ def generate_statebuilder_post(
             "input_syns",
             base_root_id=rid,
             partner_column=config.root_id_col,
+            positions=positions,
             data_resolution=data_resolution,
         )
 
     return _to_url(vs, info_cache, client, shorten)
 
 
+@memoized_link
+@timed("link:generate_statebuider_syn_grouped")
 def generate_statebuider_syn_grouped(
     info_cache,
     anno_name,
@@ -315,6 +501,7 @@ def generate_statebuider_syn_grouped(
     client=None,
     fixed_id_color="#FFFFFF",
     preselect=False,
+    positions=None,
     data_resolution=[1, 1, 1],
     shorten="if_long",
 ):
@@ -342,6 +529,7 @@ def generate_statebuider_syn_grouped(
             anno_name,
             base_root_id=rid,
             partner_column=config.root_id_col,
+            positions=positions,
             data_resolution=data_resolution,
             filter_by_segmentation=True,
         )
@@ -349,6 +537,7 @@ def generate_statebuider_syn_grouped(
     return _to_url(vs, info_cache, client, shorten)
 
 
+@timed("link:generate_url_cell_types")
 def generate_url_cell_types(
     selected_rows,
     df,
@@ -434,9 +623,11 @@ def generate_url_cell_types(
     raise ValueError(f"Unsupported return_as: {return_as!r}")
 
 
+@memoized_link
+@timed("link:generate_statebuilder_syn_cell_types")
 def generate_statebuilder_syn_cell_types(
     info_cache,
-    rows,
+    df,
     config,
     *,
     client=None,
@@ -444,12 +635,14 @@ def generate_statebuilder_syn_cell_types(
     group_annotations=True,
     multipoint=False,
     fill_null=None,
+    positions=None,
     data_resolution=[1, 1, 1],
     include_no_type=True,
     shorten="if_long",
 ):
     """Synapses colored by partner cell type. Returns a Neuroglancer URL."""
-    df = rehydrate_dataframe(rows, config.syn_pt_position_split)
+    if df is None:
+        df = pd.DataFrame()
     if fill_null and include_no_type and cell_type_column in df.columns:
         df = df.copy()
         df[cell_type_column] = df[cell_type_column].fillna(fill_null)
@@ -475,6 +668,7 @@ def generate_statebuilder_syn_cell_types(
             str(ct),
             base_root_id=rid_int,
             partner_column=config.root_id_col,
+            positions=positions,
             color=clr,
             data_resolution=data_resolution,
         )
@@ -1,7 +1,11 @@
 import flask
-from .schema_utils import get_table_info, populate_metadata_cache
+from .schema_utils import get_table_info
+from .table_catalog import get_table_catalog
+from .client_registry import ClientRegistry
+from .async_query import get_query_backend
 from caveclient.tools.caching import CachedClient as CAVEclient
 from .dataframe_utilities import query_table_any
+from .nucleus_index import get_nucleus_index
 import numpy as np
 from cachetools import cached, TTLCache
 from cachetools.keys import hashkey
@@ -9,8 +13,12 @@ from datetime import datetime
 import pytz
 
 
-def get_versions(client, n_years=1):
+def get_versions(client, n_years=1, disk_cache=None):
     version_metadata = client.materialize.get_versions_metadata()
+    if disk_cache is not None:
+        disk_cache.prune_versions(
+            client.datastack_name, [vmeta["version"] for vmeta in version_metadata]
+        )
     now = datetime.now(tz=pytz.UTC)
     keep_versions = {}
     latest_version = 0
@@ -24,8 +32,8 @@ def get_versions(client, n_years=1):
     return keep_versions
 
 
-def get_version_options(client, disallow_live_query):
-    mat_versions = get_versions(client)
+def get_version_options(client, disallow_live_query, disk_cache=None):
+    mat_versions = get_versions(client, disk_cache=disk_cache)
     version_options = []
     if not disallow_live_query:
         version_options.append(
@@ -65,15 +73,12 @@ def get_all_schema_tables(datastack, config, mat_version=None):
     client = make_client(
         datastack, config.server_address, materialize_version=mat_version
     )
-    tables = client.materialize.get_tables()
-    populate_metadata_cache(tables, client)
-    schema_tables = []
-    is_val_source = {
-        t: table_is_value_source(t, client)
-        for t in tables
-        if t not in config.omit_cell_type_tables
-    }
-    schema_tables = [k for k, v in is_val_source.items() if v]
+    catalog = get_table_catalog(client, config.disk_cache_directory)
+    schema_tables = [
+        t
+        for t, entry in catalog.items()
+        if entry["is_value_source"] and t not in config.omit_cell_type_tables
+    ]
     return [{"label": t, "value": t} for t in sorted(schema_tables)]
 
 
@@ -105,29 +110,76 @@ def get_type_tables(datastack, config, mat_version=None):
     return new_tables
 
 
+_client_factory = None
+
+
+def set_client_factory(factory):
+    """Build clients with a different factory, e.g. a local stand-in for offline benchmarks.
+
+    Parameters
+    ----------
+    factory : callable or None
+        Called as `factory(datastack, server_address, materialize_version=None, **kwargs)`
+        in place of the CAVEclient constructor. None restores the default.
+    """
+    global _client_factory
+    _client_factory = factory
+
+
+_client_registry = ClientRegistry(maxsize=32, idle_seconds=600, max_age=3_600)
+
+
+def _client_key(datastack, server_address, auth_token, materialize_version, kwargs):
+    return (
+        datastack,
+        server_address,
+        auth_token,
+        materialize_version,
+        tuple(sorted((k, repr(v)) for k, v in kwargs.items())),
+    )
+
+
 def make_client(datastack, server_address, materialize_version=None, **kwargs):
-    """Build a framework client with appropriate auth token
+    """Return a framework client with appropriate auth token
+
+    Clients are reused across requests, keyed by datastack, server address, auth
+    token, materialization version and client arguments, so HTTP connections and
+    info service lookups are not repeated on every callback. Returned clients
+    are shared and must not be modified.
 
     Parameters
     ----------
     datastack : str
         Datastack name for client
-    config : dict
-        Config dict for settings such as server address.
-    server_address : str, optional
-        Global server address for the client, by default None. If None, uses the config dict.
-
+    server_address : str
+        Global server address for the client.
+    materialize_version : int, optional
+        Materialization version, by default None (the latest version).
     """
+    if _client_factory is not None:
+        return _client_factory(
+            datastack,
+            server_address,
+            materialize_version=materialize_version,
+            **kwargs,
+        )
     try:
         auth_token = flask.g.get("auth_token", None)
     except:
         auth_token = None
-    client = CAVEclient(
-        datastack, server_address=server_address, auth_token=auth_token, **kwargs
+
+    def _build():
+        client = CAVEclient(
+            datastack, server_address=server_address, auth_token=auth_token, **kwargs
+        )
+        if materialize_version:
+            client.materialize.version = materialize_version
+        return client
+
+    key = _client_key(
+        datastack, server_address, auth_token, materialize_version or None, kwargs
     )
-    if materialize_version:
-        client.materialize.version = materialize_version
-    return client
+    return _client_registry.get(key, _build)
 
 
 def get_root_id_from_nuc_id(
@@ -158,6 +210,11 @@ def get_root_id_from_nuc_id(
     [type]
         [description]
     """
+    index = get_nucleus_index(nucleus_table, client, timestamp, config, is_live)
+    if index is not None:
+        root_ids, found = index.roots_for([nuc_id])
+        return root_ids[0] if found[0] else None
+
     df = query_table_any(
         nucleus_table,
         config.soma_pt_root_id,
@@ -166,6 +223,7 @@ def get_root_id_from_nuc_id(
         timestamp=timestamp,
         extra_query={config.nucleus_id_column: [nuc_id]},
         is_live=is_live,
+        backend=get_query_backend(config),
     )
 
     if len(df) == 0:
@@ -182,6 +240,16 @@ def get_nucleus_id_from_root_id(
     timestamp=None,
     is_live=True,
 ):
+    index = get_nucleus_index(nucleus_table, client, timestamp, config, is_live)
+    if index is not None:
+        nucleus_ids, _ = index.nuclei_for([root_id])
+        if len(nucleus_ids) == 0:
+            return None
+        elif len(nucleus_ids) == 1:
+            return nucleus_ids[0]
+        else:
+            return nucleus_ids
+
     df = query_table_any(
         nucleus_table,
         config.soma_pt_root_id,
@@ -189,6 +257,7 @@ def get_nucleus_id_from_root_id(
         client,
         timestamp=timestamp,
         is_live=is_live,
+        backend=get_query_backend(config),
     )
 
     if config.soma_table_query is not None:
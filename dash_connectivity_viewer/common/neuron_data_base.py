@@ -9,8 +9,18 @@ from dash_connectivity_viewer.common.lookup_utilities import (
 )
 
 from .dataframe_utilities import *
+from .disk_cache import get_disk_cache
+from .async_query import get_query_backend
+from .partner_aggregation import aggregate_partners
+from .root_freshness import latest_roots
+from .nucleus_index import get_nucleus_index
+from .property_join import PropertyJoin
+from .property_snapshots import get_table_snapshot
+from .timing import timed, submit_traced
 from .link_utilities import voxel_resolution_from_info
 from multiprocessing import cpu_count
+from concurrent.futures import ThreadPoolExecutor
+import threading
 from ..common.schema_utils import split_pt_position
 
 
@@ -53,7 +63,58 @@ def _synapse_properties(synapse_table, c):
     return syn_props
 
 
+def _query_property_tables(
+    property_tables, root_ids, client, timestamp, n_threads, is_live, config
+):
+    snapshots = {
+        table_name: get_table_snapshot(
+            table_name, attrs.get("root_id"), client, timestamp, config, is_live
+        )
+        for table_name, attrs in property_tables.items()
+    }
+    return property_table_data(
+        root_ids,
+        property_tables,
+        client,
+        timestamp,
+        n_threads,
+        is_live,
+        disk_cache=get_disk_cache(config),
+        chunk_size=config.target_root_id_per_call,
+        max_chunks=config.max_chunks,
+        backend=get_query_backend(config),
+        snapshots={k: v for k, v in snapshots.items() if v is not None},
+        page_size=config.snapshot_page_size,
+    )
+
+
+def _set_property_tables(property_tables, dfs):
+    for k, df in dfs.items():
+        dbf = DataframeBridge(property_tables[k].get("table_bridge_schema", None))
+        property_tables[k]["data"] = dbf.reformat(df).fillna(np.nan)
+        property_tables[k]["data_resolution"] = DESIRED_RESOLUTION
+
+
+def _populate_property_tables(
+    property_tables, root_ids, client, timestamp, n_threads, is_live, config
+):
+    _set_property_tables(
+        property_tables,
+        _query_property_tables(
+            property_tables, root_ids, client, timestamp, n_threads, is_live, config
+        ),
+    )
+
+
 class NeuronData(object):
+    """Synapses, partners and partner properties for one neuron.
+
+    Lookups run as a pipeline on a small thread pool. The synapse and nucleus
+    queries start while the root id is being validated, and partner property
+    queries for each side start as soon as that side's synapses arrive.
+    Accessors block only on the results they need.
+    """
+
     def __init__(
         self,
         object_id,
@@ -83,6 +144,8 @@ class NeuronData(object):
 
         if config.synapse_table is None:
             synapse_table = self._client.info.get_datastack_info().get("synapse_table")
+        else:
+            synapse_table = config.synapse_table
         self._synapse_table = synapse_table
         self._synapse_table_properties = _synapse_properties(synapse_table, config)
 
@@ -100,6 +163,7 @@ class NeuronData(object):
 
         self._pre_syn_df = None
         self._post_syn_df = None
+        self._partner_aggregates = {}
         self._synapse_data_resolution = np.array([1, 1, 1])
 
         self._viewer_resolution = voxel_resolution_from_info(client.info.info_cache)
@@ -110,6 +174,20 @@ class NeuronData(object):
 
         self._partner_soma_table = None
         self._partner_root_ids = None
+
+        # Root check, nucleus lookup, pre and post synapses and one partner
+        # lookup per side can all be in flight at once.
+        self._executor = ThreadPoolExecutor(6)
+        self._pipeline_lock = threading.Lock()
+        self._syn_futures = None
+        self._nucleus_future = None
+        self._partner_futures = []
+        self._partner_results = None
+        # Partners requested for the current root id. Lookups started for an
+        # outdated root id carry an older generation and are ignored.
+        self._root_generation = 0
+        self._requested_partners = np.array([], dtype=np.int64)
+
         if config.debug:
             print(
                 "\nNew datastack: ",
@@ -118,7 +196,6 @@ class NeuronData(object):
                 self._soma_table,
                 "\n",
             )
-        self.check_root_id()
         if self._soma_table is not None:
             self._property_tables.update(
                 _soma_property_entry(
@@ -126,6 +203,7 @@ class NeuronData(object):
                     config,
                 )
             )
+        self.check_root_id()
         if config.debug:
             print(
                 "Confirm datastack: ",
@@ -163,33 +241,151 @@ class NeuronData(object):
         return self._root_id
 
     def check_root_id(self):
+        """Make sure the root id is the latest one.
+
+        Synapse and nucleus lookups for the root id start while it is checked,
+        and are restarted if the root id has to be updated.
+        """
         if self.config.debug:
             print("Check root id: ", self.timestamp, self.root_id)
-        if self.client.chunkedgraph.is_latest_roots(
-            [self.root_id], timestamp=self.timestamp
-        )[0]:
-            pass
-        else:
+        latest = submit_traced(
+            self._executor,
+            timed("root_check")(latest_roots),
+            [self.root_id],
+            self.client,
+            self.timestamp,
+            self.config,
+            is_live=self.is_live,
+        )
+        self._start_root_queries()
+        new_root_id = int(latest.result()[0])
+        if new_root_id != self.root_id:
             self.old_root_id = self.root_id
-            self._root_id = self.client.chunkedgraph.suggest_latest_roots(
+            self._root_id = new_root_id
+            self._start_root_queries()
+
+    def _start_root_queries(self):
+        "Start the synapse, partner and nucleus queries for the current root id"
+        with self._pipeline_lock:
+            if self._syn_futures is not None:
+                for future in list(self._syn_futures) + self._partner_futures:
+                    future.cancel()
+            self._root_generation += 1
+            generation = self._root_generation
+            self._requested_partners = np.array([], dtype=np.int64)
+
+        self._syn_futures = submit_synapse_data(
+            self._executor,
+            self.synapse_table,
+            self.root_id,
+            self.client,
+            self.timestamp,
+            self.config,
+            is_live=self.is_live,
+        )
+        pre, post = self._syn_futures
+        self._partner_futures = [
+            submit_traced(
+                self._executor,
+                timed("partners_pre")(self._query_partner_side),
+                pre,
+                self.config.post_pt_root_id,
+                generation,
+            ),
+            submit_traced(
+                self._executor,
+                timed("partners_post")(self._query_partner_side),
+                post,
+                self.config.pre_pt_root_id,
+                generation,
+            ),
+        ]
+
+        if self.soma_table is not None and self._nucleus_future is not None:
+            self._nucleus_future.cancel()
+        if self.soma_table is not None and self._nucleus_id is None:
+            self._nucleus_future = submit_traced(
+                self._executor,
+                timed("nucleus_lookup")(get_nucleus_id_from_root_id),
                 self.root_id,
-                timestamp=self.timestamp,
+                self.client,
+                self.soma_table,
+                self.config,
+                self.timestamp,
+                self.is_live,
             )
-        pass
+
+    def _query_partner_side(self, syn_future, partner_column, generation):
+        """Query partner data for the partners of one side not yet requested.
+
+        Nothing is queried if the root id has changed since the lookup started.
+        """
+        partners = np.unique(syn_future.result()[partner_column].to_numpy())
+        with self._pipeline_lock:
+            if generation != self._root_generation:
+                return {}
+            root_ids = np.setdiff1d(partners[partners != 0], self._requested_partners)
+            self._requested_partners = np.union1d(self._requested_partners, root_ids)
+        if len(root_ids) == 0:
+            return {}
+        return self._query_partner_data(root_ids)
+
+    def _query_partner_data(self, root_ids):
+        """Raw lookups for a set of partner root ids.
+
+        Returns a dict of results that subclasses can extend with their own lookups.
+        """
+        return {
+            "properties": _query_property_tables(
+                self._property_tables,
+                root_ids,
+                self.client,
+                self.timestamp,
+                self.n_threads,
+                self.is_live,
+                self.config,
+            )
+        }
+
+    def _partner_data(self, key):
+        "Results of the partner lookups under one key, for each side that had new partners"
+        if self._partner_results is None:
+            self._partner_results = [
+                future.result() for future in self._partner_futures
+            ]
+            self.close()
+        return [r[key] for r in self._partner_results if key in r]
+
+    def close(self):
+        """Shut down the lookup thread pool once its queued lookups are done.
+
+        Called once partner data has arrived and when the object is garbage
+        collected, so instances that are only used for synapses do not keep
+        their threads.
+        """
+        self._executor.shutdown(wait=False)
+
+    def __del__(self):
+        # __init__ may have failed before the pool was created
+        if hasattr(self, "_executor"):
+            self.close()
 
     @property
     def nucleus_id(self):
         if self.soma_table is None:
             return None
         if self._nucleus_id is None:
-            self._nucleus_id = get_nucleus_id_from_root_id(
-                self._root_id,
-                self.client,
-                self.soma_table,
-                self.config,
-                self.timestamp,
-                self.is_live,
-            )
+            if self._nucleus_future is not None:
+                self._nucleus_id = self._nucleus_future.result()
+            else:
+                self._nucleus_id = get_nucleus_id_from_root_id(
+                    self._root_id,
+                    self.client,
+                    self.soma_table,
+                    self.config,
+                    self.timestamp,
+                    self.is_live,
+                )
         return self._nucleus_id
 
     @property
@@ -220,27 +416,27 @@ class NeuronData(object):
     def property_tables(self):
         return [k for k in self._property_tables]
 
-    def pre_syn_df(self):
+    def pre_syn_df(self, copy=False):
+        """Output synapses of the neuron.
+
+        The dataframe shares its data with the synapse cache and raises on
+        in-place writes, but columns can be added to it. Use `copy=True` for a
+        writable copy.
+        """
         if self._pre_syn_df is None:
             self._get_syn_df()
-        return self._pre_syn_df.copy()
+        return self._pre_syn_df.copy(deep=copy)
 
-    def post_syn_df(self):
+    def post_syn_df(self, copy=False):
+        "Input synapses of the neuron, shared like `pre_syn_df`"
         if self._post_syn_df is None:
             self._get_syn_df()
-        return self._post_syn_df.copy()
+        return self._post_syn_df.copy(deep=copy)
 
     def _get_syn_df(self):
-        self._pre_syn_df, self._post_syn_df = synapse_data(
-            synapse_table=self.synapse_table,
-            root_id=self.root_id,
-            client=self.client,
-            timestamp=self.timestamp,
-            config=self.config,
-            n_threads=self.n_threads,
-            is_live=self.is_live,
-        )
-        self._populate_property_tables()
+        pre, post = self._syn_futures
+        self._pre_syn_df = read_only_frame(pre.result())
+        self._post_syn_df = read_only_frame(post.result())
 
     @property
     def partner_root_ids(self):
@@ -268,52 +464,90 @@ class NeuronData(object):
     def partners_in(self, properties=True):
         return self._targ_table("post", properties)
 
-    def _targ_table(self, side, properties):
-        if side == "pre":
-            prefix = "post"
-            syn_df_grp = self.pre_syn_df().groupby(f"{prefix}_pt_root_id")
-        elif side == "post":
-            prefix = "pre"
-            syn_df_grp = self.post_syn_df().groupby(f"{prefix}_pt_root_id")
-        targ_df = self._make_simple_targ_df(syn_df_grp).rename(
-            columns={f"{prefix}_pt_root_id": self.config.root_id_col}
+    def _targ_table(self, side, properties, decorate=False):
+        targ_df, _ = self._aggregate_partners(side)
+        join = PropertyJoin(
+            targ_df.rename(
+                columns={self._partner_column(side): self.config.root_id_col}
+            ),
+            self.config.root_id_col,
         )
         if properties:
-            targ_df = self._merge_property_tables(targ_df, self.config.root_id_col)
+            for tn in self.property_tables:
+                self.property_data(tn)
+            join_property_tables(join, self._property_tables)
+        fill_soma = properties and self.config.num_soma_col in join.names
         for cn in self.config.target_table_display:
-            if cn not in targ_df.columns:
-                targ_df[cn] = np.nan
+            if cn not in join.names:
+                join.add_empty(cn)
+        if decorate:
+            self._decorate_partner_join(join)
+        targ_df = join.result()
+        if fill_soma:
+            targ_df = fill_soma_count(targ_df, self.config)
         return targ_df
 
-    def _make_simple_targ_df(self, df_grp):
-        num_syn = df_grp[self.config.syn_pt_position_split[0]].agg(len)
-        syn_data_dict = {}
-        for k in self.config.syn_pt_position_split:
-            syn_data_dict[k] = df_grp[k].agg(list)
-        syn_data_dict[self.config.num_syn_col] = num_syn
-        syn_df = pd.DataFrame(syn_data_dict)
+    def _decorate_partner_join(self, join):
+        "Add extra partner tables to the join of a decorated partner table"
+        pass
+
+    def partner_positions_out(self):
+        return self._partner_positions("pre")
 
-        for k, v in self.config.synapse_aggregation_rules.items():
-            syn_df[k] = df_grp[v["column"]].agg(v["agg"])
-        return syn_df.sort_values(
-            by=self.config.num_syn_col, ascending=False
-        ).reset_index()
+    def partner_positions_in(self):
+        return self._partner_positions("post")
+
+    def _partner_positions(self, side):
+        "Synapse positions grouped by partner, aligned with the partner tables"
+        _, positions = self._aggregate_partners(side)
+        return positions
+
+    def _partner_column(self, side):
+        if side == "pre":
+            return self.config.post_pt_root_id
+        elif side == "post":
+            return self.config.pre_pt_root_id
+
+    def _aggregate_partners(self, side):
+        if side not in self._partner_aggregates:
+            if side == "pre":
+                syn_df = self.pre_syn_df()
+            elif side == "post":
+                syn_df = self.post_syn_df()
+            self._partner_aggregates[side] = aggregate_partners(
+                syn_df,
+                self._partner_column(side),
+                self.config.syn_pt_position_split,
+                self.config.num_syn_col,
+                self.config.synapse_aggregation_rules,
+                depth_column=self.config.synapse_depth_column,
+                mean_position_columns=self.config.syn_pt_position_mean,
+            )
+        targ_df, positions = self._partner_aggregates[side]
+        return targ_df.copy(), positions
 
     def _populate_property_tables(self):
-        dfs = property_table_data(
-            self.partner_root_ids,
-            self._property_tables,
-            self.client,
-            self.timestamp,
-            self.n_threads,
-            self.is_live,
-        )
-        for k, df in dfs.items():
-            dbf = DataframeBridge(
-                self._property_tables[k].get("table_bridge_schema", None)
+        results = self._partner_data("properties")
+        if len(results) == 0:
+            _populate_property_tables(
+                self._property_tables,
+                self.partner_root_ids,
+                self.client,
+                self.timestamp,
+                self.n_threads,
+                self.is_live,
+                self.config,
             )
-            self._property_tables[k]["data"] = dbf.reformat(df).fillna(np.nan)
-            self._property_tables[k]["data_resolution"] = DESIRED_RESOLUTION
+        else:
+            _set_property_tables(
+                self._property_tables,
+                {k: pd.concat([r[k] for r in results]) for k in results[0]},
+            )
+        self._decorate_property_tables()
+
+    def _decorate_property_tables(self):
+        "Add derived columns to the property tables once they are loaded"
+        pass
 
     def property_data(self, table_name):
         if self._property_tables.get(table_name).get("data") is None:
@@ -345,37 +579,30 @@ class NeuronData(object):
 
     def _merge_property_tables(self, df, merge_column):
         for tn in self.property_tables:
-            df = df.merge(
-                self.property_data(tn),
-                left_on=merge_column,
-                right_index=True,
-                how="left",
-                suffixes=("", self.property_column_suffix(tn)),
-            )
-            df.rename(
-                columns={
-                    c: f"{c}{self.property_column_suffix(tn)}"
-                    for c in self.property_columns(tn)
-                    if f"{c}{self.property_column_suffix(tn)}" not in df.columns
-                },
-                inplace=True,
-            )
-
-        if self.soma_table is not None:
-            df[self.config.num_soma_col] = (
-                df[self.config.num_soma_col].fillna(0).astype(int)
-            )
-
-        return df
+            self.property_data(tn)
+        return merge_property_tables(
+            df, self._property_tables, merge_column, self.config
+        )
 
     def _get_own_soma_loc(self):
-        own_soma_df = get_specific_soma(
+        snapshot = get_table_snapshot(
             self.soma_table,
-            self.root_id,
+            self.config.soma_pt_root_id,
             self.client,
             self.timestamp,
+            self.config,
             self.is_live,
         )
+        if snapshot is not None:
+            own_soma_df = snapshot.rows_for([self.root_id])
+        else:
+            own_soma_df = get_specific_soma(
+                self.soma_table,
+                self.root_id,
+                self.client,
+                self.timestamp,
+                self.is_live,
+            )
         if len(own_soma_df) != 1:
             own_soma_loc = np.nan
         else:
@@ -400,3 +627,326 @@ class NeuronData(object):
 
     def soma_location_list(self, length):
         return np.repeat(np.atleast_2d(self.soma_location()), length, axis=0).tolist()
+
+
+class NeuronDataBatch(object):
+    """Connectivity for many neurons at once.
+
+    Synapses for all neurons are fetched with chunked `filter_in_dict` queries
+    and partner properties are looked up once for the union of partners across
+    the batch. Partner tables for each neuron have the same columns as
+    `NeuronData.partners_out` and `NeuronData.partners_in`.
+
+    Parameters
+    ----------
+    object_ids : list
+        Root ids or nucleus ids.
+    client : CAVEclient
+        Client for the datastack.
+    config : CommonConfig
+        App configuration.
+    timestamp : datetime.datetime, optional
+        Timestamp for live queries, by default None.
+    n_threads : int, optional
+        Threads for property table queries, by default the number of cpus.
+    id_type : str, optional
+        "root" or "nucleus", by default "root".
+    is_live : bool, optional
+        If True, uses live queries, by default True.
+    """
+
+    def __init__(
+        self,
+        object_ids,
+        client,
+        config,
+        timestamp=None,
+        n_threads=None,
+        id_type="root",
+        is_live=True,
+    ):
+        self.config = config
+        self._client = make_client(
+            datastack=client.datastack_name,
+            materialize_version=client.materialize.version,
+            server_address=client.server_address,
+            pool_block=True,
+            pool_maxsize=config.pool_maxsize,
+        )
+        self._timestamp = timestamp
+        self.is_live = is_live
+
+        if n_threads is None:
+            n_threads = cpu_count()
+        self.n_threads = n_threads
+
+        datastack_info = None
+        if config.synapse_table is None:
+            datastack_info = self._client.info.get_datastack_info()
+            self._synapse_table = datastack_info.get("synapse_table")
+        else:
+            self._synapse_table = config.synapse_table
+
+        if config.soma_table:
+            self._soma_table = config.soma_table
+        else:
+            if datastack_info is None:
+                datastack_info = self._client.info.get_datastack_info()
+            self._soma_table = datastack_info.get("soma_table")
+
+        self._property_tables = {}
+        if self._soma_table is not None:
+            self._property_tables.update(
+                _soma_property_entry(self._soma_table, config)
+            )
+
+        if id_type == "root":
+            root_ids = np.asarray(object_ids, dtype=np.int64)
+        elif id_type == "nucleus":
+            root_ids = self._root_ids_from_nucleus_ids(object_ids)
+        else:
+            raise ValueError(f"Unknown id type {id_type}")
+        self.old_root_ids = {}
+        self._root_ids = self._check_root_ids(root_ids)
+
+        self._pre_syn_df = None
+        self._post_syn_df = None
+        self._partner_root_ids = None
+        self._partner_aggregates = {"pre": None, "post": None}
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @property
+    def synapse_table(self):
+        return self._synapse_table
+
+    @property
+    def soma_table(self):
+        return self._soma_table
+
+    @property
+    def root_ids(self):
+        return self._root_ids.copy()
+
+    def _root_ids_from_nucleus_ids(self, nucleus_ids):
+        if self.soma_table is None:
+            raise ValueError("No soma table to look up nucleus ids")
+        nucleus_ids = np.asarray(nucleus_ids, dtype=np.int64)
+        index = get_nucleus_index(
+            self.soma_table, self.client, self.timestamp, self.config, self.is_live
+        )
+        if index is not None:
+            root_ids, found = index.roots_for(nucleus_ids)
+            missing = nucleus_ids[~found]
+            if len(missing) > 0:
+                raise Exception(f"Nucleus IDs not found in soma table: {missing.tolist()}")
+            return root_ids
+
+        df = query_table_any(
+            self.soma_table,
+            self.config.soma_pt_root_id,
+            None,
+            self.client,
+            self.timestamp,
+            extra_query={self.config.nucleus_id_column: nucleus_ids.tolist()},
+            is_live=self.is_live,
+            backend=get_query_backend(self.config),
+        ).drop_duplicates(self.config.nucleus_id_column)
+        nuc_to_root = df.set_index(self.config.nucleus_id_column)[
+            self.config.soma_pt_root_id
+        ]
+        missing = nucleus_ids[~np.isin(nucleus_ids, nuc_to_root.index)]
+        if len(missing) > 0:
+            raise Exception(f"Nucleus IDs not found in soma table: {missing.tolist()}")
+        return nuc_to_root.loc[nucleus_ids].to_numpy(dtype=np.int64)
+
+    def _check_root_ids(self, root_ids):
+        if len(root_ids) == 0:
+            return root_ids
+        new_root_ids = latest_roots(
+            root_ids, self.client, self.timestamp, self.config, is_live=self.is_live
+        )
+        for ii in np.flatnonzero(new_root_ids != root_ids):
+            self.old_root_ids[int(new_root_ids[ii])] = int(root_ids[ii])
+        return new_root_ids
+
+    def _get_syn_df(self):
+        with ThreadPoolExecutor(2) as exe:
+            pre = submit_traced(
+                exe,
+                batch_synapse_df,
+                "pre",
+                self.synapse_table,
+                self._root_ids,
+                self.client,
+                self.timestamp,
+                self.config,
+                self.is_live,
+            )
+            post = submit_traced(
+                exe,
+                batch_synapse_df,
+                "post",
+                self.synapse_table,
+                self._root_ids,
+                self.client,
+                self.timestamp,
+                self.config,
+                self.is_live,
+            )
+        self._pre_syn_df = read_only_frame(pre.result())
+        self._post_syn_df = read_only_frame(post.result())
+        _populate_property_tables(
+            self._property_tables,
+            self.partner_root_ids,
+            self.client,
+            self.timestamp,
+            self.n_threads,
+            self.is_live,
+            self.config,
+        )
+
+    def pre_syn_df(self, copy=False):
+        "Output synapses of every neuron in the batch, see `NeuronData.pre_syn_df`"
+        if self._pre_syn_df is None:
+            self._get_syn_df()
+        return self._pre_syn_df.copy(deep=copy)
+
+    def post_syn_df(self, copy=False):
+        "Input synapses of every neuron in the batch, see `NeuronData.pre_syn_df`"
+        if self._post_syn_df is None:
+            self._get_syn_df()
+        return self._post_syn_df.copy(deep=copy)
+
+    @property
+    def partner_root_ids(self):
+        "Unique partners across the whole batch"
+        if self._partner_root_ids is None:
+            if self._pre_syn_df is None:
+                self._get_syn_df()
+            root_ids = np.unique(
+                np.concatenate(
+                    (
+                        self._pre_syn_df[self.config.post_pt_root_id].values,
+                        self._post_syn_df[self.config.pre_pt_root_id].values,
+                    )
+                )
+            )
+            self._partner_root_ids = root_ids[root_ids != 0]
+        return self._partner_root_ids
+
+    def _aggregate_partners(self, side):
+        "Partner tables and positions for every neuron on one side"
+        if self._partner_aggregates[side] is None:
+            if side == "pre":
+                syn_df = self.pre_syn_df()
+                own_column = self.config.pre_pt_root_id
+                partner_column = self.config.post_pt_root_id
+            elif side == "post":
+                syn_df = self.post_syn_df()
+                own_column = self.config.post_pt_root_id
+                partner_column = self.config.pre_pt_root_id
+
+            own_ids = syn_df[own_column].to_numpy(dtype=np.int64)
+            order = np.argsort(own_ids, kind="stable")
+            cell_ids, starts = np.unique(own_ids[order], return_index=True)
+            offsets = np.append(starts, len(own_ids))
+
+            aggregates = {}
+            for root_id in np.unique(self._root_ids):
+                ii = np.searchsorted(cell_ids, root_id)
+                if ii < len(cell_ids) and cell_ids[ii] == root_id:
+                    cell_df = syn_df.iloc[order[offsets[ii] : offsets[ii + 1]]]
+                else:
+                    cell_df = syn_df.iloc[:0]
+                targ_df, positions = aggregate_partners(
+                    cell_df,
+                    partner_column,
+                    self.config.syn_pt_position_split,
+                    self.config.num_syn_col,
+                    self.config.synapse_aggregation_rules,
+                    mean_position_columns=self.config.syn_pt_position_mean,
+                )
+                aggregates[int(root_id)] = (
+                    targ_df.rename(columns={partner_column: self.config.root_id_col}),
+                    positions,
+                )
+            self._partner_aggregates[side] = aggregates
+        return self._partner_aggregates[side]
+
+    def _targ_tables(self, side, properties):
+        targ_dfs = {}
+        for root_id, (targ_df, _) in self._aggregate_partners(side).items():
+            targ_df = targ_df.copy()
+            if properties:
+                targ_df = merge_property_tables(
+                    targ_df,
+                    self._property_tables,
+                    self.config.root_id_col,
+                    self.config,
+                )
+            for cn in self.config.target_table_display:
+                if cn not in targ_df.columns:
+                    targ_df[cn] = np.nan
+            targ_dfs[root_id] = targ_df
+        return targ_dfs
+
+    def partners_out(self, properties=True):
+        "Dict of root id to output partner table for each neuron in the batch"
+        return self._targ_tables("pre", properties)
+
+    def partners_in(self, properties=True):
+        "Dict of root id to input partner table for each neuron in the batch"
+        return self._targ_tables("post", properties)
+
+    def partner_positions_out(self):
+        return {k: v[1] for k, v in self._aggregate_partners("pre").items()}
+
+    def partner_positions_in(self):
+        return {k: v[1] for k, v in self._aggregate_partners("post").items()}
+
+    def edge_list(self, properties=True):
+        """All partner tables stacked into one long-form edge list.
+
+        Each row is an edge between a neuron of the batch (`query_root_id`) and a
+        partner, with `direction` "out" for its output synapses and "in" for its
+        input synapses. Edges between two neurons of the batch appear once for
+        each of them.
+        """
+        dfs = []
+        for direction, tables in (
+            ("out", self.partners_out(properties)),
+            ("in", self.partners_in(properties)),
+        ):
+            for root_id, targ_df in tables.items():
+                edge_df = targ_df.copy()
+                edge_df.insert(0, "direction", direction)
+                edge_df.insert(0, "query_root_id", root_id)
+                if direction == "out":
+                    edge_df.insert(2, self.config.pre_pt_root_id, root_id)
+                    edge_df.insert(
+                        3, self.config.post_pt_root_id, targ_df[self.config.root_id_col]
+                    )
+                else:
+                    edge_df.insert(
+                        2, self.config.pre_pt_root_id, targ_df[self.config.root_id_col]
+                    )
+                    edge_df.insert(3, self.config.post_pt_root_id, root_id)
+                dfs.append(edge_df)
+        if len(dfs) == 0:
+            return pd.DataFrame(
+                columns=[
+                    "query_root_id",
+                    "direction",
+                    self.config.pre_pt_root_id,
+                    self.config.post_pt_root_id,
+                ]
+                + self.config.target_table_display
+            )
+        return pd.concat(dfs, ignore_index=True)
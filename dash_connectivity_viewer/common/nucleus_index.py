@@ -0,0 +1,151 @@
+import numpy as np
+from .cache_utilities import result_cache, load_in_background
+from .dataframe_utilities import whole_table
+from .disk_cache import get_disk_cache
+from .timing import span
+
+
+class NucleusIndex(object):
+    """Nucleus id and root id lookups for one snapshot of a soma table.
+
+    Nucleus ids are held sorted with their root ids, and root ids sorted with
+    the nucleus ids of the rows that pass `soma_table_query`, so lookups in
+    either direction are binary searches over NumPy arrays.
+
+    Parameters
+    ----------
+    nucleus_ids : array-like
+        Nucleus id of every row of the soma table.
+    root_ids : array-like
+        Root id of every row of the soma table.
+    in_query : array-like of bool
+        Whether each row passes `soma_table_query`.
+    """
+
+    def __init__(self, nucleus_ids, root_ids, in_query):
+        nucleus_ids = np.asarray(nucleus_ids, dtype=np.int64)
+        root_ids = np.asarray(root_ids, dtype=np.int64)
+        in_query = np.asarray(in_query, dtype=bool)
+
+        nucleus_ids, first = np.unique(nucleus_ids, return_index=True)
+        self.nucleus_ids = nucleus_ids
+        self.nucleus_roots = root_ids[first]
+        self.in_query = in_query[first]
+
+        order = np.argsort(self.nucleus_roots[self.in_query], kind="stable")
+        self.root_ids = self.nucleus_roots[self.in_query][order]
+        self.root_nuclei = self.nucleus_ids[self.in_query][order]
+
+    @classmethod
+    def from_frame(cls, df, config):
+        if config.soma_table_query is not None:
+            in_query = df.eval(config.soma_table_query).to_numpy(dtype=bool)
+        else:
+            in_query = np.ones(len(df), dtype=bool)
+        return cls(
+            df[config.nucleus_id_column].to_numpy(),
+            df[config.soma_pt_root_id].to_numpy(),
+            in_query,
+        )
+
+    @property
+    def nbytes(self):
+        return sum(
+            arr.nbytes
+            for arr in (
+                self.nucleus_ids,
+                self.nucleus_roots,
+                self.in_query,
+                self.root_ids,
+                self.root_nuclei,
+            )
+        )
+
+    def roots_for(self, nucleus_ids, apply_query=False):
+        """Root id of each nucleus id.
+
+        Returns
+        -------
+        root_ids : np.ndarray
+            Root id for each nucleus id, 0 where it was not found.
+        found : np.ndarray
+            Boolean mask of the nucleus ids found in the table (and passing
+            `soma_table_query` if `apply_query` is set).
+        """
+        nucleus_ids = np.asarray(nucleus_ids, dtype=np.int64)
+        if len(self.nucleus_ids) == 0:
+            return np.zeros(len(nucleus_ids), dtype=np.int64), np.zeros(
+                len(nucleus_ids), dtype=bool
+            )
+        idx = np.searchsorted(self.nucleus_ids, nucleus_ids)
+        idx[idx == len(self.nucleus_ids)] = 0
+        found = self.nucleus_ids[idx] == nucleus_ids
+        if apply_query:
+            found &= self.in_query[idx]
+        return np.where(found, self.nucleus_roots[idx], 0), found
+
+    def nuclei_for(self, root_ids):
+        """Nucleus ids passing `soma_table_query` for each root id.
+
+        Returns
+        -------
+        nucleus_ids : np.ndarray
+            Nucleus ids of all root ids, concatenated in the order of the root ids.
+        counts : np.ndarray
+            Number of nucleus ids for each root id.
+        """
+        root_ids = np.asarray(root_ids, dtype=np.int64)
+        lo = np.searchsorted(self.root_ids, root_ids, side="left")
+        counts = np.searchsorted(self.root_ids, root_ids, side="right") - lo
+        offsets = np.cumsum(counts) - counts
+        take = np.repeat(lo - offsets, counts) + np.arange(counts.sum())
+        return self.root_nuclei[take], counts
+
+
+def _index_key(table, client, config):
+    return (
+        client.datastack_name,
+        client.materialize.version,
+        table,
+        config.nucleus_id_column,
+        config.soma_pt_root_id,
+        config.soma_table_query,
+    )
+
+
+def _load_index(table, client, timestamp, config):
+    with span("nucleus_index:load"):
+        df = whole_table(
+            table,
+            config.soma_pt_root_id,
+            client,
+            timestamp,
+            page_size=config.snapshot_page_size,
+            disk_cache=get_disk_cache(config),
+        )
+        index = NucleusIndex.from_frame(df, config)
+    if config.debug:
+        print(f"Loaded nucleus index for {table}: {len(index.nucleus_ids)} nuclei")
+    return index
+
+
+def get_nucleus_index(table, client, timestamp, config, is_live=True):
+    """Nucleus index of a soma table for the client's materialization version.
+
+    Indexes are only built for materialized versions, where the table cannot
+    change. The first request for a version starts loading the whole table in
+    a background thread and returns None until it is done, so callers fall
+    back on querying the ids they need. Loaded indexes are shared by all
+    requests in the process and evicted by size across versions.
+
+    Returns
+    -------
+    NucleusIndex or None
+    """
+    if is_live or table is None or not config.nucleus_index_cache_size:
+        return None
+    return load_in_background(
+        result_cache("nucleus_index", config.nucleus_index_cache_size),
+        _index_key(table, client, config),
+        lambda: _load_index(table, client, timestamp, config),
+    )
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from .synapse_positions import PartnerPositions
+
+# Aggregations computed directly on the partner-sorted arrays. Anything else
+# in `synapse_aggregation_rules` is handed to a pandas groupby.
+VECTORIZED_AGGREGATIONS = ("count", "len", "size", "sum", "mean", "min", "max")
+
+
+def _reduce(values, starts, counts, agg):
+    if agg in ("len", "size"):
+        return counts.copy()
+
+    if values.dtype.kind in "iu":
+        valid = None
+        vals = values
+    else:
+        valid = ~np.isnan(values)
+        vals = np.where(valid, values, 0)
+    if valid is None:
+        n_valid = counts
+    else:
+        n_valid = np.add.reduceat(valid.astype(np.int64), starts)
+
+    if agg == "count":
+        return n_valid
+    if agg == "sum":
+        return np.add.reduceat(vals, starts)
+    if agg == "mean":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.add.reduceat(vals, starts) / n_valid
+    if agg == "min":
+        return np.fmin.reduceat(values, starts)
+    if agg == "max":
+        return np.fmax.reduceat(values, starts)
+    raise ValueError(f"Unsupported aggregation: {agg}")
+
+
+def aggregate_partners(
+    syn_df,
+    partner_column,
+    position_columns,
+    num_syn_column,
+    aggregation_rules={},
+    depth_column=None,
+    mean_position_columns=None,
+):
+    """Per-partner synapse counts, aggregation rules and positions in one pass.
+
+    Synapses are sorted by partner once, partners and their offsets come from
+    `np.unique`, and every aggregation is a `reduceat` over the same offsets.
+    Rules whose `agg` is not one of `VECTORIZED_AGGREGATIONS` are computed
+    with a pandas groupby instead. Missing values are skipped as in pandas.
+
+    Parameters
+    ----------
+    syn_df : pd.DataFrame
+        Synapse dataframe.
+    partner_column : str
+        Column with the partner root id of each synapse.
+    position_columns : list
+        The x, y, z columns of the synapse position.
+    num_syn_column : str
+        Name of the synapse count column in the result.
+    aggregation_rules : dict, optional
+        Mapping of output column to {"column": ..., "agg": ...}, as in `synapse_aggregation_rules`.
+    depth_column : str, optional
+        Column with the depth of each synapse, kept with the positions. By default None.
+    mean_position_columns : list, optional
+        Names for the x, y, z columns of each partner's mean synapse position.
+        By default None, which leaves them out.
+
+    Returns
+    -------
+    targ_df : pd.DataFrame
+        One row per partner with `partner_column`, `num_syn_column`, the mean position
+        columns and one column per rule, sorted by descending synapse count.
+    positions : PartnerPositions
+        Synapse positions (and depths) grouped by partner.
+    """
+    partners = syn_df[partner_column].to_numpy(dtype=np.int64)
+    order = np.argsort(partners, kind="stable")
+    root_ids, starts = np.unique(partners[order], return_index=True)
+    offsets = np.append(starts, len(partners))
+    counts = np.diff(offsets)
+
+    points = syn_df[position_columns].to_numpy(dtype=np.float64)[order]
+    depths = None
+    if depth_column is not None and depth_column in syn_df.columns:
+        depths = syn_df[depth_column].to_numpy(dtype=np.float64)[order]
+    positions = PartnerPositions(root_ids, offsets, points, depths)
+
+    data = {}
+    for ii, k in enumerate(mean_position_columns or []):
+        if len(partners) > 0:
+            data[k] = _reduce(points[:, ii], starts, counts, "mean")
+        else:
+            data[k] = np.zeros(0)
+    data[num_syn_column] = counts
+    grouped = None
+    for k, v in aggregation_rules.items():
+        values = syn_df[v["column"]].to_numpy()
+        if (
+            len(partners) > 0
+            and v["agg"] in VECTORIZED_AGGREGATIONS
+            and values.dtype.kind in "iubf"
+        ):
+            if values.dtype.kind == "b":
+                values = values.astype(np.int64)
+            data[k] = _reduce(values[order], starts, counts, v["agg"])
+        else:
+            if grouped is None:
+                grouped = syn_df.groupby(partner_column)
+            data[k] = grouped[v["column"]].agg(v["agg"]).reindex(root_ids).to_numpy()
+
+    targ_df = pd.DataFrame(data, index=pd.Index(root_ids, name=partner_column))
+    targ_df = targ_df.sort_values(by=num_syn_column, ascending=False).reset_index()
+    return targ_df, positions
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+class PropertyJoin(object):
+    """Left join of several tables indexed by root id onto a dataframe, in one pass.
+
+    Tables are added in the order they would be merged. Column names are
+    worked out up front, then the root id column of the dataframe is
+    factorized once, each table is reindexed to the unique root ids only, and
+    the columns of all tables are gathered for every row with a single take.
+    Column names, missing values and dtypes are the same as for a sequence of
+    `df.merge(table, left_on=root_id_column, right_index=True, how="left")`
+    calls, and the dataframe's index is kept.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe to join onto.
+    root_id_column : str
+        Column of `df` with the root ids to look up.
+    """
+
+    def __init__(self, df, root_id_column):
+        self.df = df
+        self.root_id_column = root_id_column
+        self.names = list(df.columns)
+        self._tables = []
+
+    def add(self, table, suffixes=("", "")):
+        """Join a table indexed by root id.
+
+        Columns that the table shares with the joined columns get `suffixes`,
+        the first one on the existing column and the second on the new one.
+        """
+        overlap = set(table.columns).intersection(self.names)
+        if len(overlap) > 0 and not any(suffixes):
+            raise ValueError(f"columns overlap but no suffix specified: {overlap}")
+        self.names = [f"{c}{suffixes[0]}" if c in overlap else c for c in self.names]
+        self.names += [
+            f"{c}{suffixes[1]}" if c in overlap else c for c in table.columns
+        ]
+        self._tables.append(table)
+
+    def add_empty(self, column):
+        "Add a column of NaN"
+        self.add(pd.DataFrame({column: pd.Series([], dtype=np.float64)}))
+
+    def rename(self, mapping):
+        "Rename joined columns, as `DataFrame.rename(columns=mapping)` on the result"
+        self.names = [mapping.get(c, c) for c in self.names]
+
+    def result(self):
+        if len(self._tables) == 0:
+            df = self.df.copy(deep=False)
+        else:
+            codes, root_ids = pd.factorize(
+                self.df[self.root_id_column].to_numpy(), use_na_sentinel=False
+            )
+            gathered = pd.concat(
+                [table.reindex(root_ids) for table in self._tables], axis=1
+            ).take(codes)
+            gathered.index = self.df.index
+            df = pd.concat([self.df, gathered], axis=1)
+        df.columns = self.names
+        return df
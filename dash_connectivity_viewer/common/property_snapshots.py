@@ -0,0 +1,132 @@
+import threading
+import numpy as np
+from .cache_utilities import result_cache, load_in_background
+from .dataframe_utilities import whole_table
+from .disk_cache import get_disk_cache
+from .schema_utils import get_table_info, bound_pt_root_id
+from .timing import span
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+
+class TableSnapshot(object):
+    """All rows of one table at a materialization version, sorted by root id.
+
+    Rows for a set of root ids are found by binary search on the sorted root
+    ids and gathered from the columnar dataframe, giving the same rows as a
+    query of the table filtered to those root ids.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Table as returned by `query_table_any` without root id filter.
+    root_id_column : str
+        Column the table is looked up by.
+    """
+
+    def __init__(self, df, root_id_column):
+        root_ids = df[root_id_column].to_numpy(dtype=np.int64)
+        order = np.argsort(root_ids, kind="stable")
+        self.root_id_column = root_id_column
+        self.root_ids = root_ids[order]
+        self.data = df.take(order).reset_index(drop=True)
+        self.nbytes = self.root_ids.nbytes + int(
+            self.data.memory_usage(index=True, deep=True).sum()
+        )
+
+    def rows_for(self, root_ids):
+        "Rows of the table whose root id is one of `root_ids`, ignoring 0"
+        if root_ids is None:
+            return self.data.copy()
+        root_ids = np.unique(np.asarray(root_ids, dtype=np.int64))
+        root_ids = root_ids[root_ids != 0]
+        lo = np.searchsorted(self.root_ids, root_ids, side="left")
+        counts = np.searchsorted(self.root_ids, root_ids, side="right") - lo
+        offsets = np.cumsum(counts) - counts
+        take = np.repeat(lo - offsets, counts) + np.arange(counts.sum())
+        return self.data.take(take).reset_index(drop=True)
+
+
+def _snapshot_key(table, root_id_column, client):
+    return (
+        client.datastack_name,
+        client.materialize.version,
+        table,
+        root_id_column,
+    )
+
+
+def load_table_snapshot(table, root_id_column, client, timestamp, config):
+    "Query a whole table in pages, or read it from the disk cache, as a `TableSnapshot`"
+    with span(f"snapshot:{table}"):
+        df = whole_table(
+            table,
+            root_id_column,
+            client,
+            timestamp,
+            page_size=config.snapshot_page_size,
+            disk_cache=get_disk_cache(config),
+        )
+        snapshot = TableSnapshot(df, root_id_column)
+    if config.debug:
+        print(f"Loaded snapshot of {table}: {len(df)} rows, {snapshot.nbytes} bytes")
+    return snapshot
+
+
+def get_table_snapshot(
+    table, root_id_column, client, timestamp, config, is_live=True
+):
+    """Snapshot of a table for the client's materialization version, or None.
+
+    Snapshots are only used for materialized versions and if
+    `config.property_snapshot_cache_size` is set. The first request for a table
+    and version starts loading it in a background thread and gets None, so
+    callers query as usual until the snapshot is ready. Snapshots are shared by
+    all requests in the process and evicted by size across versions.
+    """
+    if is_live or table is None or not config.property_snapshot_cache_size:
+        return None
+    return load_in_background(
+        result_cache("property_snapshots", config.property_snapshot_cache_size),
+        _snapshot_key(table, root_id_column, client),
+        lambda: load_table_snapshot(table, root_id_column, client, timestamp, config),
+    )
+
+
+def preload_table_snapshots(config, datastack=None):
+    """Load snapshots of `config.property_snapshot_preload` for the latest
+    version in a background thread.
+
+    Tables are looked up by the root id of their point column.
+    """
+    from .lookup_utilities import make_client
+
+    if datastack is None:
+        datastack = config.default_datastack
+    cache = result_cache("property_snapshots", config.property_snapshot_cache_size)
+
+    def _preload():
+        try:
+            client = make_client(datastack, config.server_address)
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not preload snapshots for {datastack}: {e}")
+            return
+        for table in config.property_snapshot_preload:
+            try:
+                pt, _ = get_table_info(table, client)
+                root_id_column = bound_pt_root_id(pt)
+                cache.store(
+                    _snapshot_key(table, root_id_column, client),
+                    load_table_snapshot(table, root_id_column, client, None, config),
+                )
+            except Exception as e:
+                if logger is not None:
+                    logger.warning(f"Could not preload snapshot of {table}: {e}")
+
+    thread = threading.Thread(target=_preload, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,403 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import pandas as pd
+from cachetools import TTLCache
+from .cache_utilities import value_nbytes
+from .synapse_positions import PartnerPositions
+from .timing import timed
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+_HANDLE_PATTERN = re.compile("[0-9a-f]{32}")
+
+
+class ResultStore(object):
+    """Server-side store for per-request dataframes, addressed by opaque handles.
+
+    Callbacks put a dict of dataframes into the store and ship only the handle
+    through a `dcc.Store`. Later callbacks resolve the handle back to the same
+    dataframe objects, so nothing is copied or serialized while the entry is in
+    memory. Stored frames are shared between callbacks and must not be modified.
+
+    If a directory is given, results are also written there as Arrow IPC files
+    so that a handle created by one worker process can be resolved by another.
+    Those files are memory-mapped on read. Each put writes a new generation of
+    the result and switches a symlink named after the handle to it, so a result
+    can be replaced under the same handle, e.g. while a table is loading, and
+    other processes pick up the latest generation instead of their own copy.
+
+    A result that is still loading can be built up with `append`, which only
+    stores the new frames, one file per part in the directory. Until `complete`
+    or `put` stores the whole result, `get` returns the parts concatenated, and
+    each process only reads and concatenates the parts it has not seen yet.
+
+    Small status records (dicts of JSON values) can be kept next to results
+    with `put_status` and `get_status`, also shared through the directory.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum total size of in-memory results in bytes.
+    ttl : int
+        Seconds after which a result expires.
+    directory : str, optional
+        Directory to share results between worker processes, by default None.
+    """
+
+    def __init__(self, maxsize, ttl, directory=None):
+        self.ttl = ttl
+        self.directory = directory
+        # Values are (generation, frames)
+        self._cache = TTLCache(maxsize, ttl, getsizeof=value_nbytes)
+        self._status = TTLCache(maxsize=4096, ttl=ttl)
+        self._partial = TTLCache(maxsize=256, ttl=ttl)
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def put(self, frames, handle=None):
+        """Store a dict of dataframes and return its handle.
+
+        Passing a handle replaces the result stored under it, e.g. to publish a
+        table that is still loading.
+        """
+        if handle is None:
+            handle = uuid.uuid4().hex
+        generation = uuid.uuid4().hex
+        with self._lock:
+            self._partial.pop(handle, None)
+            try:
+                self._cache[handle] = (generation, frames)
+            except ValueError:
+                pass
+        if self.directory is not None:
+            self._write(handle, generation, frames)
+            self._expire_files()
+        return handle
+
+    def get(self, handle):
+        "Return the dict of dataframes for a handle, or None if unknown or expired"
+        if not _valid_handle(handle):
+            return None
+        with self._lock:
+            entry = self._cache.get(handle)
+        if self.directory is not None:
+            generation = self._generation(handle)
+            if generation is not None and (entry is None or entry[0] != generation):
+                entry = self._read(handle)
+                if entry is not None:
+                    with self._lock:
+                        self._partial.pop(handle, None)
+                        try:
+                            self._cache[handle] = entry
+                        except ValueError:
+                            pass
+        if entry is None:
+            return self._get_partial(handle)
+        return entry[1]
+
+    def append(self, handle, frames):
+        """Add a dict of dataframes to the partial result stored under a handle.
+
+        Frames are concatenated per name with the ones appended before when the
+        partial result is read. Parts must be appended by a single thread.
+        """
+        with self._lock:
+            partial = self._partial.setdefault(handle, _PartialResult())
+        index = partial.add(frames)
+        if self.directory is not None:
+            self._write_part(handle, index, frames)
+
+    def complete(self, handle):
+        "Store the frames appended under a handle as its complete result"
+        frames = self._get_partial(handle)
+        self.put({} if frames is None else frames, handle)
+
+    def put_status(self, handle, status):
+        "Store a status dict for a handle, replacing any previous one"
+        with self._lock:
+            self._status[handle] = status
+        if self.directory is None:
+            return
+        fn = self._status_path(handle)
+        tmp_fn = f"{fn}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_fn, "w") as f:
+                json.dump(status, f)
+            os.replace(tmp_fn, fn)
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not write status of {handle} to disk: {e}")
+            if os.path.exists(tmp_fn):
+                os.remove(tmp_fn)
+
+    def get_status(self, handle):
+        "Return the status dict for a handle, or None if there is none"
+        if not _valid_handle(handle):
+            return None
+        if self.directory is None:
+            with self._lock:
+                return self._status.get(handle)
+        fn = self._status_path(handle)
+        try:
+            if time.time() - os.stat(fn).st_mtime > self.ttl:
+                return None
+            with open(fn) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _get_partial(self, handle):
+        with self._lock:
+            partial = self._partial.get(handle)
+        if self.directory is not None:
+            parts = self._read_parts(handle, 0 if partial is None else partial.n_parts)
+            if parts:
+                with self._lock:
+                    partial = self._partial.setdefault(handle, _PartialResult())
+                for index, frames in parts:
+                    partial.add(frames, index)
+        if partial is None:
+            return None
+        return partial.frames()
+
+    def _parts_path(self, handle):
+        return os.path.join(self.directory, f"{handle}.parts")
+
+    def _write_part(self, handle, index, frames):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        parts_dir = self._parts_path(handle)
+        try:
+            os.makedirs(parts_dir, exist_ok=True)
+            for name, df in frames.items():
+                fn = os.path.join(parts_dir, f"{index:08d}.{name}.arrow")
+                tmp_fn = os.path.join(parts_dir, f".{index:08d}.{name}.tmp")
+                feather.write_feather(
+                    pa.Table.from_pandas(df, preserve_index=False),
+                    tmp_fn,
+                    compression="uncompressed",
+                )
+                os.replace(tmp_fn, fn)
+            # Marks the part as complete, for parts with several frames
+            open(os.path.join(parts_dir, f"{index:08d}.done"), "w").close()
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not write part of {handle} to disk: {e}")
+
+    def _read_parts(self, handle, start):
+        "Parts from index `start` on as a list of (index, frames)"
+        import pyarrow.feather as feather
+
+        parts_dir = self._parts_path(handle)
+        try:
+            names = os.listdir(parts_dir)
+        except FileNotFoundError:
+            return []
+        done = sorted(int(fn[:8]) for fn in names if fn.endswith(".done"))
+        parts = []
+        for index in done:
+            if index < start:
+                continue
+            if index != start + len(parts):
+                break
+            prefix = f"{index:08d}."
+            try:
+                frames = {
+                    fn[len(prefix) : -len(".arrow")]: feather.read_table(
+                        os.path.join(parts_dir, fn), memory_map=True
+                    ).to_pandas()
+                    for fn in names
+                    if fn.startswith(prefix) and fn.endswith(".arrow")
+                }
+            except FileNotFoundError:
+                # The complete result replaced the parts
+                break
+            parts.append((index, frames))
+        return parts
+
+    def _status_path(self, handle):
+        return os.path.join(self.directory, f"{handle}.json")
+
+    def _generation(self, handle):
+        "Generation the handle's symlink points to, or None if it has none"
+        try:
+            return os.readlink(os.path.join(self.directory, handle)).rsplit(".", 1)[-1]
+        except OSError:
+            return None
+
+    def _write(self, handle, generation, frames):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        result_dir = f"{handle}.{generation}"
+        tmp_dir = os.path.join(self.directory, f".{result_dir}.tmp")
+        tmp_link = os.path.join(self.directory, f".{result_dir}.link")
+        try:
+            os.makedirs(tmp_dir)
+            for name, df in frames.items():
+                feather.write_feather(
+                    pa.Table.from_pandas(df, preserve_index=False),
+                    os.path.join(tmp_dir, f"{name}.arrow"),
+                    compression="uncompressed",
+                )
+            os.replace(tmp_dir, os.path.join(self.directory, result_dir))
+            os.symlink(result_dir, tmp_link)
+            os.replace(tmp_link, os.path.join(self.directory, handle))
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not write result {handle} to disk: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if os.path.lexists(tmp_link):
+                os.remove(tmp_link)
+            return
+        # Readers that already opened an older generation keep their memory maps
+        for fn in os.listdir(self.directory):
+            if fn.startswith(f"{handle}.") and fn not in (result_dir, f"{handle}.json"):
+                shutil.rmtree(os.path.join(self.directory, fn), ignore_errors=True)
+
+    def _read(self, handle):
+        import pyarrow.feather as feather
+
+        # A newer generation can replace the one being read, so retry once
+        for _ in range(2):
+            generation = self._generation(handle)
+            result_dir = os.path.join(self.directory, f"{handle}.{generation}")
+            try:
+                if time.time() - os.stat(result_dir).st_mtime > self.ttl:
+                    return None
+                frames = {
+                    fn[: -len(".arrow")]: feather.read_table(
+                        os.path.join(result_dir, fn), memory_map=True
+                    ).to_pandas()
+                    for fn in os.listdir(result_dir)
+                    if fn.endswith(".arrow")
+                }
+                return generation, frames
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _expire_files(self):
+        now = time.time()
+        for fn in os.listdir(self.directory):
+            path = os.path.join(self.directory, fn)
+            try:
+                if now - os.lstat(path).st_mtime <= self.ttl:
+                    continue
+            except FileNotFoundError:
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class _PartialResult(object):
+    "Frames appended to a result, concatenated per name when read"
+
+    def __init__(self):
+        self.n_parts = 0
+        self._merged = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, frames, index=None):
+        """Add a part and return its index.
+
+        With `index`, the part is only added if it is the next one, so parts
+        read from disk are added once and in order.
+        """
+        with self._lock:
+            if index is not None and index != self.n_parts:
+                return index
+            self._pending.append(frames)
+            self.n_parts += 1
+            return self.n_parts - 1
+
+    def frames(self):
+        with self._lock:
+            if self._pending:
+                names = dict.fromkeys(name for f in self._pending for name in f)
+                for name in names:
+                    dfs = [self._merged[name]] if name in self._merged else []
+                    dfs += [f[name] for f in self._pending if name in f]
+                    self._merged[name] = (
+                        dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+                    )
+                self._pending = []
+            return dict(self._merged)
+
+
+def _valid_handle(handle):
+    return isinstance(handle, str) and _HANDLE_PATTERN.fullmatch(handle) is not None
+
+
+_result_stores = {}
+_result_store_lock = threading.Lock()
+
+
+def result_store_directory(config):
+    """Directory shared by all worker processes for stored results, or None.
+
+    This is `result_store_directory` if set, else a `results` directory in the
+    disk cache. Without either, results stay in memory for a single worker
+    process, while several worker processes share a directory in the system
+    temporary directory, which only works if they all run on the same host.
+    """
+    if config.result_store_directory is not None:
+        return config.result_store_directory
+    if config.disk_cache_directory is not None:
+        return os.path.join(config.disk_cache_directory, "results")
+    if config.worker_processes > 1:
+        return os.path.join(tempfile.gettempdir(), "dash_connectivity_viewer_results")
+    return None
+
+
+def get_result_store(config):
+    """Return the process-wide result store for a config.
+
+    Apps call this when callbacks are registered, so that a shared directory
+    that cannot be created fails at startup rather than on the first request.
+    """
+    directory = result_store_directory(config)
+    with _result_store_lock:
+        if directory not in _result_stores:
+            _result_stores[directory] = ResultStore(
+                config.result_store_size, config.result_store_ttl, directory
+            )
+        return _result_stores[directory]
+
+
+@timed("store_result")
+def store_result(config, **frames):
+    return get_result_store(config).put(frames)
+
+
+def fetch_result(config, handle, name):
+    "Resolve a handle to one of its stored dataframes, or None"
+    frames = get_result_store(config).get(handle)
+    if frames is None:
+        return None
+    return frames.get(name)
+
+
+def fetch_positions(config, handle, name="synapses"):
+    "Resolve a handle to the partner positions stored with it, or None"
+    df = fetch_result(config, handle, name)
+    if df is None:
+        return None
+    return PartnerPositions.from_frame(df, config.root_id_col)
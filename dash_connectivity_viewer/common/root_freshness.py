@@ -0,0 +1,91 @@
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache, TTLCache
+from .timing import span, submit_traced
+
+# Latest root ids at a fixed timestamp never change, so they are kept until
+# evicted. Live answers are kept for `live_cache_seconds`.
+_fixed_roots = LRUCache(maxsize=100_000)
+_live_roots = {}
+_roots_lock = threading.Lock()
+
+
+def _root_cache(is_live, config):
+    if not is_live:
+        return _fixed_roots
+    ttl = config.live_cache_seconds
+    if ttl not in _live_roots:
+        _live_roots[ttl] = TTLCache(maxsize=100_000, ttl=ttl)
+    return _live_roots[ttl]
+
+
+def _scope(client, timestamp, is_live, config):
+    if is_live:
+        # Live checks are only reused within a short time bucket
+        now = time.time() if timestamp is None else timestamp.timestamp()
+        return ("live", int(now // config.live_cache_seconds))
+    if timestamp is None:
+        return ("version", client.materialize.version)
+    return ("timestamp", timestamp.timestamp())
+
+
+def latest_roots(root_ids, client, timestamp, config, is_live=True):
+    """Latest root id at the timestamp for each root id.
+
+    Root ids that are not cached are checked with a single `is_latest_roots`
+    call. The chunkedgraph suggests a latest root for one root id per call, so
+    these calls run concurrently for the outdated ones, up to `config.max_chunks`
+    at a time. Results for materialized versions are cached permanently, live
+    results for `config.live_cache_seconds`.
+
+    Returns
+    -------
+    np.ndarray
+        Root ids in the same order, equal to the input where it is the latest.
+    """
+    root_ids = np.asarray(root_ids, dtype=np.int64)
+    scope = (client.datastack_name,) + _scope(client, timestamp, is_live, config)
+    with _roots_lock:
+        cache = _root_cache(is_live, config)
+        cached = [cache.get(scope + (int(rid),)) for rid in root_ids]
+
+    missing = np.unique(
+        [rid for rid, latest in zip(root_ids, cached) if latest is None]
+    ).astype(np.int64)
+    found = {}
+    if len(missing) > 0:
+        is_latest = np.asarray(
+            client.chunkedgraph.is_latest_roots(missing, timestamp=timestamp),
+            dtype=bool,
+        )
+        found.update((rid, rid) for rid in missing[is_latest].tolist())
+        outdated = missing[~is_latest].tolist()
+        if len(outdated) > 0:
+            with span("suggest_latest_roots"):
+                suggested = _suggest_latest_roots(outdated, client, timestamp, config)
+            found.update(zip(outdated, suggested))
+        with _roots_lock:
+            cache = _root_cache(is_live, config)
+            for rid, new_rid in found.items():
+                cache[scope + (rid,)] = new_rid
+
+    return np.array(
+        [
+            found[int(rid)] if latest is None else latest
+            for rid, latest in zip(root_ids, cached)
+        ],
+        dtype=np.int64,
+    )
+
+
+def _suggest_latest_roots(root_ids, client, timestamp, config):
+    def suggest(rid):
+        return int(client.chunkedgraph.suggest_latest_roots(rid, timestamp=timestamp))
+
+    if len(root_ids) == 1:
+        return [suggest(root_ids[0])]
+    with ThreadPoolExecutor(max(1, min(len(root_ids), config.max_chunks))) as exe:
+        jobs = [submit_traced(exe, suggest, rid) for rid in root_ids]
+    return [job.result() for job in jobs]
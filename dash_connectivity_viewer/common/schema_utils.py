@@ -20,6 +20,37 @@ def split_pt_position(pt_position):
     return [f"{pt_position}_{suf}" for suf in SPLIT_SUFFIXES]
 
 
+_schema_definition_cache = TTLCache(maxsize=256, ttl=86_400)
+
+
+def _schema_definition_key(schema_name, client, **kwargs):
+    return keys.hashkey(schema_name, client.datastack_name)
+
+
+@cached(cache=_schema_definition_cache, key=_schema_definition_key)
+def schema_definition(schema_name, client, definition=None):
+    "Caches getting schema definitions"
+    if definition is None:
+        definition = client.schema.schema_definition(schema_name)
+    return definition
+
+
+def populate_schema_cache(schema_names, client):
+    "Fetch many schema definitions in one request, if the schema service supports it"
+    schema_names = sorted(set(sn for sn in schema_names if sn))
+    if len(schema_names) == 0:
+        return
+    try:
+        definitions = client.schema.schema_definition_multi(schema_names)
+    except Exception:
+        definitions = None
+    if definitions is None:
+        return
+    for sn in schema_names:
+        if sn in definitions:
+            schema_definition(sn, client, definition=definitions[sn])
+
+
 _schema_cache = TTLCache(maxsize=128, ttl=86_400)
 
 
@@ -39,7 +70,7 @@ def get_col_info(
     allow_types=ALLOW_COLUMN_TYPES,
     omit_fields=[],
 ):
-    schema = client.schema.schema_definition(schema_name)
+    schema = schema_definition(schema_name, client)
     sp_name = f"#/definitions/{spatial_point}"
     n_sp = 0
     sn = schema["$ref"].split("/")[-1]
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+
+class PartnerPositions(object):
+    """Synapse positions grouped by partner root id in compressed sparse row form.
+
+    Points for all synapses are held in one contiguous (N, 3) float array sorted
+    by partner, keeping the original synapse order within each partner. The
+    points of the i-th partner in `root_ids` are `points[offsets[i]:offsets[i+1]]`.
+
+    Parameters
+    ----------
+    root_ids : np.ndarray
+        Sorted, unique partner root ids.
+    offsets : np.ndarray
+        Start of each partner's points, with a final entry equal to the number of points.
+    points : np.ndarray
+        (N, 3) array of synapse positions.
+    depths : np.ndarray, optional
+        (N,) array of synapse depths in the same order as `points`, by default None.
+    """
+
+    def __init__(self, root_ids, offsets, points, depths=None):
+        self.root_ids = np.asarray(root_ids, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        if depths is not None:
+            depths = np.ascontiguousarray(depths, dtype=np.float64)
+        self.depths = depths
+
+    @classmethod
+    def from_synapse_df(
+        cls, syn_df, partner_column, position_columns, depth_column=None
+    ):
+        "Group the per-synapse positions (and depths) of a synapse dataframe by partner"
+        partners = syn_df[partner_column].to_numpy(dtype=np.int64)
+        order = np.argsort(partners, kind="stable")
+        root_ids, starts = np.unique(partners[order], return_index=True)
+        offsets = np.append(starts, len(partners))
+        points = syn_df[position_columns].to_numpy(dtype=np.float64)[order]
+        depths = None
+        if depth_column is not None and depth_column in syn_df.columns:
+            depths = syn_df[depth_column].to_numpy(dtype=np.float64)[order]
+        return cls(root_ids, offsets, points, depths)
+
+    @classmethod
+    def from_frame(cls, df, root_id_column="root_id"):
+        "Rebuild from the per-synapse frame made by `to_frame`"
+        partners = df[root_id_column].to_numpy(dtype=np.int64)
+        starts = np.flatnonzero(np.diff(partners, prepend=partners[:1] - 1))
+        return cls(
+            partners[starts],
+            np.append(starts, len(partners)),
+            df[["x", "y", "z"]].to_numpy(dtype=np.float64),
+            df["depth"].to_numpy(dtype=np.float64) if "depth" in df.columns else None,
+        )
+
+    def to_frame(self, root_id_column="root_id"):
+        "Per-synapse frame of partner root id, position and depth, sorted by partner"
+        data = {
+            root_id_column: np.repeat(self.root_ids, self.counts),
+            "x": self.points[:, 0],
+            "y": self.points[:, 1],
+            "z": self.points[:, 2],
+        }
+        if self.depths is not None:
+            data["depth"] = self.depths
+        return pd.DataFrame(data)
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        nbytes = self.root_ids.nbytes + self.offsets.nbytes + self.points.nbytes
+        if self.depths is not None:
+            nbytes += self.depths.nbytes
+        return nbytes
+
+    def __len__(self):
+        return len(self.points)
+
+    def take(self, root_ids):
+        """Points for a sequence of partner root ids, in the order given.
+
+        Returns
+        -------
+        points : np.ndarray
+            (M, 3) array of the synapse positions of all requested partners.
+        index : np.ndarray
+            For each point, the position in `root_ids` of the partner it belongs to.
+            Root ids without synapses contribute no points.
+        """
+        gather, index = self._gather(root_ids)
+        return self.points[gather], index
+
+    def take_depths(self, root_ids):
+        """Depths for a sequence of partner root ids, in the order given.
+
+        Returns (depths, index) like `take`, or None if no depths were stored.
+        """
+        if self.depths is None:
+            return None
+        gather, index = self._gather(root_ids)
+        return self.depths[gather], index
+
+    def _gather(self, root_ids):
+        root_ids = np.asarray(root_ids, dtype=np.int64)
+        if len(self.root_ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        loc = np.searchsorted(self.root_ids, root_ids)
+        loc = np.clip(loc, 0, len(self.root_ids) - 1)
+        found = self.root_ids[loc] == root_ids
+        starts = np.where(found, self.offsets[loc], 0)
+        lengths = np.where(found, self.offsets[loc + 1] - starts, 0)
+
+        index = np.repeat(np.arange(len(root_ids)), lengths)
+        row_starts = np.cumsum(lengths) - lengths
+        gather = np.arange(lengths.sum()) - np.repeat(row_starts - starts, lengths)
+        return gather, index
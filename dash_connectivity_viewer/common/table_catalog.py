@@ -0,0 +1,175 @@
+import os
+import json
+import uuid
+import argparse
+import threading
+from cachetools import TTLCache
+from .schema_utils import (
+    get_table_info,
+    table_metadata,
+    populate_metadata_cache,
+    populate_schema_cache,
+)
+from .timing import timed
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+CATALOG_FILENAME = "table_catalog.json"
+
+
+def _catalog_entry(table, client):
+    meta = table_metadata(table, client)
+    pt, value_columns = get_table_info(table, client)
+    reference_table = meta.get("reference_table")
+    return {
+        "schema": meta.get("schema"),
+        "reference_table": reference_table if reference_table else None,
+        "pt_column": pt,
+        "value_columns": value_columns,
+        "is_value_source": pt is not None and len(value_columns) > 0,
+    }
+
+
+@timed("build_table_catalog")
+def build_table_catalog(client):
+    """Derive the point column, value columns, reference table and value-source
+    flag of every table in the client's materialization version.
+
+    Table metadata is fetched in one request and schema definitions in as few as
+    the schema service allows, instead of one request per table.
+
+    Returns
+    -------
+    dict
+        Catalog entries keyed by table name.
+    """
+    tables = client.materialize.get_tables()
+    populate_metadata_cache(tables, client)
+    schemas = [table_metadata(t, client).get("schema") for t in tables]
+    populate_schema_cache(schemas, client)
+    return {t: _catalog_entry(t, client) for t in tables}
+
+
+def catalog_path(directory, datastack, version):
+    # Stored next to the version's Parquet files, so it is pruned along with them
+    return os.path.join(directory, str(datastack), f"v{version}", CATALOG_FILENAME)
+
+
+def read_catalog(directory, datastack, version):
+    "Return a persisted catalog or None"
+    fn = catalog_path(directory, datastack, version)
+    try:
+        with open(fn, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        if logger is not None:
+            logger.warning(f"Could not read table catalog {fn}: {e}")
+        return None
+
+
+def write_catalog(directory, datastack, version, catalog):
+    "Persist a catalog, writing to a temporary file first so readers never see partial files"
+    fn = catalog_path(directory, datastack, version)
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    tmp_fn = f"{fn}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_fn, "w") as f:
+            json.dump(catalog, f)
+        os.replace(tmp_fn, fn)
+    except Exception as e:
+        if logger is not None:
+            logger.warning(f"Could not write table catalog {fn}: {e}")
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+    return fn
+
+
+_catalogs = TTLCache(maxsize=64, ttl=86_400)
+_catalog_lock = threading.Lock()
+
+
+def get_table_catalog(client, directory=None):
+    """Table catalog for the client's materialization version.
+
+    Catalogs are kept in memory and, if `directory` is set, persisted there and
+    shared by all worker processes. A catalog is only built when no process has
+    built one for the version yet, i.e. once per new materialization version.
+    """
+    datastack = client.datastack_name
+    version = client.materialize.version
+    key = (datastack, version)
+    with _catalog_lock:
+        catalog = _catalogs.get(key)
+    if catalog is not None:
+        return catalog
+
+    if directory is not None:
+        catalog = read_catalog(directory, datastack, version)
+    if catalog is None:
+        catalog = build_table_catalog(client)
+        if directory is not None:
+            write_catalog(directory, datastack, version, catalog)
+    with _catalog_lock:
+        _catalogs[key] = catalog
+    return catalog
+
+
+def warm_table_catalog(config, datastack=None):
+    """Build the table catalog of the latest materialization version in a background thread"""
+    from .lookup_utilities import make_client
+
+    if datastack is None:
+        datastack = config.default_datastack
+
+    def _warm():
+        try:
+            client = make_client(datastack, config.server_address)
+            get_table_catalog(client, config.disk_cache_directory)
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Could not build table catalog for {datastack}: {e}")
+
+    thread = threading.Thread(target=_warm, daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the table catalog of a datastack and store it in the viewer disk cache."
+    )
+    parser.add_argument("datastack", help="Datastack name")
+    parser.add_argument("--server-address", required=True, help="CAVE server address")
+    parser.add_argument(
+        "--disk-cache-directory",
+        required=True,
+        help="Same directory as the viewers' disk_cache_directory",
+    )
+    parser.add_argument(
+        "--version",
+        type=int,
+        default=None,
+        help="Materialization version, by default the latest",
+    )
+    args = parser.parse_args(argv)
+
+    from .lookup_utilities import make_client
+
+    client = make_client(
+        args.datastack, args.server_address, materialize_version=args.version
+    )
+    catalog = get_table_catalog(client, args.disk_cache_directory)
+    fn = catalog_path(
+        args.disk_cache_directory, args.datastack, client.materialize.version
+    )
+    n_sources = sum(v["is_value_source"] for v in catalog.values())
+    print(f"Wrote {len(catalog)} tables ({n_sources} value sources) to {fn}")
+
+
+if __name__ == "__main__":
+    main()
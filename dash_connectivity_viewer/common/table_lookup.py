@@ -1,8 +1,15 @@
 import pandas as pd
 import numpy as np
 from .lookup_utilities import get_root_id_from_nuc_id, make_client
-from .dataframe_utilities import _coerce_nullable_dtypes, query_table_any
+from .dataframe_utilities import (
+    _coerce_nullable_dtypes,
+    query_table_any,
+    iter_table_chunks,
+)
 from .schema_utils import get_table_info
+from .async_query import get_query_backend
+from .nucleus_index import get_nucleus_index
+from .property_snapshots import get_table_snapshot
 from ..common.config import RegisterTable
 from dfbridge import DataframeBridge
 from copy import copy
@@ -35,8 +42,8 @@ class TableViewer(object):
         self._client = make_client(
             datastack=client.datastack_name,
             server_address=client.server_address,
+            materialize_version=client.materialize.version,
         )
-        self._client.materialize.version = client.materialize.version
 
         pt, add_cols = get_table_info(table_name, self._client)
         config = RegisterTable(pt, add_cols, config)
@@ -96,17 +103,51 @@ class TableViewer(object):
     def cell_type_bridge(self):
         return DataframeBridge(self._cell_type_bridge_schema)
 
-    def _populate_data(self):
-        id_column = None
-        ids = None
-        if self._id_query is not None:
-            id_column = self.config.ct_cell_type_root_id
-            ids = self._id_query
+    def _id_filter(self):
         if self._annotation_query is not None:
-            id_column = "id"
-            ids = self._annotation_query
+            return "id", self._annotation_query
+        if self._id_query is not None:
+            return self.config.ct_cell_type_root_id, self._id_query
+        return None, None
+
+    def _populate_data(self):
+        id_column, ids = self._id_filter()
+
+        snapshot = None
+        if self._id_query is not None and len(self._column_query) == 0:
+            snapshot = get_table_snapshot(
+                self.table_name,
+                id_column,
+                self.client,
+                self.timestamp,
+                self.config,
+                self.is_live,
+            )
+        if snapshot is not None:
+            df = snapshot.rows_for(ids)
+        else:
+            df = query_table_any(
+                self.table_name,
+                id_column,
+                ids,
+                self.client,
+                self.timestamp,
+                self._column_query,
+                is_live=self.is_live,
+                chunk_size=self.config.target_root_id_per_call,
+                max_chunks=self.config.max_chunks,
+                backend=get_query_backend(self.config),
+            )
+        self._data = self.cell_type_bridge.reformat(df).fillna(np.nan)
 
-        df = query_table_any(
+    def iter_table_data(self, page_size, first_page_size=None):
+        """Yield the table in chunks as they are queried, formatted like `table_data`.
+
+        Queries by id are split into root id chunks, whole-table queries into
+        pages of `page_size` rows (see `iter_table_chunks`).
+        """
+        id_column, ids = self._id_filter()
+        for df in iter_table_chunks(
             self.table_name,
             id_column,
             ids,
@@ -114,8 +155,22 @@ class TableViewer(object):
             self.timestamp,
             self._column_query,
             is_live=self.is_live,
-        )
-        self._data = self.cell_type_bridge.reformat(df).fillna(np.nan)
+            chunk_size=self.config.target_root_id_per_call,
+            max_chunks=self.config.max_chunks,
+            page_size=page_size,
+            first_page_size=first_page_size,
+            backend=get_query_backend(self.config),
+        ):
+            yield self.cell_type_bridge.reformat(df).fillna(np.nan)
+
+    def expected_rows(self):
+        "Number of rows of an unfiltered table, or None if unknown"
+        if self._id_filter()[1] is not None or len(self._column_query) > 0:
+            return None
+        try:
+            return self.client.materialize.get_annotation_count(self.table_name)
+        except Exception:
+            return None
 
     def _process_id_query(self):
         if self._id_query_type == "root":
@@ -129,6 +184,13 @@ class TableViewer(object):
             self._id_query = None
 
     def _lookup_roots_from_nucleus(self, soma_ids):
+        index = get_nucleus_index(
+            self.soma_table, self.client, self.timestamp, self.config, self.is_live
+        )
+        if index is not None:
+            root_ids, found = index.roots_for(soma_ids, apply_query=True)
+            return root_ids[found]
+
         df = _coerce_nullable_dtypes(
             self.client.materialize.query_table(
                 self.soma_table,
@@ -0,0 +1,364 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+from dash import dcc
+from .result_store import get_result_store
+from .dataframe_utilities import stringify_root_ids
+from .timing import timed
+
+# Records carry their row number in the stored dataframe as the DataTable row id,
+# so selections (`selected_row_ids`) refer to the same rows across pages and filters.
+# The DataTable only takes row ids from this key, so data columns are sent under
+# column ids that never equal it (see `column_key`).
+ROW_ID = "id"
+
+_TERM_PATTERN = re.compile(
+    r"^\{(?P<column>(?:[^}\\]|\\.)+)\}\s*(?P<operator>[^\s\"'`]+(?: (?:blank|nil))?)\s*(?P<value>.*)$",
+    re.DOTALL,
+)
+
+_RELATIONAL_OPERATORS = {
+    "=": "eq",
+    "eq": "eq",
+    "!=": "ne",
+    "ne": "ne",
+    "<": "lt",
+    "lt": "lt",
+    "<=": "le",
+    "le": "le",
+    ">": "gt",
+    "gt": "gt",
+    ">=": "ge",
+    "ge": "ge",
+}
+_STRING_OPERATORS = {
+    "contains": "contains",
+    "datestartswith": "startswith",
+}
+_UNARY_OPERATORS = {
+    "is blank": "blank",
+    "is nil": "nil",
+}
+
+
+def column_key(column):
+    """DataTable column id for a dataframe column.
+
+    Columns named `ROW_ID` or starting with an underscore get an extra leading
+    underscore, so no column id equals `ROW_ID` and the mapping can be inverted.
+    """
+    column = str(column)
+    if column == ROW_ID or column.startswith("_"):
+        return f"_{column}"
+    return column
+
+
+def column_name(key):
+    "Dataframe column for a DataTable column id, the inverse of `column_key`"
+    if key.startswith("_"):
+        return key[1:]
+    return key
+
+
+def table_columns(columns):
+    "DataTable column definitions showing dataframe columns under their own names"
+    return [{"name": column, "id": column_key(column)} for column in columns]
+
+
+def _split_outside_quotes(query, separator):
+    "Split on separator, ignoring separators inside quotes or braces"
+    parts = []
+    start = 0
+    quote = None
+    in_brace = False
+    ii = 0
+    while ii < len(query):
+        ch = query[ii]
+        if ch == "\\":
+            ii += 2
+            continue
+        if quote is not None:
+            if ch == quote:
+                quote = None
+        elif in_brace:
+            if ch == "}":
+                in_brace = False
+        elif ch in "\"'`":
+            quote = ch
+        elif ch == "{":
+            in_brace = True
+        elif query.startswith(separator, ii):
+            parts.append(query[start:ii])
+            ii += len(separator)
+            start = ii
+            continue
+        ii += 1
+    parts.append(query[start:])
+    return [part.strip() for part in parts]
+
+
+def _parse_value(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+        return value[1:-1].replace("\\" + value[0], value[0])
+    return value
+
+
+def _parse_operator(operator):
+    "Return (operation, case_sensitive) for a filter operator, or (None, None)"
+    if operator in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[operator], True
+    case_sensitive = True
+    if operator[0] in "is" and operator[1:] in {**_RELATIONAL_OPERATORS, **_STRING_OPERATORS}:
+        case_sensitive = operator[0] == "s"
+        operator = operator[1:]
+    if operator in _RELATIONAL_OPERATORS:
+        return _RELATIONAL_OPERATORS[operator], case_sensitive
+    if operator in _STRING_OPERATORS:
+        return _STRING_OPERATORS[operator], case_sensitive
+    return None, None
+
+
+def parse_filter_query(filter_query):
+    """Parse a DataTable filter query into terms.
+
+    Supports the expressions written by the DataTable filter row: relational
+    operators (`=`, `!=`, `<`, `<=`, `>`, `>=` and their `eq`/`ne`/... names),
+    `contains`, `datestartswith`, `is blank` and `is nil`, optionally prefixed
+    with `i`/`s` for case-insensitive/sensitive matching, joined by `&&` and
+    `||` (`&&` binds tighter). Terms that cannot be parsed are dropped, as the
+    DataTable itself ignores invalid filters.
+
+    Returns
+    -------
+    list of list of tuple
+        Alternatives (joined by `||`) of conjunctions (joined by `&&`) of
+        (column, operation, value, case_sensitive) terms.
+    """
+    if filter_query is None or filter_query.strip() == "":
+        return []
+    alternatives = []
+    for alternative in _split_outside_quotes(filter_query, "||"):
+        terms = []
+        for part in _split_outside_quotes(alternative, "&&"):
+            match = _TERM_PATTERN.match(part)
+            if match is None:
+                continue
+            operation, case_sensitive = _parse_operator(match.group("operator"))
+            if operation is None:
+                continue
+            column = re.sub(r"\\(.)", r"\1", match.group("column"))
+            terms.append(
+                (column, operation, _parse_value(match.group("value")), case_sensitive)
+            )
+        if len(terms) > 0:
+            alternatives.append(terms)
+    return alternatives
+
+
+def _as_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _as_strings(series, case_sensitive):
+    strings = series.astype("string")
+    if not case_sensitive:
+        strings = strings.str.lower()
+    return strings
+
+
+def _term_mask(series, operation, value, case_sensitive):
+    if operation == "nil":
+        return series.isna().to_numpy()
+    if operation == "blank":
+        return (series.isna() | (series.astype("string") == "")).to_numpy(
+            dtype=bool, na_value=True
+        )
+
+    if operation in ("contains", "startswith"):
+        strings = _as_strings(series, case_sensitive)
+        if not case_sensitive:
+            value = value.lower()
+        if operation == "contains":
+            mask = strings.str.contains(value, regex=False)
+        else:
+            mask = strings.str.startswith(value)
+        return mask.to_numpy(dtype=bool, na_value=False)
+
+    number = _as_number(value)
+    if (
+        number is not None
+        and pd.api.types.is_numeric_dtype(series)
+        and not pd.api.types.is_bool_dtype(series)
+    ):
+        values = series.to_numpy()
+    else:
+        values = _as_strings(series, case_sensitive)
+        number = value if case_sensitive else value.lower()
+    mask = getattr(values, f"__{operation}__")(number)
+    if isinstance(mask, pd.Series):
+        return mask.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(mask, dtype=bool)
+
+
+def filter_mask(df, filter_query):
+    "Boolean mask of the rows of df matching a DataTable filter query"
+    alternatives = parse_filter_query(filter_query)
+    if len(alternatives) == 0:
+        return np.ones(len(df), dtype=bool)
+    mask = np.zeros(len(df), dtype=bool)
+    for terms in alternatives:
+        term_mask = np.ones(len(df), dtype=bool)
+        for key, operation, value, case_sensitive in terms:
+            column = column_name(key)
+            if column not in df.columns:
+                continue
+            term_mask &= _term_mask(df[column], operation, value, case_sensitive)
+        mask |= term_mask
+    return mask
+
+
+def query_rows(df, filter_query=None, sort_by=None):
+    """Row numbers of df matching a DataTable filter query, in DataTable sort order.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Full table.
+    filter_query : str, optional
+        DataTable `filter_query`, by default None.
+    sort_by : list, optional
+        DataTable `sort_by`, a list of {"column_id", "direction"} dicts, by default None.
+        Column ids in the filter query and sort are mapped back with `column_name`.
+
+    Returns
+    -------
+    np.ndarray
+        Positional row numbers into df.
+    """
+    rows = np.flatnonzero(filter_mask(df, filter_query))
+    sort_by = [
+        {**s, "column": column_name(s["column_id"])}
+        for s in sort_by or []
+        if s.get("column_id") is not None
+    ]
+    sort_by = [s for s in sort_by if s["column"] in df.columns]
+    if len(sort_by) == 0 or len(rows) == 0:
+        return rows
+    sort_df = df[[s["column"] for s in sort_by]].iloc[rows].reset_index(drop=True)
+    order = sort_df.sort_values(
+        by=list(sort_df.columns),
+        ascending=[s.get("direction") != "desc" for s in sort_by],
+        kind="stable",
+        na_position="last",
+    ).index.to_numpy()
+    return rows[order]
+
+
+def _rows_key(handle, name, n_rows, filter_query, sort_by):
+    # Tables still being loaded grow under the same handle
+    return (
+        handle,
+        name,
+        n_rows,
+        filter_query or "",
+        tuple((s.get("column_id"), s.get("direction")) for s in sort_by or []),
+    )
+
+
+_rows_cache = LRUCache(maxsize=64)
+_rows_lock = threading.Lock()
+
+
+@timed("query_rows")
+def fetch_rows(config, handle, name, filter_query=None, sort_by=None):
+    """Filtered and sorted row numbers of a stored dataframe, or None if it expired.
+
+    Results are cached per query, so paging through a table does not refilter it.
+    """
+    frames = get_result_store(config).get(handle)
+    if frames is None or frames.get(name) is None:
+        return None
+    key = _rows_key(handle, name, len(frames[name]), filter_query, sort_by)
+    with _rows_lock:
+        rows = _rows_cache.get(key)
+    if rows is None:
+        rows = query_rows(frames[name], filter_query, sort_by)
+        with _rows_lock:
+            _rows_cache[key] = rows
+    return rows
+
+
+@timed("export_csv")
+def export_csv(config, handle, name, filter_query, sort_by, columns, filename):
+    """CSV download of all filtered and sorted rows of a stored dataframe.
+
+    The file has the DataTable `columns`, headed by their names, and every row
+    matching the filter, not just the page on screen. Returns `dcc.Download`
+    data, or None if the result expired.
+    """
+    frames = get_result_store(config).get(handle)
+    if frames is None or frames.get(name) is None:
+        return None
+    df = frames[name]
+    rows = fetch_rows(config, handle, name, filter_query, sort_by)
+    columns = [col for col in columns or [] if column_name(col["id"]) in df.columns]
+    export_df = df.iloc[rows][[column_name(col["id"]) for col in columns]]
+    export_df.columns = [col["name"] for col in columns]
+    return dcc.send_data_frame(export_df.to_csv, filename, index=False)
+
+
+def selected_row_numbers(rows, selected_row_ids):
+    "Row numbers of the selected rows that pass the filter, in table order"
+    if rows is None or not selected_row_ids:
+        return np.array([], dtype=np.int64)
+    selected = np.asarray([int(x) for x in selected_row_ids], dtype=np.int64)
+    return rows[np.isin(rows, selected)]
+
+
+def page_count(rows, page_size):
+    if rows is None or len(rows) == 0:
+        return 1
+    return int(np.ceil(len(rows) / page_size))
+
+
+@timed("table_page")
+def page_records(
+    df, rows, page_current, page_size, config, stringify_cols=None, drop_columns=None
+):
+    """DataTable records for one page of the rows of a stored dataframe.
+
+    Columns in `drop_columns` (by default the per-synapse positions) stay on the
+    server, root ids are sent as strings to avoid precision loss in the browser,
+    columns are keyed by `column_key` and each record's row id is its row number
+    in df.
+    """
+    if df is None or rows is None:
+        return []
+    n_pages = page_count(rows, page_size)
+    page_current = min(max(page_current or 0, 0), n_pages - 1)
+    page_rows = rows[page_current * page_size : (page_current + 1) * page_size]
+    if drop_columns is None:
+        drop_columns = config.syn_pt_position_split
+    page_df = df.iloc[page_rows].drop(columns=drop_columns, errors="ignore")
+    if stringify_cols is None:
+        stringify_cols = [config.root_id_col]
+    page_df = stringify_root_ids(page_df.copy(), stringify_cols=stringify_cols)
+    page_df.columns = [column_key(column) for column in page_df.columns]
+    page_df[ROW_ID] = page_rows
+    return page_df.to_dict("records")
+
+
+def selected_page_rows(records, selected_row_ids):
+    "Indices into a page of records of the selected rows, for the DataTable `selected_rows`"
+    selected = set(int(x) for x in selected_row_ids or [])
+    return [ii for ii, record in enumerate(records) if record[ROW_ID] in selected]
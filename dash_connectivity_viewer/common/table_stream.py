@@ -0,0 +1,131 @@
+import time
+import uuid
+import threading
+import pandas as pd
+from .result_store import get_result_store
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+
+class TableStream(object):
+    """Table loaded chunk by chunk in a background thread.
+
+    Chunks are appended to the result store under a fixed handle, at most every
+    `publish_interval` seconds, so callbacks can page through the beginning of a
+    table while the rest is still being queried. Each publish only stores the
+    chunks loaded since the previous one, and the complete table is stored once
+    the last chunk has arrived. Progress
+    is kept as the handle's status in the result store, so with a shared store
+    any worker process can report it.
+
+    Parameters
+    ----------
+    config : CommonConfig
+        Config with the result store settings.
+    name : str
+        Name of the dataframe in the stored result.
+    chunks : iterable
+        Iterable of dataframes, e.g. from `TableViewer.iter_table_data`.
+    expected_rows : int, optional
+        Total number of rows if known, for progress reporting. By default None.
+    publish_interval : float, optional
+        Minimum seconds between publishing partial results, by default 0.5.
+    """
+
+    def __init__(self, config, name, chunks, expected_rows=None, publish_interval=0.5):
+        self.config = config
+        self.name = name
+        self.handle = uuid.uuid4().hex
+        self.expected_rows = expected_rows
+        self.publish_interval = publish_interval
+        self.n_rows = 0
+        self.done = False
+        self.error = None
+        self._chunks = chunks
+        self._pending = []
+        self._last_publish = None
+        self._first_chunk = threading.Event()
+
+    def run(self):
+        try:
+            for df in self._chunks:
+                self._pending.append(df)
+                self.n_rows += len(df)
+                now = time.time()
+                if (
+                    self._last_publish is None
+                    or now - self._last_publish >= self.publish_interval
+                ):
+                    self._publish()
+                self._publish_progress()
+                self._first_chunk.set()
+        except Exception as e:
+            self.error = str(e)
+            if logger is not None:
+                logger.warning(f"Loading table {self.name} failed: {e}")
+        finally:
+            self._publish()
+            if self.error is None:
+                get_result_store(self.config).complete(self.handle)
+            self.done = True
+            self._publish_progress()
+            self._first_chunk.set()
+
+    def _publish(self):
+        "Append the chunks loaded since the last publish"
+        if len(self._pending) > 0 or self._last_publish is None:
+            if len(self._pending) == 1:
+                df = self._pending[0]
+            elif len(self._pending) > 1:
+                df = pd.concat(self._pending, ignore_index=True)
+            else:
+                df = pd.DataFrame()
+            get_result_store(self.config).append(self.handle, {self.name: df})
+            self._pending = []
+        self._last_publish = time.time()
+
+    def _publish_progress(self):
+        get_result_store(self.config).put_status(self.handle, self.progress())
+
+    def wait_for_first_chunk(self, timeout=None):
+        "Block until the first chunk is published, the stream ends or timeout passes"
+        return self._first_chunk.wait(timeout)
+
+    def progress(self):
+        return {
+            "rows": int(self.n_rows),
+            "expected": None if self.expected_rows is None else int(self.expected_rows),
+            "done": self.done,
+            "error": self.error,
+        }
+
+
+def start_table_stream(
+    config, name, chunks, expected_rows=None, first_chunk_timeout=None
+):
+    """Load a table in the background and return its result store handle.
+
+    Returns once the first chunk is available (or `first_chunk_timeout` seconds
+    have passed), so the first page can be shown right away. Raises if loading
+    failed before anything was loaded.
+    """
+    stream = TableStream(config, name, chunks, expected_rows=expected_rows)
+    stream._publish_progress()
+    thread = threading.Thread(target=stream.run, daemon=True)
+    thread.start()
+    stream.wait_for_first_chunk(first_chunk_timeout)
+    if stream.error is not None and stream.n_rows == 0:
+        raise RuntimeError(stream.error)
+    return stream.handle
+
+
+def stream_progress(config, handle):
+    """Progress of a table stream, or None if the handle is not a stream.
+
+    Returns a dict with the number of rows loaded, the expected number of rows
+    (or None), whether loading is done and an error message (or None).
+    """
+    return get_result_store(config).get_status(handle)
@@ -0,0 +1,178 @@
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span(object):
+    """Wall time of one stage of a request, with the stages nested inside it.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self._lock = threading.Lock()
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def duration(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def add_child(self, child):
+        with self._lock:
+            self.children.append(child)
+
+    def walk(self, depth=0):
+        "Yield (depth, span) for this span and all nested spans in start order"
+        yield depth, self
+        with self._lock:
+            children = sorted(self.children, key=lambda x: x.start)
+        for child in children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self):
+        with self._lock:
+            children = sorted(self.children, key=lambda x: x.start)
+        return {
+            "name": self.name,
+            "ms": round(1000 * self.duration, 2),
+            "children": [child.to_dict() for child in children],
+        }
+
+    def format(self):
+        "Indented timing tree, one stage per line"
+        return "\n".join(
+            f"{'  ' * depth}{span.name}: {1000 * span.duration:.1f} ms"
+            for depth, span in self.walk()
+        )
+
+
+@contextmanager
+def span(name):
+    """Time a stage as a child of the current span.
+
+    Outside of a `request_timer` nothing is recorded.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name)
+    parent.add_child(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def timed(name):
+    "Decorator version of `span`"
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def submit_traced(executor, func, *args, **kwargs):
+    "Submit to an executor so that spans opened by func nest under the current span"
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+_stage_histogram = None
+_histogram_lock = threading.Lock()
+
+
+def _histogram():
+    global _stage_histogram
+    with _histogram_lock:
+        if _stage_histogram is None:
+            _stage_histogram = prometheus_client.Histogram(
+                "dash_connectivity_viewer_stage_seconds",
+                "Wall time of each stage of a viewer request",
+                ["request", "stage"],
+            )
+        return _stage_histogram
+
+
+def _emit(root, config):
+    timing = root.to_dict()
+    if logger is not None:
+        logger.bind(timing=timing).info(
+            f"Timing for {root.name} | {json.dumps(timing)}"
+        )
+    if config is None:
+        return
+    if config.debug:
+        print(root.format())
+    if config.timing_metrics and prometheus_client is not None:
+        histogram = _histogram()
+        for _, stage in root.walk():
+            histogram.labels(root.name, stage.name).observe(stage.duration)
+
+
+@contextmanager
+def request_timer(name, config=None):
+    """Record the timing tree of one request.
+
+    Spans opened inside, including in threads started with `submit_traced`,
+    are nested under it. When the request ends the tree is logged as
+    structured data, printed in debug mode and, if `timing_metrics` is set and
+    prometheus_client is installed, recorded as Prometheus histograms.
+    """
+    root = Span(name)
+    token = _current_span.set(root)
+    try:
+        yield root
+    finally:
+        root.finish()
+        _current_span.reset(token)
+        _emit(root, config)
+
+
+def register_metrics_endpoint(app, config):
+    "Serve Prometheus metrics at /metrics if enabled and prometheus_client is installed"
+    if not config.timing_metrics or prometheus_client is None:
+        return
+    if "metrics" in app.server.view_functions:
+        return
+
+    def metrics():
+        return (
+            prometheus_client.generate_latest(),
+            200,
+            {"Content-Type": prometheus_client.CONTENT_TYPE_LATEST},
+        )
+
+    app.server.add_url_rule("/metrics", "metrics", metrics)
@@ -1,5 +1,8 @@
 from collections import defaultdict
+import numpy as np
 import standard_transform
+from standard_transform.utils import get_dataframe_points
+from .timing import timed
 
 transform_lookup = defaultdict(standard_transform.identity_transform)
 transform_lookup["minnie65_phase3"] = standard_transform.minnie_transform_nm()
@@ -10,12 +13,23 @@ def get_transform(aligned_volume):
     return transform_lookup[aligned_volume]
 
 
+def depth_from_points(points, aligned_volume):
+    "Depth of every row of an (N, 3) point array, in one batched transform"
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) == 0:
+        return np.zeros(0)
+    tform = get_transform(aligned_volume)
+    return np.asarray(tform.apply_project("y", points), dtype=np.float64)
+
+
+@timed("extract_depth")
 def extract_depth(df, depth_column, position_column, aligned_volume):
     if len(df) == 0:
         df[depth_column] = None
         return df
-    tform = get_transform(aligned_volume)
-    df[depth_column] = tform.apply_dataframe(position_column, df, projection="y")
+    df[depth_column] = depth_from_points(
+        get_dataframe_points(position_column, df), aligned_volume
+    )
     return df
 
 
@@ -3,7 +3,7 @@ import numpy as np
 import pytz
 from ..common.neuron_data_base import NeuronData
 from dash.dependencies import Input, Output, State
-from dash import callback_context
+from dash import callback_context, no_update
 
 from ..common.link_utilities import (
     generate_statebuider_syn_grouped,
@@ -12,17 +12,31 @@ from ..common.link_utilities import (
     generate_statebuilder_post,
     EMPTY_INFO_CACHE,
 )
-from ..common.dataframe_utilities import (
-    stringify_root_ids,
-    stringify_list,
-    repopulate_list,
+from ..common.link_jobs import start_link_job, link_job_status
+from ..common.result_store import (
+    get_result_store,
+    store_result,
+    fetch_result,
+    fetch_positions,
+)
+from ..common.table_query import (
+    fetch_rows,
+    page_records,
+    page_count,
+    selected_row_numbers,
+    selected_page_rows,
+    table_columns,
+    export_csv,
 )
 from ..common.dash_url_helper import _COMPONENT_ID_TYPE
 from ..common.lookup_utilities import make_client, get_version_options
+from ..common.cache_utilities import cache_stats
+from ..common.disk_cache import get_disk_cache
+from ..common.property_snapshots import preload_table_snapshots
+from ..common.timing import request_timer, register_metrics_endpoint
 from .config import ConnectivityConfig
 
 import datetime
-import pandas as pd
 
 try:
     from loguru import logger
@@ -53,14 +67,24 @@ OutputMaterializeValue = Output(
 
 def register_callbacks(app, config):
     c = ConnectivityConfig(config)
+    register_metrics_endpoint(app, c)
+    get_result_store(c)
+    if c.property_snapshot_cache_size and c.property_snapshot_preload:
+        preload_table_snapshots(c)
 
     @app.callback(
-        Output("data-table", "selected_rows"),
+        Output("data-table", "selected_row_ids"),
+        Output("data-table", "page_current"),
         Input("reset-selection", "n_clicks"),
         Input("connectivity-tab", "value"),
+        Input("data-table", "filter_query"),
     )
-    def reset_selection(n_clicks, tab_value):
-        return []
+    def reset_selection(n_clicks, tab_value, filter_query):
+        # A new filter returns to the first page but keeps the selection
+        trigger_src = callback_context.triggered_id
+        if trigger_src == "data-table":
+            return no_update, 0
+        return [], 0
 
     @app.callback(
         Output("header-bar", "children"),
@@ -77,7 +101,7 @@ def register_callbacks(app, config):
         InputDatastack,
     )
     def define_table_columns(_):
-        return [{"name": i, "id": i} for i in c.table_columns]
+        return table_columns(c.table_columns)
 
     @app.callback(
         OutputMaterializeOptions,
@@ -90,7 +114,7 @@ def register_callbacks(app, config):
         # Produce ordered list of materialization versions to choose from
         client = make_client(datastack_name, c.server_address)
         version_options, default_value = get_version_options(
-            client, c.disallow_live_query
+            client, c.disallow_live_query, disk_cache=get_disk_cache(c)
         )
         return version_options, default_value
 
@@ -124,6 +148,7 @@ def register_callbacks(app, config):
         StateAnnoType,
         StateMaterializationVersion,
     )
+    @request_timer("update_data", c)
     def update_data(_, datastack_name, anno_id, id_type, mat_version):
         if logger is not None:
             t0 = time.time()
@@ -139,7 +164,7 @@ def register_callbacks(app, config):
             )
             if version is None:
                 version = client.materialize.version
-            info_cache = client.info.info_cache[datastack_name]
+            info_cache = dict(client.info.info_cache[datastack_name])
             info_cache["global_server"] = client.server_address
         except Exception as e:
             return (
@@ -210,17 +235,9 @@ def register_callbacks(app, config):
             root_id = nrn_data.root_id
 
             pre_targ_df = nrn_data.partners_out()
-            pre_targ_df = stringify_root_ids(
-                pre_targ_df, stringify_cols=[c.root_id_col]
-            )
-
             post_targ_df = nrn_data.partners_in()
-            post_targ_df = stringify_root_ids(
-                post_targ_df, stringify_cols=[c.root_id_col]
-            )
-            for col in nrn_data.config.syn_pt_position_split:
-                stringify_list(col, pre_targ_df)
-                stringify_list(col, post_targ_df)
+            pre_positions = nrn_data.partner_positions_out()
+            post_positions = nrn_data.partner_positions_in()
 
             n_syn_pre = pre_targ_df[c.num_syn_col].sum()
             n_syn_post = post_targ_df[c.num_syn_col].sum()
@@ -245,6 +262,8 @@ def register_callbacks(app, config):
             logger.info(
                 f"Data update for {root_id} | time:{time.time() - t0:.2f} s, syn_in: {n_syn_post} , syn_out: {n_syn_pre}"
             )
+        if c.debug:
+            print("Cache stats:", cache_stats())
 
         if nrn_data.old_root_id is not None:
             change_root_id_text = f" Warning: {nrn_data.old_root_id} is not valid at timestamp queried! Showing data for the most overlapping valid root id. —"
@@ -267,8 +286,16 @@ def register_callbacks(app, config):
             output_message = f"{change_root_id_text}Connectivity for root id {root_id}{nuc_id_text} materialized on {timestamp_ngl:%m/%d/%Y} (v{client.materialize.version})."
 
         return (
-            pre_targ_df.to_dict("records"),
-            post_targ_df.to_dict("records"),
+            store_result(
+                c,
+                partners=pre_targ_df,
+                synapses=pre_positions.to_frame(c.root_id_col),
+            ),
+            store_result(
+                c,
+                partners=post_targ_df,
+                synapses=post_positions.to_frame(c.root_id_col),
+            ),
             f"Output (n = {n_syn_pre})",
             f"Input (n = {n_syn_post})",
             1,
@@ -281,90 +308,200 @@ def register_callbacks(app, config):
 
     @app.callback(
         Output("data-table", "data"),
+        Output("data-table", "page_count"),
+        Output("data-table", "selected_rows"),
         Input("connectivity-tab", "value"),
         Input("target-table-json", "data"),
         Input("source-table-json", "data"),
+        Input("data-table", "page_current"),
+        Input("data-table", "page_size"),
+        Input("data-table", "sort_by"),
+        Input("data-table", "filter_query"),
+        State("data-table", "selected_row_ids"),
     )
+    @request_timer("update_table", c)
     def update_table(
         tab_value,
-        pre_data,
-        post_data,
+        pre_handle,
+        post_handle,
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+        selected_row_ids,
     ):
         if tab_value == "tab-pre":
-            return pre_data
+            handle = pre_handle
         elif tab_value == "tab-post":
-            return post_data
+            handle = post_handle
         else:
-            return []
+            return [], 1, []
+        rows = fetch_rows(c, handle, "partners", filter_query, sort_by)
+        records = page_records(
+            fetch_result(c, handle, "partners"), rows, page_current, page_size, c
+        )
+        return (
+            records,
+            page_count(rows, page_size),
+            selected_page_rows(records, selected_row_ids),
+        )
+
+    @app.callback(
+        Output("export-csv-download", "data"),
+        Input("export-csv", "n_clicks"),
+        State("connectivity-tab", "value"),
+        State("target-table-json", "data"),
+        State("source-table-json", "data"),
+        State("data-table", "sort_by"),
+        State("data-table", "filter_query"),
+        State("data-table", "columns"),
+        prevent_initial_call=True,
+    )
+    def export_table(
+        _, tab_value, pre_handle, post_handle, sort_by, filter_query, columns
+    ):
+        if tab_value == "tab-pre":
+            handle, filename = pre_handle, "output_partners.csv"
+        elif tab_value == "tab-post":
+            handle, filename = post_handle, "input_partners.csv"
+        else:
+            return no_update
+        data = export_csv(
+            c, handle, "partners", filter_query, sort_by, columns, filename
+        )
+        if data is None:
+            return no_update
+        return data
 
     @app.callback(
         Output("ngl_link", "href"),
         Output("ngl_link", "children"),
         Output("ngl_link", "disabled"),
         Output("link-loading", "children"),
+        Output("ngl-link-job", "data"),
+        Output("link-poll", "disabled"),
         Input("connectivity-tab", "value"),
-        Input("data-table", "derived_virtual_data"),
-        Input("data-table", "derived_virtual_selected_rows"),
+        Input("target-table-json", "data"),
+        Input("source-table-json", "data"),
+        Input("data-table", "sort_by"),
+        Input("data-table", "filter_query"),
+        Input("data-table", "selected_row_ids"),
         Input("client-info-json", "data"),
         Input("synapse-table-resolution-json", "data"),
         InputDatastack,
+        State("ngl-link-job", "data"),
     )
+    @request_timer("update_link", c)
     def update_link(
         tab_value,
-        rows,
-        selected_rows,
+        pre_handle,
+        post_handle,
+        sort_by,
+        filter_query,
+        selected_row_ids,
         info_cache,
         data_resolution,
         datastack_name,
+        link_job,
     ):
         def small_state_text(n):
             return f"Neuroglancer: ({n} partners)"
 
         if info_cache is None:
-            return "", "No datastack set", True, ""
+            return "", "No datastack set", True, "", None, True
 
         try:
             client = make_client(datastack_name, c.server_address)
         except Exception:
             client = None
 
-        if rows is None or len(rows) == 0:
+        def empty_link():
             url = generate_statebuilder(info_cache, c, df=None, client=client)
-            return url, small_state_text(0), False, ""
-
-        syn_df = pd.DataFrame(rows)
-        for col in c.syn_pt_position_split:
-            repopulate_list(col, syn_df)
-        if len(selected_rows) == 0:
-            sorted_df = syn_df.sort_values(by=c.num_syn_col, ascending=False)
-            if tab_value == "tab-pre":
-                url = generate_statebuilder_pre(
-                    info_cache, c, df=sorted_df, client=client,
-                    data_resolution=data_resolution,
-                )
-            elif tab_value == "tab-post":
-                url = generate_statebuilder_post(
-                    info_cache, c, df=sorted_df, client=client,
+            return url, small_state_text(0)
+
+        if tab_value == "tab-pre":
+            handle = pre_handle
+        else:
+            handle = post_handle
+        if not handle:
+            url, text = empty_link()
+            return url, text, False, "", None, True
+
+        targ_df = fetch_result(c, handle, "partners")
+        positions = fetch_positions(c, handle)
+        if targ_df is None or positions is None:
+            return "", "Data expired, please resubmit", True, "", None, True
+        rows = fetch_rows(c, handle, "partners", filter_query, sort_by)
+        if rows is None:
+            return "", "Data expired, please resubmit", True, "", None, True
+        if len(rows) == 0:
+            url, text = empty_link()
+            return url, text, False, "", None, True
+
+        selected_rows = selected_row_numbers(rows, selected_row_ids)
+
+        def build_link():
+            if len(selected_rows) == 0:
+                syn_df = targ_df.iloc[rows].reset_index(drop=True)
+                sorted_df = syn_df.sort_values(by=c.num_syn_col, ascending=False)
+                if tab_value == "tab-pre":
+                    url = generate_statebuilder_pre(
+                        info_cache, c, df=sorted_df, client=client,
+                        positions=positions,
+                        data_resolution=data_resolution,
+                        link_key=[handle, filter_query, sort_by],
+                    )
+                elif tab_value == "tab-post":
+                    url = generate_statebuilder_post(
+                        info_cache, c, df=sorted_df, client=client,
+                        positions=positions,
+                        data_resolution=data_resolution,
+                        link_key=[handle, filter_query, sort_by],
+                    )
+                else:
+                    raise ValueError('tab must be "tab-pre" or "tab-post"')
+                return url, small_state_text(len(syn_df))
+            else:
+                if tab_value == "tab-pre":
+                    anno_layer = "Output Synapses"
+                elif tab_value == "tab-post":
+                    anno_layer = "Input Synapses"
+                url = generate_statebuider_syn_grouped(
+                    info_cache, anno_layer, c,
+                    df=targ_df.iloc[selected_rows].reset_index(drop=True),
+                    client=client,
+                    positions=positions,
+                    preselect=len(selected_rows) == 1,
                     data_resolution=data_resolution,
+                    link_key=[handle, selected_rows.tolist()],
                 )
-            else:
-                raise ValueError('tab must be "tab-pre" or "tab-post"')
-            small_out_text = small_state_text(len(syn_df))
-        else:
-            if tab_value == "tab-pre":
-                anno_layer = "Output Synapses"
-            elif tab_value == "tab-post":
-                anno_layer = "Input Synapses"
-            url = generate_statebuider_syn_grouped(
-                info_cache, anno_layer, c,
-                df=syn_df.iloc[selected_rows],
-                client=client,
-                preselect=len(selected_rows) == 1,
-                data_resolution=data_resolution,
-            )
-            small_out_text = small_state_text(len(selected_rows))
+                return url, small_state_text(len(selected_rows))
 
-        return url, small_out_text, False, ""
+        if c.lazy_links:
+            job_id = start_link_job(c, build_link, previous=link_job)
+            return "", "Preparing Neuroglancer link...", True, "", job_id, False
+        url, text = build_link()
+        return url, text, False, "", None, True
+
+    @app.callback(
+        Output("ngl_link", "href", allow_duplicate=True),
+        Output("ngl_link", "children", allow_duplicate=True),
+        Output("ngl_link", "disabled", allow_duplicate=True),
+        Output("link-poll", "disabled", allow_duplicate=True),
+        Input("link-poll", "n_intervals"),
+        State("ngl-link-job", "data"),
+        prevent_initial_call=True,
+    )
+    def poll_link(_, link_job):
+        status = link_job_status(c, link_job)
+        if status is None:
+            return "", "Link expired, please reselect", True, True
+        if not status["done"]:
+            return no_update, no_update, no_update, False
+        if status["error"] is not None:
+            return "", "Could not build link", True, True
+        url, text = status["result"]
+        return url, text, False, True
 
     @app.callback(
         Output("all-input-link", "children"),
@@ -376,8 +513,9 @@ def register_callbacks(app, config):
         Input("synapse-table-resolution-json", "data"),
         prevent_initial_call=True,
     )
+    @request_timer("generate_all_input_link", c)
     def generate_all_input_link(
-        _1, _2, rows, info_cache, datastack, data_resolution
+        _1, _2, handle, info_cache, datastack, data_resolution
     ):
         ctx = callback_context
         if not ctx.triggered:
@@ -390,20 +528,19 @@ def register_callbacks(app, config):
         ):
             return ""
 
-        if rows is None or len(rows) == 0:
+        syn_df = fetch_result(c, handle, "partners")
+        if syn_df is None or len(syn_df) == 0:
             return html.Div("No inputs to show")
 
-        syn_df = pd.DataFrame(rows)
-        for col in c.syn_pt_position_split:
-            repopulate_list(col, syn_df)
-
         try:
             client = make_client(datastack, c.server_address)
             url = generate_statebuilder_post(
                 info_cache, c,
                 df=syn_df.sort_values(by=c.num_syn_col, ascending=False),
                 client=client,
+                positions=fetch_positions(c, handle),
                 data_resolution=data_resolution,
+                link_key=[handle],
             )
         except Exception as e:
             return html.Div(str(e))
@@ -421,8 +558,9 @@ def register_callbacks(app, config):
         Input("synapse-table-resolution-json", "data"),
         prevent_initial_call=True,
     )
+    @request_timer("generate_all_output_link", c)
     def generate_all_output_link(
-        _1, _2, rows, info_cache, datastack, data_resolution
+        _1, _2, handle, info_cache, datastack, data_resolution
     ):
         ctx = callback_context
         if not ctx.triggered:
@@ -435,20 +573,19 @@ def register_callbacks(app, config):
         ):
             return ""
 
-        if rows is None or len(rows) == 0:
+        syn_df = fetch_result(c, handle, "partners")
+        if syn_df is None or len(syn_df) == 0:
             return html.Div("No outputs to show")
 
-        syn_df = pd.DataFrame(rows)
-        for col in c.syn_pt_position_split:
-            repopulate_list(col, syn_df)
-
         try:
             client = make_client(datastack, c.server_address)
             url = generate_statebuilder_pre(
                 info_cache, c,
                 df=syn_df.sort_values(by=c.num_syn_col, ascending=False),
                 client=client,
+                positions=fetch_positions(c, handle),
                 data_resolution=data_resolution,
+                link_key=[handle],
             )
         except Exception as e:
             return html.Div(str(e))
@@ -14,4 +14,5 @@ class ConnectivityConfig(CommonConfig):
             ]
             + self.aggregation_columns
             + [self.num_soma_col]
+            + self.syn_pt_position_mean
         )
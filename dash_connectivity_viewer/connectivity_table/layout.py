@@ -163,15 +163,13 @@ def page_layout(state: State = None):
                                     "font-size": "12px",
                                     "fontWeight": "bold",
                                 },
-                                sort_action="native",
+                                sort_action="custom",
                                 sort_mode="multi",
-                                filter_action="native",
+                                filter_action="custom",
                                 row_selectable="multi",
                                 page_current=0,
-                                page_action="native",
+                                page_action="custom",
                                 page_size=50,
-                                export_format="csv",
-                                export_headers="names",
                             ),
                             width=10,
                         ),
@@ -241,6 +239,17 @@ def page_layout(state: State = None):
                     size="sm",
                 ),
             ),
+            dbc.Col(
+                [
+                    dbc.Button(
+                        id="export-csv",
+                        children="Export CSV",
+                        color="secondary",
+                        size="sm",
+                    ),
+                    dcc.Download(id="export-csv-download"),
+                ],
+            ),
         ],
         justify="left",
     )
@@ -263,6 +272,8 @@ def page_layout(state: State = None):
             dcc.Store("source-table-json"),
             dcc.Store("client-info-json"),
             dcc.Store("synapse-table-resolution-json"),
+            dcc.Store("ngl-link-job"),
+            dcc.Interval(id="link-poll", interval=500, disabled=True),
             html.Div(
                 dcc.Input(
                     **create_component_kwargs(